@@ -0,0 +1,149 @@
+var DeltaNetworkModule = function(canvas_width, canvas_height) {
+
+    // Canvas instead of svg: thousands of nodes and edges are redrawn without DOM updates.
+    var canvas_tag = "<canvas width='" + canvas_width + "' height='" + canvas_height + "' " +
+        "style='border:1px dotted'></canvas>";
+    var canvas = $(canvas_tag)[0];
+    $("#elements").append(canvas);
+    var context = canvas.getContext("2d");
+
+    var tooltip = d3.select("body").append("div")
+        .attr("class", "tooltip")
+        .style("opacity", 0);
+
+    // Layouts and edge drawing are reduced above these sizes
+    var LARGE_GRAPH_NODES = 1000;
+    var LARGE_GRAPH_EDGES = 2000;
+
+    var nodes = [];
+    var edges = [];
+    var palette = [];
+    var quadtree = null;
+    var transform = d3.zoomIdentity;
+
+    d3.select(canvas).call(d3.zoom()
+        .scaleExtent([0.1, 20])
+        .on("zoom", function() {
+            transform = d3.event.transform;
+            draw();
+        }));
+
+    d3.select(canvas).on("mousemove", function() {
+        if (quadtree === null) {
+            return;
+        }
+        var mouse = d3.mouse(this);
+        var x = (mouse[0] - transform.x - canvas_width / 2) / transform.k;
+        var y = (mouse[1] - transform.y - canvas_height / 2) / transform.k;
+        var node = quadtree.find(x, y, 10 / transform.k);
+        if (node) {
+            tooltip.style("opacity", .9)
+                .html(node.tooltip)
+                .style("left", (d3.event.pageX) + "px")
+                .style("top", (d3.event.pageY) + "px");
+        } else {
+            tooltip.style("opacity", 0);
+        }
+    });
+
+    var layout = function() {
+        var links = [];
+        for (var i = 0; i < edges.length; i += 2) {
+            links.push({"source": edges[i], "target": edges[i + 1]});
+        }
+
+        var simulation = d3.forceSimulation(nodes)
+            .force("charge", d3.forceManyBody()
+                .strength(-80)
+                .distanceMin(2))
+            .force("link", d3.forceLink(links))
+            .force("center", d3.forceCenter())
+            .stop();
+
+        var n = Math.ceil(Math.log(simulation.alphaMin()) / Math.log(1 - simulation.alphaDecay()));
+        if (nodes.length > LARGE_GRAPH_NODES) {
+            n = Math.min(n, 50);
+        }
+        for (var j = 0; j < n; ++j) {
+            simulation.tick();
+        }
+
+        quadtree = d3.quadtree()
+            .x(function(d) { return d.x; })
+            .y(function(d) { return d.y; })
+            .addAll(nodes);
+    };
+
+    var draw = function() {
+        context.save();
+        context.clearRect(0, 0, canvas_width, canvas_height);
+        context.translate(transform.x + canvas_width / 2, transform.y + canvas_height / 2);
+        context.scale(transform.k, transform.k);
+
+        // Edges in one path, faded when the graph is large
+        context.globalAlpha = edges.length / 2 > LARGE_GRAPH_EDGES ? 0.3 : 1.0;
+        context.strokeStyle = "#e8e8e8";
+        context.lineWidth = edges.length / 2 > LARGE_GRAPH_EDGES ? 1 : 3;
+        context.beginPath();
+        for (var i = 0; i < edges.length; i += 2) {
+            var source = nodes[edges[i]];
+            var target = nodes[edges[i + 1]];
+            context.moveTo(source.x, source.y);
+            context.lineTo(target.x, target.y);
+        }
+        context.stroke();
+
+        context.globalAlpha = 1.0;
+        for (var j = 0; j < nodes.length; j++) {
+            var node = nodes[j];
+            context.beginPath();
+            context.fillStyle = palette[node.color];
+            context.arc(node.x, node.y, node.size, 0, 2 * Math.PI);
+            context.fill();
+        }
+        context.restore();
+    };
+
+    var updatePalette = function(data) {
+        for (var i = 0; i < data.palette.length; i++) {
+            palette.push(data.palette[i]);
+        }
+    };
+
+    this.render = function(data) {
+        // Throttled frame, nothing changed on the server side
+        if (data === null) {
+            return;
+        }
+
+        if (data.type === "topology") {
+            palette = [];
+            updatePalette(data);
+            nodes = [];
+            for (var i = 0; i < data.size.length; i++) {
+                nodes.push({"index": i, "size": data.size[i], "color": data.color[i], "tooltip": data.tooltip[i]});
+            }
+            edges = data.edges;
+            if (data.total_edges * 2 > edges.length) {
+                console.log("DeltaNetworkModule: drawing " + edges.length / 2 + " of " + data.total_edges + " edges");
+            }
+            layout();
+        } else if (data.type === "delta") {
+            updatePalette(data);
+            for (var j = 0; j < data.ids.length; j++) {
+                var node = nodes[data.ids[j]];
+                node.size = data.size[j];
+                node.color = data.color[j];
+            }
+        }
+        draw();
+    };
+
+    this.reset = function() {
+        nodes = [];
+        edges = [];
+        palette = [];
+        quadtree = null;
+        context.clearRect(0, 0, canvas_width, canvas_height);
+    };
+};
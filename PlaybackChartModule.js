@@ -0,0 +1,79 @@
+var PlaybackChartModule = function(series, canvas_width, canvas_height, max_points) {
+
+    var canvas_tag = "<canvas width='" + canvas_width + "' height='" + canvas_height + "' " +
+        "style='border:1px dotted'></canvas>";
+    var canvas = $(canvas_tag)[0];
+    $("#elements").append(canvas);
+    var context = canvas.getContext("2d");
+
+    var datasets = [];
+    for (var i = 0; i < series.length; i++) {
+        datasets.push({
+            label: series[i].Label,
+            borderColor: series[i].Color,
+            backgroundColor: "rgba(0,0,0,0)",
+            pointRadius: 0,
+            borderWidth: 1,
+            data: []
+        });
+    }
+
+    // No animation: frames arrive at the playback rate
+    var chart = new Chart(context, {
+        type: "line",
+        data: {labels: [], datasets: datasets},
+        options: {
+            responsive: true,
+            animation: {duration: 0},
+            tooltips: {mode: "index", intersect: false},
+            scales: {
+                xAxes: [{display: true, ticks: {maxTicksLimit: 11}}],
+                yAxes: [{display: true}]
+            }
+        }
+    });
+
+    // Keeps every other point, the latest one included
+    var thin = function(values) {
+        var kept = [];
+        for (var j = (values.length - 1) % 2; j < values.length; j += 2) {
+            kept.push(values[j]);
+        }
+        return kept;
+    };
+
+    this.render = function(data) {
+        if (data === null) {
+            return;
+        }
+
+        if (data.type === "window") {
+            chart.data.labels = data.steps;
+            for (var i = 0; i < datasets.length; i++) {
+                chart.data.datasets[i].data = data.data[i];
+            }
+        } else if (data.type === "append") {
+            chart.data.labels = chart.data.labels.concat(data.steps);
+            for (var j = 0; j < datasets.length; j++) {
+                chart.data.datasets[j].data = chart.data.datasets[j].data.concat(data.data[j]);
+            }
+            // The limit of the frame is the viewer's setting, the constructor's is the chart's default
+            var limit = data.max_points || max_points;
+            while (chart.data.labels.length > limit) {
+                chart.data.labels = thin(chart.data.labels);
+                for (var k = 0; k < datasets.length; k++) {
+                    chart.data.datasets[k].data = thin(chart.data.datasets[k].data);
+                }
+            }
+        }
+        chart.update();
+    };
+
+    this.reset = function() {
+        chart.data.labels = [];
+        for (var i = 0; i < datasets.length; i++) {
+            chart.data.datasets[i].data = [];
+        }
+        chart.update();
+    };
+};
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+
+class ReplicateAggregator:
+    """
+    Online cross-replicate statistics of collected records: per step and column, the running count, mean,
+    variance (Welford), minimum and maximum. Replicates are added one at a time as they finish and then
+    dropped. Memory is therefore steps x columns, whatever the number of replicates.
+    Aggregators of separate workers can be merged (Chan et al. parallel update).
+
+    Optionally, values of selected columns are also fed into a quantile sketch per column, made by
+    sketch_factory (an object with update(values), merge(other) and quantile(q)), pooled over steps and replicates.
+    """
+
+    def __init__(self, columns=None, sketch_factory=None, sketch_columns=()):
+        self.columns = None if columns is None else list(columns)
+        self.sketch_factory = sketch_factory
+        self.sketch_columns = list(sketch_columns)
+        self.sketches = {}
+        self.n_replicates = 0
+
+        self.count = None
+        self.mean = None
+        self.m2 = None
+        self.minimum = None
+        self.maximum = None
+
+    def _allocate(self, n_steps):
+        n_columns = len(self.columns)
+        if self.count is None:
+            self.count = np.zeros((n_steps, n_columns))
+            self.mean = np.zeros((n_steps, n_columns))
+            self.m2 = np.zeros((n_steps, n_columns))
+            self.minimum = np.full((n_steps, n_columns), np.inf)
+            self.maximum = np.full((n_steps, n_columns), -np.inf)
+        elif n_steps > len(self.count):
+            # Longer replicates extend the summaries, earlier steps keep their statistics
+            extra = n_steps - len(self.count)
+            self.count = np.vstack([self.count, np.zeros((extra, n_columns))])
+            self.mean = np.vstack([self.mean, np.zeros((extra, n_columns))])
+            self.m2 = np.vstack([self.m2, np.zeros((extra, n_columns))])
+            self.minimum = np.vstack([self.minimum, np.full((extra, n_columns), np.inf)])
+            self.maximum = np.vstack([self.maximum, np.full((extra, n_columns), -np.inf)])
+
+    def add(self, record):
+        """
+        Adds a replicate, a dataframe with one row per step (or a steps x columns array in column order).
+        """
+        if isinstance(record, pd.DataFrame):
+            if self.columns is None:
+                self.columns = list(record.columns)
+            values = record[self.columns].to_numpy(dtype=float)
+        else:
+            values = np.asarray(record, dtype=float)
+        n_steps = len(values)
+        self._allocate(n_steps)
+
+        # Welford update of all steps and columns at once, missing values leave their statistics unchanged
+        present = ~np.isnan(values)
+        count = self.count[:n_steps] + present
+        delta = np.where(present, values - self.mean[:n_steps], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.mean[:n_steps] + np.where(present, delta / np.maximum(count, 1), 0.0)
+        self.m2[:n_steps] += np.where(present, delta * (values - mean), 0.0)
+        self.mean[:n_steps] = mean
+        self.count[:n_steps] = count
+        self.minimum[:n_steps] = np.fmin(self.minimum[:n_steps], values)
+        self.maximum[:n_steps] = np.fmax(self.maximum[:n_steps], values)
+        self.n_replicates += 1
+
+        if self.sketch_factory is not None:
+            for column in self.sketch_columns:
+                column_values = values[:, self.columns.index(column)]
+                if column not in self.sketches:
+                    self.sketches[column] = self.sketch_factory()
+                self.sketches[column].update(column_values[~np.isnan(column_values)])
+
+    def merge(self, other):
+        """
+        Adds the replicates summarised by another aggregator with the same columns.
+        """
+        if other.count is None:
+            return
+        if self.count is None:
+            self.columns = list(other.columns)
+        self._allocate(len(other.count))
+        n_steps = len(other.count)
+        count = self.count[:n_steps] + other.count
+        delta = other.mean - self.mean[:n_steps]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(count > 0, other.count / np.maximum(count, 1), 0.0)
+        self.m2[:n_steps] += other.m2 + delta ** 2 * self.count[:n_steps] * weight
+        self.mean[:n_steps] += delta * weight
+        self.count[:n_steps] = count
+        self.minimum[:n_steps] = np.fmin(self.minimum[:n_steps], other.minimum)
+        self.maximum[:n_steps] = np.fmax(self.maximum[:n_steps], other.maximum)
+        self.n_replicates += other.n_replicates
+        for column, sketch in other.sketches.items():
+            if column in self.sketches:
+                self.sketches[column].merge(sketch)
+            else:
+                self.sketches[column] = sketch
+
+    def _column(self, array, column):
+        return array[:, self.columns.index(column)]
+
+    def get_mean(self, column):
+        return np.where(self._column(self.count, column) > 0, self._column(self.mean, column), np.nan)
+
+    def get_std(self, column, ddof=0):
+        """
+        Standard deviation across replicates per step (ddof=0 as numpy, 1 as pandas/seaborn).
+        """
+        count = self._column(self.count, column)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > ddof, np.sqrt(self._column(self.m2, column) / (count - ddof)), np.nan)
+
+    def get_min(self, column):
+        return np.where(self._column(self.count, column) > 0, self._column(self.minimum, column), np.nan)
+
+    def get_max(self, column):
+        return np.where(self._column(self.count, column) > 0, self._column(self.maximum, column), np.nan)
+
+    def get_summary(self, column, ddof=1):
+        """
+        Per-step count, mean, standard deviation, minimum and maximum of a column.
+        """
+        return pd.DataFrame({"count": self._column(self.count, column), "mean": self.get_mean(column),
+                             "std": self.get_std(column, ddof), "min": self.get_min(column),
+                             "max": self.get_max(column)})
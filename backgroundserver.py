@@ -0,0 +1,161 @@
+import time
+import queue
+import threading
+
+import tornado.escape
+import tornado.ioloop
+from mesa.visualization.ModularVisualization import ModularServer, SocketHandler
+from mesa.visualization.UserParam import UserSettableParameter
+
+# Marks the end of a run in the frame queue
+END_OF_RUN = object()
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Steps the model in the background and pushes rendered frames into a bounded queue.
+    With skip_frames, a frame is only rendered when the queue has room, so the model runs ahead of the browser
+    and intermediate steps are never rendered (and never need to be dropped, which keeps delta frames consistent).
+    Without skip_frames, the worker blocks on a full queue and every step is delivered.
+    """
+
+    def __init__(self, application, frames, skip_frames=True, max_speed=True, steps_per_second=10):
+        super().__init__(daemon=True)
+        self.application = application
+        self.frames = frames
+        self.skip_frames = skip_frames
+        self.max_speed = max_speed
+        self.steps_per_second = steps_per_second
+        self.stop_event = threading.Event()
+
+    def run(self):
+        model = self.application.model
+        while not self.stop_event.is_set():
+            if not model.running or model.schedule.steps >= self.application.max_steps:
+                self._put(END_OF_RUN)
+                return
+
+            start_time = time.time()
+            model.step()
+
+            if not self.skip_frames or not self.frames.full():
+                self._put(self.application.render_model())
+
+            if not self.max_speed and self.steps_per_second > 0:
+                time.sleep(max(0.0, 1.0 / self.steps_per_second - (time.time() - start_time)))
+
+    def _put(self, frame):
+        while not self.stop_event.is_set():
+            try:
+                self.frames.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                if self.skip_frames and frame is not END_OF_RUN:
+                    return
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+class BackgroundSocketHandler(SocketHandler):
+    """Handler for websocket, serving frames produced by the background worker"""
+
+    async def on_message(self, message):
+        if self.application.verbose:
+            print(message)
+        msg = tornado.escape.json_decode(message)
+        if msg["type"] == "get_step":
+            frame = await tornado.ioloop.IOLoop.current().run_in_executor(None, self.application.next_frame)
+            if frame is END_OF_RUN:
+                self.write_message({"type": "end"})
+            else:
+                self.write_message({"type": "viz_state", "data": frame})
+        elif msg["type"] == "reset":
+            self.application.reset_model()
+            self.write_message(self.viz_state_message)
+        elif msg["type"] == "submit_params":
+            self.application.set_param(msg["param"], msg["value"])
+        else:
+            if self.application.verbose:
+                print("Unexpected message!")
+
+
+class BackgroundModularServer(ModularServer):
+    """
+    Visualization server where the model runs ahead in a background worker, decoupled from the browser frame rate.
+    The worker controls (max_speed, skip_frames, steps_per_second) are shown next to the model parameters
+    but are not passed to the model.
+    """
+    socket_handler = (r"/ws", BackgroundSocketHandler)
+    handlers = [ModularServer.page_handler, socket_handler, ModularServer.static_handler, ModularServer.local_handler]
+
+    def __init__(self, model_cls, visualization_elements, name="Mesa Model", model_params={}, server_params=None,
+                 queue_size=10):
+        if server_params is None:
+            server_params = {
+                "max_speed": UserSettableParameter("checkbox", "Run at maximum speed", value=True),
+                "skip_frames": UserSettableParameter("checkbox", "Skip frames", value=True),
+                "steps_per_second": UserSettableParameter("slider", "Steps per second", 10, 1, 100),
+            }
+        self.server_kwargs = server_params
+        self.queue_size = queue_size
+        self.worker = None
+        self.frames = None
+        super().__init__(model_cls, visualization_elements, name, model_params)
+
+    @property
+    def user_params(self):
+        result = super().user_params
+        for param, val in self.server_kwargs.items():
+            if isinstance(val, UserSettableParameter):
+                result[param] = val.json
+        return result
+
+    def get_server_param(self, name):
+        val = self.server_kwargs[name]
+        return val.value if isinstance(val, UserSettableParameter) else val
+
+    def set_param(self, param, value):
+        for kwargs in (self.model_kwargs, self.server_kwargs):
+            if param in kwargs:
+                if isinstance(kwargs[param], UserSettableParameter):
+                    kwargs[param].value = value
+                else:
+                    kwargs[param] = value
+        # Worker controls apply immediately, model parameters on the next reset
+        if param in self.server_kwargs and self.worker is not None:
+            setattr(self.worker, param, self.get_server_param(param))
+
+    def reset_model(self):
+        """Stop the worker and reinstantiate the model, the worker restarts on the next requested frame."""
+        self._stop_worker()
+        super().reset_model()
+
+    def _start_worker(self):
+        # Latest-frame semantics need a single slot, otherwise the worker may run queue_size frames ahead
+        skip_frames = self.get_server_param("skip_frames")
+        self.frames = queue.Queue(maxsize=1 if skip_frames else self.queue_size)
+        self.worker = SimulationWorker(self, self.frames, skip_frames=skip_frames,
+                                       max_speed=self.get_server_param("max_speed"),
+                                       steps_per_second=self.get_server_param("steps_per_second"))
+        self.worker.start()
+
+    def _stop_worker(self):
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+            self.frames = None
+
+    def next_frame(self):
+        """Blocks until the worker has a frame ready and returns it (or END_OF_RUN)."""
+        if self.worker is None:
+            self._start_worker()
+        worker = self.worker
+        frames = self.frames
+        while True:
+            try:
+                return frames.get(timeout=0.1)
+            except queue.Empty:
+                if not worker.is_alive():
+                    return END_OF_RUN
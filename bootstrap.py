@@ -0,0 +1,89 @@
+import multiprocessing
+import numpy as np
+import scipy.stats as stats
+
+# Resampling of per-replicate statistics. Each fact is computed once per replicate, then only
+# index arrays are resampled, so no analysis is re-run.
+
+# Bootstrap resamples drawn per chunk (bounds the memory of the index matrix)
+CHUNK_SIZE = 500
+# Above this many resampled values (replicates x resamples) the chunks are spread over a process pool
+PARALLEL_MIN_SIZE = 5000000
+
+
+def _clean(values):
+    values = np.asarray(values, dtype=float)
+    return values[np.isfinite(values)]
+
+
+def _bootstrap_chunk(args):
+    values, n_resamples, seed_sequence, statistic = args
+    random_state = np.random.default_rng(seed_sequence)
+    indices = random_state.integers(0, len(values), size=(n_resamples, len(values)))
+    return statistic(values[indices], axis=1)
+
+
+def bootstrap_distribution(values, statistic=np.mean, n_bootstrap=2000, seed=None, processes=None):
+    """
+    Returns n_bootstrap resampled statistics of the per-replicate values.
+    The statistic must accept an axis argument (e.g. np.mean, np.median).
+    Every chunk has its own seed spawned from the root seed, so the result does not depend on the number of processes.
+    """
+    values = _clean(values)
+    chunk_sizes = [min(CHUNK_SIZE, n_bootstrap - start) for start in range(0, n_bootstrap, CHUNK_SIZE)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    tasks = [(values, size, seed_sequence, statistic) for size, seed_sequence in zip(chunk_sizes, seed_sequences)]
+
+    if len(tasks) > 1 and len(values) * n_bootstrap >= PARALLEL_MIN_SIZE:
+        with multiprocessing.Pool(processes=processes) as pool:
+            chunks = pool.map(_bootstrap_chunk, tasks)
+    else:
+        chunks = [_bootstrap_chunk(task) for task in tasks]
+    return np.concatenate(chunks)
+
+
+def bootstrap_interval(values, statistic=np.mean, n_bootstrap=2000, confidence=0.95, seed=None, processes=None):
+    """
+    Percentile bootstrap confidence interval of the statistic across replicates.
+    """
+    if len(_clean(values)) < 2:
+        return np.nan, np.nan
+    distribution = bootstrap_distribution(values, statistic, n_bootstrap, seed, processes)
+    alpha = (1.0 - confidence) / 2.0
+    return tuple(np.quantile(distribution, [alpha, 1.0 - alpha]))
+
+
+def jackknife_interval(values, statistic=np.mean, confidence=0.95):
+    """
+    Jackknife (leave-one-replicate-out) confidence interval of the statistic, with Student's t quantiles.
+    """
+    values = _clean(values)
+    n = len(values)
+    if n < 2:
+        return np.nan, np.nan
+    if statistic is np.mean:
+        estimates = (values.sum() - values) / (n - 1.0)
+    else:
+        # Row i holds all values but the i-th
+        leave_one_out = np.broadcast_to(values, (n, n))[~np.eye(n, dtype=bool)].reshape(n, n - 1)
+        estimates = statistic(leave_one_out, axis=1)
+    standard_error = np.sqrt((n - 1.0) / n * np.sum((estimates - estimates.mean()) ** 2))
+    estimate = statistic(values)
+    t = stats.t.ppf(1.0 - (1.0 - confidence) / 2.0, n - 1)
+    return estimate - t * standard_error, estimate + t * standard_error
+
+
+def get_confidence_intervals(values, statistic=np.mean, n_bootstrap=2000, confidence=0.95, seed=None,
+                             processes=None):
+    """
+    Returns the estimate and its bootstrap and jackknife confidence intervals, in a JSON friendly dictionary.
+    """
+    clean_values = _clean(values)
+    return {
+        "estimate": float(statistic(clean_values)) if len(clean_values) > 0 else np.nan,
+        "n_replicates": len(clean_values),
+        "confidence": confidence,
+        "bootstrap": [float(bound) for bound in
+                      bootstrap_interval(clean_values, statistic, n_bootstrap, confidence, seed, processes)],
+        "jackknife": [float(bound) for bound in jackknife_interval(clean_values, statistic, confidence)],
+    }
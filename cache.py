@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import pandas as pd
+
+CACHE_DIR = os.path.join('.', 'Data', '.cache')
+MAX_CACHE_SIZE = 2 * 1024 ** 3         # 2 GiB of records on disk
+
+# Source files whose contents define the behaviour of a simulation run
+MODEL_SOURCE_FILES = ['model.py', 'market.py', 'trader.py', 'fundamentalist.py',
+                      'technical.py', 'mimetic.py', 'noise.py', 'utils.py', 'events.py', 'kernels.py',
+                      'inequality.py', 'streams.py', 'orderbook.py',
+                      'scheduler.py', 'valuepath.py']
+
+RECORD_FILE = "record.pkl"
+FACTS_FILE = "facts.json"
+META_FILE = "meta.json"
+
+_code_versions = {}
+
+
+def get_code_version(source_files=None):
+    """
+    Returns a hash of the given source files (default: the model sources), used as the model-code version stamp.
+    """
+    if source_files is None:
+        source_files = MODEL_SOURCE_FILES
+    source_files = tuple(source_files)
+    if source_files not in _code_versions:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for file_name in source_files:
+            digest.update(file_name.encode())
+            with open(os.path.join(base_dir, file_name), "rb") as file:
+                digest.update(file.read())
+        _code_versions[source_files] = digest.hexdigest()
+    return _code_versions[source_files]
+
+
+def get_class_constants(model_cls):
+    """
+    Returns the upper-case class constants (TREND_SIZE, SIGMA_VALUE, ...) of a model class.
+    """
+    return {name: getattr(model_cls, name) for name in dir(model_cls)
+            if name.isupper() and not callable(getattr(model_cls, name))}
+
+
+def get_files_digest(file_list):
+    """
+    Returns a content hash of the given files, independent of their order and location.
+    """
+    file_digests = []
+    for file_name in file_list:
+        digest = hashlib.sha256()
+        with open(file_name, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        file_digests.append(digest.hexdigest())
+    return hashlib.sha256("".join(sorted(file_digests)).encode()).hexdigest()
+
+
+def make_key(**parts):
+    """
+    Returns the content address of a cache entry from the given key parts.
+    """
+    serialized = json.dumps(parts, sort_keys=True, default=repr)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def make_model_key(model_cls, model_params, seed, max_steps):
+    """
+    Returns the cache key of a model run: full parameter set, class constants, seed and model-code version.
+    """
+    # Console output and progress reporting do not change the result of a run
+    model_params = {name: value for name, value in model_params.items() if name not in ("verbose", "progress")}
+    return make_key(kind="model_run", model=model_cls.__name__, params=model_params,
+                    constants=get_class_constants(model_cls), seed=seed, max_steps=max_steps,
+                    code_version=get_code_version())
+
+
+class ResultCache:
+    """
+    On-disk, content-addressed store of collected records and summary facts with size-bounded LRU eviction.
+    Each entry is a directory named after its key; the modification time of its meta file marks last use.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_size=MAX_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def contains(self, key):
+        return os.path.exists(os.path.join(self._entry_dir(key), META_FILE))
+
+    def get(self, key):
+        """
+        Returns (record, facts, meta) for a key, or None on a miss.
+        """
+        entry_dir = self._entry_dir(key)
+        meta_file = os.path.join(entry_dir, META_FILE)
+        try:
+            with open(meta_file, "r") as file:
+                meta = json.load(file)
+
+            record = None
+            if os.path.exists(os.path.join(entry_dir, RECORD_FILE)):
+                record = pd.read_pickle(os.path.join(entry_dir, RECORD_FILE))
+
+            facts = None
+            if os.path.exists(os.path.join(entry_dir, FACTS_FILE)):
+                with open(os.path.join(entry_dir, FACTS_FILE), "r") as file:
+                    facts = json.load(file)
+
+            # Mark as most recently used
+            os.utime(meta_file, None)
+        except (OSError, ValueError, EOFError):
+            return None
+        return record, facts, meta
+
+    def get_record(self, key):
+        entry = self.get(key)
+        return None if entry is None else entry[0]
+
+    def get_facts(self, key):
+        entry = self.get(key)
+        return None if entry is None else entry[1]
+
+    def iter_meta(self, kind=None):
+        """
+        Yields (key, meta) of every entry (of a kind), without marking them as used.
+        """
+        for key in sorted(os.listdir(self.cache_dir)):
+            if key.startswith(".tmp_"):
+                continue
+            try:
+                with open(os.path.join(self._entry_dir(key), META_FILE), "r") as file:
+                    meta = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if kind is None or meta.get("kind") == kind:
+                yield key, meta
+
+    def put(self, key, record=None, facts=None, meta=None):
+        """
+        Stores a record (DataFrame) and/or facts (dict) under a key, then evicts least recently used entries.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+        try:
+            if record is not None:
+                record.to_pickle(os.path.join(tmp_dir, RECORD_FILE))
+            if facts is not None:
+                with open(os.path.join(tmp_dir, FACTS_FILE), "w") as file:
+                    json.dump(facts, file, indent=4, sort_keys=True, default=float)
+            meta = dict(meta or {})
+            meta["created"] = time.time()
+            with open(os.path.join(tmp_dir, META_FILE), "w") as file:
+                json.dump(meta, file, indent=4, sort_keys=True, default=repr)
+
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            # Atomic publish, another worker may have stored the same entry in the meantime
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_size bytes.
+        """
+        entries = []
+        total_size = 0
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            meta_file = os.path.join(entry_dir, META_FILE)
+            if key.startswith(".tmp_") or not os.path.exists(meta_file):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+                last_used = os.path.getmtime(meta_file)
+            except OSError:
+                continue
+            entries.append((last_used, size, entry_dir))
+            total_size += size
+
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+
+def run_model_cached(model_cls, model_params, seed, max_steps, cache=None, batch_runner_cls=None, observers=None,
+                     return_record=True):
+    """
+    Runs a model for max_steps and returns its collected record, reusing a cached record when available.
+    Runs without a seed are not reproducible and therefore never cached.
+    Observers (callables such as an AgentPanelRecorder) are called with the model after every step,
+    runs with observers are therefore always simulated.
+    Without a cache and with return_record False (observers take the results) no dataframe is built.
+    """
+    key = None
+    if cache is not None and seed is not None:
+        key = make_model_key(model_cls, model_params, seed, max_steps)
+        record = cache.get_record(key) if not observers else None
+        if record is not None:
+            return record
+
+    model = model_cls(seed=seed, **model_params)
+    if batch_runner_cls is None or observers:
+        while model.running and model.schedule.steps < max_steps:
+            model.step()
+            for observer in observers or []:
+                observer(model)
+        for observer in observers or []:
+            if hasattr(observer, "close"):
+                observer.close()
+    else:
+        batch_runner_cls(model_cls=model_cls, max_steps=max_steps).run_model(model)
+    if key is None and not return_record:
+        return None
+    record = model.datacollector.get_model_vars_dataframe()
+
+    if key is not None:
+        put_model_record(cache, key, record, model_cls, model_params, seed, max_steps)
+    return record
+
+
+def put_model_record(cache, key, record, model_cls, model_params, seed, max_steps):
+    """
+    Stores the collected record of a model run under its key (make_model_key).
+    """
+    cache.put(key, record=record, meta={"kind": "model_run", "model": model_cls.__name__,
+                                        "params": {name: value for name, value in model_params.items()
+                                                   if name != "progress"}, "seed": seed, "max_steps": max_steps,
+                                        "constants": get_class_constants(model_cls),
+                                        "code_version": get_code_version()})
+
+
+_record_memo = {}
+
+
+def read_record(file_name, cache=None, memoize=True):
+    """
+    Reads a CSV record, memoised in-process and backed by the result cache keyed on the file contents.
+    Single-pass readers of many records pass memoize=False, so records are not all kept in memory.
+    """
+    stat = os.stat(file_name)
+    memo_key = (os.path.abspath(file_name), stat.st_mtime, stat.st_size)
+    if memoize and memo_key in _record_memo:
+        return _record_memo[memo_key].copy()
+
+    record = None
+    key = None
+    if cache is not None:
+        key = make_key(kind="record", digest=get_files_digest([file_name]))
+        record = cache.get_record(key)
+
+    if record is None:
+        record = pd.read_csv(file_name, header=0)
+        if key is not None:
+            cache.put(key, record=record, meta={"kind": "record", "source": file_name})
+
+    if not memoize:
+        return record
+    _record_memo[memo_key] = record
+    return record.copy()
@@ -0,0 +1,227 @@
+# Simulated method of moments (SMM) calibration of the model parameters against target stylized facts
+from model import make_model_class, split_parameters
+from cache import ResultCache, run_model_cached, make_key, make_model_key, get_code_version
+from stylizedfacts import get_hurst_exponent, get_volume_volatility_correlation
+import scipy.stats as stats
+import pandas as pd
+import numpy as np
+import multiprocessing
+import json
+import time
+import os
+
+dir_calibration = os.path.join('.', 'Data', 'Calibration')
+
+# Typical values of daily stock returns, replace with the targets of the study
+DEFAULT_TARGET_FACTS = {
+    "returns_autocorr": 0.0,                   # no linear predictability of returns
+    "abs_returns_autocorr": 0.2,               # volatility clustering
+    "abs_returns_autocorr_decay": -0.002,      # slow decay of the absolute returns autocorrelation per lag
+    "kurtosis": 5.0,                           # fat tails (excess kurtosis)
+    "hurst": 0.5,                              # no long term memory of returns (random walk of the log price)
+    "volume_volatility_correlation": 0.3,
+}
+
+# Parameter name: (lower bound, upper bound, integer). Upper-case names are model class constants,
+# others are constructor arguments
+DEFAULT_PARAMETER_SPACE = {
+    "TECHNICAL_NORM_FACTOR": (5.0, 50.0, False),
+    "HERDING_PROBABILITY": (0.2, 0.9, False),
+    "SIGMA_ORDER_SIZE": (0.1, 1.0, False),
+}
+
+ACF_LAGS = 35
+
+# Replicates of the pilot point that the fact weights are estimated from
+PILOT_REPLICATES = 10
+
+# The moments read price and order_all_sum only, the other statistics are not collected
+SMM_COLLECTION = {"metrics": ["order"], "groups": ["all"], "stats": ["sum"]}
+
+
+def get_moments(record, acf_lags=ACF_LAGS):
+    """
+    Returns the stylized facts of a single run, computed the same way as in stylizedfacts.py.
+    """
+    returns = pd.Series(record["price"].to_numpy()).pct_change()
+    absolute_returns = returns.abs()
+    lags = np.arange(1, acf_lags)
+    returns_autocorr = np.array([returns[1:].autocorr(lag=lag) for lag in lags])
+    abs_returns_autocorr = np.array([absolute_returns[1:].autocorr(lag=lag) for lag in lags])
+    finite = np.isfinite(abs_returns_autocorr)
+
+    return {
+        "returns_autocorr": np.nanmean(returns_autocorr),
+        "abs_returns_autocorr": np.nanmean(abs_returns_autocorr),
+        "abs_returns_autocorr_decay": np.polyfit(lags[finite], abs_returns_autocorr[finite], 1)[0]
+        if finite.sum() > 1 else np.nan,
+        "kurtosis": returns.kurtosis(),
+        # The variance-of-lags method applies to a price-like series: the cumulative returns
+        "hurst": get_hurst_exponent([returns.cumsum()], lag_1=2, lag_2=20)[0],
+        "volume_volatility_correlation": get_volume_volatility_correlation(
+            [record["order_all_sum"].to_numpy()], [returns])[0],
+    }
+
+
+def get_moments_key(model_cls, model_params, seed, max_steps):
+    return make_key(kind="smm_moments", run=make_model_key(model_cls, model_params, seed, max_steps),
+                    code_version=get_code_version(['calibration.py', 'stylizedfacts.py', 'hurstexponent.py']))
+
+
+def evaluate_run(task):
+    """
+    Returns the moments of one (candidate, seed) run. Moments are cached next to the simulated records,
+    so a candidate that was evaluated before is never simulated again.
+    """
+    parameters, base_params, seed, max_steps = task
+    constants, model_params = split_parameters(parameters)
+    model_cls = make_model_class(constants)
+    model_params = dict(dict(base_params, verbose=False, collection=SMM_COLLECTION), **model_params)
+
+    cache = ResultCache()
+    key = get_moments_key(model_cls, model_params, seed, max_steps)
+    moments = cache.get_facts(key)
+    if moments is None:
+        record = run_model_cached(model_cls, model_params, seed=seed, max_steps=max_steps, cache=cache)
+        moments = get_moments(record)
+        cache.put(key, facts=moments, meta={"kind": "smm_moments", "parameters": parameters, "seed": seed,
+                                            "base_params": base_params, "max_steps": max_steps})
+    return moments
+
+
+class SMMCalibrator:
+    """
+    Minimises the weighted distance between simulated and target stylized facts,
+        J(theta) = sum_k w_k * (mean_k(theta) - target_k)^2,
+    with the means taken over n_replicates runs. All candidates are simulated with the same seeds
+    (common random numbers), so differences between candidates are not blurred by simulation noise.
+    The weights default to the inverse variance of the simulated facts across the replicates of a pilot point
+    (the centre of the parameter space), estimated once so that every candidate is scored with the same weights.
+
+    The search evaluates a Latin hypercube of candidates per round in a process pool, then shrinks the
+    search box around the best candidate for the next round.
+    """
+
+    def __init__(self, targets=None, parameter_space=None, weights=None, base_params=None, n_replicates=5,
+                 max_steps=1530, seed=0, processes=None, output_dir=dir_calibration, pilot_replicates=PILOT_REPLICATES):
+        self.targets = DEFAULT_TARGET_FACTS if targets is None else targets
+        self.parameter_space = DEFAULT_PARAMETER_SPACE if parameter_space is None else parameter_space
+        self.weights = weights
+        self.base_params = {} if base_params is None else base_params
+        self.n_replicates = n_replicates
+        self.max_steps = max_steps
+        self.seeds = list(range(seed, seed + n_replicates))
+        self.pilot_seeds = list(range(seed, seed + pilot_replicates))
+        self.random_state = np.random.RandomState(seed)
+        self.processes = processes
+        self.output_dir = output_dir
+        self.evaluations = []
+
+    def get_pilot_point(self):
+        return {name: int(round((low + high) / 2.0)) if integer else (low + high) / 2.0
+                for name, (low, high, integer) in self.parameter_space.items()}
+
+    def estimate_weights(self, pool=None):
+        """
+        Sets the weights to the inverse variance of the facts across the replicates of the pilot point,
+        unless weights were given, and returns them.
+        """
+        if self.weights is not None:
+            return self.weights
+        tasks = [(self.get_pilot_point(), self.base_params, seed, self.max_steps) for seed in self.pilot_seeds]
+        all_moments = pool.map(evaluate_run, tasks) if pool is not None else list(map(evaluate_run, tasks))
+        # Facts without variance across replicates get unit weight
+        variances = pd.DataFrame(all_moments)[list(self.targets)].var(ddof=1).replace(0.0, np.nan)
+        self.weights = (1.0 / variances).fillna(1.0).to_dict()
+        print("Fact weights:", self.weights)
+        return self.weights
+
+    def get_distance(self, replicate_moments):
+        """
+        Returns the weighted distance of the mean simulated facts to the targets, and the mean facts.
+        """
+        if self.weights is None:
+            raise ValueError("No fact weights, give them or call estimate_weights first")
+        frame = pd.DataFrame(replicate_moments)[list(self.targets)]
+        means = frame.mean()
+        weights = pd.Series(self.weights)
+        distance = sum(weights[name] * (means[name] - target) ** 2 for name, target in self.targets.items())
+        return distance, means.to_dict()
+
+    def sample_candidates(self, n_candidates, bounds):
+        sampler = stats.qmc.LatinHypercube(d=len(bounds), seed=self.random_state)
+        unit_samples = sampler.random(n_candidates)
+        candidates = []
+        for sample in unit_samples:
+            candidate = {}
+            for u, (name, (low, high)) in zip(sample, bounds.items()):
+                value = low + u * (high - low)
+                candidate[name] = int(round(value)) if self.parameter_space[name][2] else float(value)
+            candidates.append(candidate)
+        return candidates
+
+    def evaluate(self, candidates, pool=None):
+        tasks = [(candidate, self.base_params, seed, self.max_steps) for candidate in candidates for seed in self.seeds]
+        all_moments = pool.map(evaluate_run, tasks) if pool is not None else list(map(evaluate_run, tasks))
+
+        results = []
+        for i, candidate in enumerate(candidates):
+            replicate_moments = all_moments[i * self.n_replicates:(i + 1) * self.n_replicates]
+            distance, means = self.get_distance(replicate_moments)
+            result = dict(candidate, distance=distance, **{"fact_" + name: value for name, value in means.items()})
+            results.append(result)
+            self.evaluations.append(result)
+        return results
+
+    def run(self, n_candidates=20, n_rounds=5, shrink=0.5):
+        """
+        Runs the calibration and returns the best candidate. Every evaluation is written to
+        evaluations.csv in the output directory after each round, the best candidate to best.json.
+        """
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        bounds = {name: (low, high) for name, (low, high, _) in self.parameter_space.items()}
+        best = None
+        with multiprocessing.Pool(self.processes) as pool:
+            self.estimate_weights(pool)
+            for round_index in range(n_rounds):
+                start_time = time.time()
+                results = self.evaluate(self.sample_candidates(n_candidates, bounds), pool)
+                round_best = min(results, key=lambda result: result["distance"])
+                if best is None or round_best["distance"] < best["distance"]:
+                    best = round_best
+                print("Round {}: best distance {:.4f} (overall {:.4f}), {:.0f}s".format(
+                    round_index, round_best["distance"], best["distance"], time.time() - start_time))
+
+                # Shrink the search box around the best candidate, within the parameter space
+                for name, (low, high, _) in self.parameter_space.items():
+                    half_width = shrink * (bounds[name][1] - bounds[name][0]) / 2.0
+                    center = min(max(best[name], low + half_width), high - half_width)
+                    bounds[name] = (center - half_width, center + half_width)
+
+                pd.DataFrame(self.evaluations).to_csv(os.path.join(self.output_dir, "evaluations.csv"), index=False)
+
+        with open(os.path.join(self.output_dir, "best.json"), "w") as file:
+            json.dump(best, file, indent=4, sort_keys=True, default=float)
+        return best
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    base_params = dict(
+        initial_fundamentalist=100,
+        initial_technical=100,
+        initial_mimetic=100,
+        initial_noise=100,
+        network_type="small world",
+    )
+    calibrator = SMMCalibrator(base_params=base_params, n_replicates=5, max_steps=1530)
+    best = calibrator.run(n_candidates=20, n_rounds=5)
+    print("Best candidate:", best)
+
+    print("Completed!")
+    end_time = time.time()
+    duration = end_time - start_time
+    print("Processing time: {}".format(duration))
@@ -0,0 +1,260 @@
+# Multi-node runner: a coordinator enqueues (experiment, parameter point, replicate seed) jobs into a SQLite
+# job queue in a shared directory, workers on any machine claim them under a lease and write the records
+# into the experiment directory.
+#   python distributed.py enqueue --replicates 10          (coordinator)
+#   python distributed.py worker                           (on every node, as many as wanted)
+#   python distributed.py status
+#   python distributed.py local --workers 4                (coordinator and workers on this machine)
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from cache import ResultCache, run_model_cached
+from model import make_model_class, split_parameters
+
+QUEUE_FILE = os.path.join('.', 'Data', 'jobs.sqlite')
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    experiment TEXT NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    max_steps INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated REAL,
+    UNIQUE (experiment, params, seed, max_steps)
+)
+"""
+
+
+class JobQueue:
+    """
+    Job queue in a SQLite file. A worker claims a pending job under a lease, renews the lease with heartbeats,
+    and completes or fails it. Jobs whose lease expired (a crashed or disconnected worker) are pending again
+    at the next claim, until they have been attempted MAX_ATTEMPTS times.
+    Claims run in IMMEDIATE transactions, so a job is handed to one worker only. The file must be on a
+    file system with working POSIX locks; this holds for local disks and most NFSv4 mounts.
+    """
+
+    def __init__(self, file_name=QUEUE_FILE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.file_name = file_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(file_name)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(JOB_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.file_name, timeout=60, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return _Transaction(connection)
+
+    def enqueue(self, experiment, params, seed, max_steps):
+        """
+        Adds a job, unless the same job is already queued. Returns True if it was added.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO jobs (experiment, params, seed, max_steps, updated) VALUES (?, ?, ?, ?, ?)",
+                (experiment, json.dumps(params, sort_keys=True), seed, max_steps, time.time()))
+            return cursor.rowcount > 0
+
+    def requeue_expired(self, connection, now):
+        connection.execute("UPDATE jobs SET status = 'pending', worker = NULL "
+                           "WHERE status = 'running' AND lease_expires < ? AND attempts < ?", (now, self.max_attempts))
+        connection.execute("UPDATE jobs SET status = 'failed', error = 'lease expired' "
+                           "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+
+    def claim(self, worker):
+        """
+        Returns the next pending job as a dictionary, leased to the worker, or None when there is none.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            self.requeue_expired(connection, now)
+            row = connection.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, "
+                               "attempts = attempts + 1, updated = ? WHERE id = ?",
+                               (worker, now + self.lease_seconds, now, row["id"]))
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def heartbeat(self, job_id, worker):
+        """
+        Renews the lease of a running job. Returns False if the worker lost the job (its lease expired).
+        """
+        now = time.time()
+        with self._connect() as connection:
+            cursor = connection.execute("UPDATE jobs SET lease_expires = ?, updated = ? "
+                                        "WHERE id = ? AND worker = ? AND status = 'running'",
+                                        (now + self.lease_seconds, now, job_id, worker))
+            return cursor.rowcount > 0
+
+    def complete(self, job_id, worker, result):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL, updated = ? "
+                               "WHERE id = ? AND worker = ?", (json.dumps(result), time.time(), job_id, worker))
+
+    def fail(self, job_id, worker, error):
+        """
+        Records an error; the job is pending again until it has been attempted max_attempts times.
+        """
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                               "worker = NULL, error = ?, lease_expires = NULL, updated = ? WHERE id = ? AND worker = ?",
+                               (self.max_attempts, error, time.time(), job_id, worker))
+
+    def counts(self):
+        with self._connect() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class _Transaction:
+    """
+    An IMMEDIATE transaction on a connection that is closed on exit.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.connection.close()
+
+
+def get_point_id(params):
+    """
+    Short, stable id of a parameter point, used in record file names.
+    """
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def run_job(job, data_dir=os.path.join('.', 'Data')):
+    """
+    Runs the model of a job (through the result cache) and writes its record into the experiment directory.
+    """
+    constants, model_params = split_parameters(job["params"])
+    model_cls = make_model_class(constants)
+    record = run_model_cached(model_cls, dict(model_params, verbose=False), seed=job["seed"],
+                              max_steps=job["max_steps"], cache=ResultCache())
+    dir_exp = os.path.join(data_dir, job["experiment"])
+    os.makedirs(dir_exp, exist_ok=True)
+    file_name = os.path.join(dir_exp, "batch_record_{}_{}.csv".format(get_point_id(job["params"]), job["seed"]))
+    # Written under a temporary name, a record file is always complete
+    record.to_csv(file_name + ".tmp", header=True, index=False)
+    os.replace(file_name + ".tmp", file_name)
+    return {"file": file_name, "rows": len(record)}
+
+
+def run_worker(queue_file=QUEUE_FILE, worker=None, max_jobs=None, idle_seconds=None, poll_seconds=5.0):
+    """
+    Claims and runs jobs until max_jobs were run, or no job was available for idle_seconds (None: forever).
+    A heartbeat thread renews the lease while a job runs.
+    """
+    queue = JobQueue(queue_file)
+    worker = worker or "{}-{}".format(socket.gethostname(), os.getpid())
+    n_jobs = 0
+    idle_since = time.time()
+    while max_jobs is None or n_jobs < max_jobs:
+        job = queue.claim(worker)
+        if job is None:
+            if idle_seconds is not None and time.time() - idle_since >= idle_seconds:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        print("[{}] job {}: {} seed {}".format(worker, job["id"], job["experiment"], job["seed"]))
+        stop_heartbeat = threading.Event()
+
+        def heartbeat():
+            while not stop_heartbeat.wait(min(HEARTBEAT_SECONDS, queue.lease_seconds / 3.0)):
+                if not queue.heartbeat(job["id"], worker):
+                    print("[{}] lost the lease of job {}".format(worker, job["id"]))
+                    return
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            result = run_job(job)
+            queue.complete(job["id"], worker, result)
+        except Exception as e:
+            print(e)
+            queue.fail(job["id"], worker, repr(e))
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+        n_jobs += 1
+        idle_since = time.time()
+    return n_jobs
+
+
+def enqueue_experiment(queue_file, experiment, parameter_points, seeds, max_steps):
+    """
+    Enqueues every (parameter point, seed) job of an experiment, returns the number of new jobs.
+    """
+    queue = JobQueue(queue_file)
+    return sum(queue.enqueue(experiment, params, seed, max_steps) for params in parameter_points for seed in seeds)
+
+
+def _worker_process(queue_file):
+    run_worker(queue_file, idle_seconds=10.0, poll_seconds=1.0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Distributed simulation runner with a SQLite job queue")
+    parser.add_argument("command", choices=["enqueue", "worker", "status", "local"])
+    parser.add_argument("--queue", default=QUEUE_FILE, help="job queue file (on a shared directory)")
+    parser.add_argument("--experiment", default=None, help="experiment name (default: the one of main.py)")
+    parser.add_argument("--params", default=None, help="JSON file with a list of parameter points")
+    parser.add_argument("--replicates", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--max-jobs", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command in ("enqueue", "local"):
+        import main
+        parameter_points = [dict(main.model_params, verbose=False)]
+        if args.params is not None:
+            with open(args.params, "r") as file:
+                parameter_points = json.load(file)
+        n_new = enqueue_experiment(args.queue, args.experiment or main.experiment, parameter_points,
+                                   list(range(args.replicates)), main.max_steps)
+        print("{} jobs enqueued".format(n_new))
+
+    if args.command == "worker":
+        run_worker(args.queue, max_jobs=args.max_jobs)
+    elif args.command == "local":
+        processes = [multiprocessing.Process(target=_worker_process, args=(args.queue,)) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    print(JobQueue(args.queue).counts())
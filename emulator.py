@@ -0,0 +1,341 @@
+# Gaussian-process emulator of the stylized facts of a parameter point, trained on the runs of past
+# experiments and calibrations, to predict facts (with their uncertainty) instead of simulating, and to
+# choose the points worth simulating next (active learning)
+from model import HeterogeneityInArtificialMarket
+from cache import ResultCache, read_record
+from calibration import SMMCalibrator, DEFAULT_PARAMETER_SPACE, DEFAULT_TARGET_FACTS, get_moments
+from distributed import QUEUE_FILE
+import scipy.optimize as optimize
+import scipy.linalg as linalg
+import scipy.stats as stats
+import pandas as pd
+import numpy as np
+import multiprocessing
+import inspect
+import sqlite3
+import json
+import time
+import os
+
+# Runs whose records were collected with other settings do not give comparable facts
+IGNORED_PARAMS = ("verbose", "progress", "collection")
+N_RESTARTS = 3
+MIN_TRAINING_POINTS = 5
+
+
+def get_parameter_defaults(model_cls=HeterogeneityInArtificialMarket):
+    """
+    Returns the default value of every constructor argument and class constant of the model.
+    """
+    defaults = {name: parameter.default for name, parameter in inspect.signature(model_cls.__init__).parameters.items()
+                if parameter.default is not inspect.Parameter.empty}
+    defaults.update({name: getattr(model_cls, name) for name in dir(model_cls)
+                     if name.isupper() and not callable(getattr(model_cls, name))})
+    return defaults
+
+
+_moments_memo = {}
+
+
+def _matches(point, base_params):
+    return all(point.get(name) == value for name, value in base_params.items() if name not in IGNORED_PARAMS)
+
+
+def collect_training_data(parameter_space=None, base_params=None, max_steps=1530, cache=None, queue_file=QUEUE_FILE):
+    """
+    Returns one row per past run (parameter values, seed and facts) of the configuration base_params,
+    from the SMM moments and model runs in the result cache and the records of the job queue experiments.
+    """
+    parameter_space = DEFAULT_PARAMETER_SPACE if parameter_space is None else parameter_space
+    base_params = {} if base_params is None else base_params
+    cache = ResultCache() if cache is None else cache
+    defaults = get_parameter_defaults()
+    rows = {}
+
+    def add(point, seed, facts, source):
+        point = dict(defaults, **point)
+        if not _matches(point, base_params) or point.get("collection_interval", 1) != 1:
+            return
+        values = tuple(float(point[name]) for name in parameter_space)
+        if (values, seed) not in rows:
+            rows[(values, seed)] = dict(zip(parameter_space, values), seed=seed, source=source, **facts)
+
+    for key, meta in cache.iter_meta():
+        if meta.get("max_steps") != max_steps:
+            continue
+        if meta["kind"] == "smm_moments":
+            facts = cache.get_facts(key)
+            if facts is not None:
+                add(dict(meta.get("base_params", {}), **meta["parameters"]), meta["seed"], facts, "smm_moments")
+        elif meta["kind"] == "model_run" and meta.get("model") == HeterogeneityInArtificialMarket.__name__:
+            # The moments of a cached record are computed once per process
+            if key not in _moments_memo:
+                record = cache.get_record(key)
+                _moments_memo[key] = get_moments(record) if record is not None and \
+                    {"price", "order_all_sum"} <= set(record.columns) else None
+            if _moments_memo[key] is not None:
+                add(dict(meta.get("constants", {}), **meta["params"]), meta["seed"], _moments_memo[key], "model_run")
+
+    # Records of the experiments run through the job queue, whose parameters the queue keeps
+    if os.path.exists(queue_file):
+        connection = sqlite3.connect(queue_file)
+        try:
+            jobs = connection.execute("SELECT params, seed, max_steps, result FROM jobs WHERE status = 'done'").fetchall()
+        finally:
+            connection.close()
+        for params, seed, job_max_steps, result in jobs:
+            file_name = json.loads(result)["file"]
+            if job_max_steps == max_steps and os.path.exists(file_name):
+                add(json.loads(params), seed, get_moments(read_record(file_name, memoize=False)), "experiment")
+
+    return pd.DataFrame(list(rows.values()))
+
+
+class GaussianProcess:
+    """
+    Gaussian-process regression of a scalar on the unit box, with a squared exponential kernel with one
+    length scale per input and white noise (replicate scatter). Hyperparameters maximise the marginal likelihood.
+    """
+
+    def __init__(self, n_restarts=N_RESTARTS, seed=0):
+        self.n_restarts = n_restarts
+        self.random_state = np.random.RandomState(seed)
+
+    def _kernel(self, x1, x2, length_scales, signal_variance):
+        distances = ((x1[:, None, :] - x2[None, :, :]) / length_scales) ** 2
+        return signal_variance * np.exp(-0.5 * distances.sum(axis=2))
+
+    def _negative_log_likelihood(self, log_params):
+        length_scales, signal_variance, noise_variance = self._unpack(log_params)
+        covariance = self._kernel(self.x, self.x, length_scales, signal_variance)
+        covariance[np.diag_indices_from(covariance)] += noise_variance + 1e-10
+        try:
+            cholesky = linalg.cho_factor(covariance, lower=True)
+        except linalg.LinAlgError:
+            return 1e25
+        alpha = linalg.cho_solve(cholesky, self.y)
+        return 0.5 * self.y @ alpha + np.log(np.diag(cholesky[0])).sum()
+
+    def _unpack(self, log_params):
+        params = np.exp(log_params)
+        return params[:-2], params[-2], params[-1]
+
+    def fit(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        self.y = (y - self.y_mean) / self.y_std
+
+        n_inputs = self.x.shape[1]
+        # log length scales within [0.01, 100] of the unit box, signal and noise variances of the standardised facts
+        bounds = [(np.log(1e-2), np.log(1e2))] * n_inputs + [(np.log(1e-2), np.log(1e2)), (np.log(1e-6), np.log(1e1))]
+        starts = [np.r_[np.zeros(n_inputs) + np.log(0.5), 0.0, np.log(0.1)]]
+        starts += [np.array([self.random_state.uniform(low, high) for low, high in bounds])
+                   for _ in range(self.n_restarts)]
+        best = None
+        for start in starts:
+            result = optimize.minimize(self._negative_log_likelihood, start, method="L-BFGS-B", bounds=bounds)
+            if best is None or result.fun < best.fun:
+                best = result
+        self.length_scales, self.signal_variance, self.noise_variance = self._unpack(best.x)
+
+        covariance = self._kernel(self.x, self.x, self.length_scales, self.signal_variance)
+        covariance[np.diag_indices_from(covariance)] += self.noise_variance + 1e-10
+        self.cholesky = linalg.cho_factor(covariance, lower=True)
+        self.alpha = linalg.cho_solve(self.cholesky, self.y)
+        return self
+
+    def predict(self, x):
+        """
+        Returns the predicted mean and standard deviation (of the mean, without replicate noise) at the points x.
+        """
+        x = np.asarray(x, dtype=float)
+        cross_covariance = self._kernel(x, self.x, self.length_scales, self.signal_variance)
+        mean = cross_covariance @ self.alpha
+        v = linalg.cho_solve(self.cholesky, cross_covariance.T)
+        variance = np.maximum(self.signal_variance - np.sum(cross_covariance * v.T, axis=1), 0.0)
+        return self.y_mean + self.y_std * mean, self.y_std * np.sqrt(variance)
+
+
+class FactsEmulator:
+    """
+    One Gaussian process per stylized fact, on the parameter space scaled to the unit box.
+    Replicates of a parameter point are averaged before fitting. Unless weights are given, the fact weights are
+    the inverse variance of the replicates in the data of the first fit, and are kept for later fits so that
+    distances stay comparable across rounds.
+    """
+
+    def __init__(self, parameter_space=None, targets=None, weights=None, n_restarts=N_RESTARTS, seed=0):
+        self.parameter_space = DEFAULT_PARAMETER_SPACE if parameter_space is None else parameter_space
+        self.targets = DEFAULT_TARGET_FACTS if targets is None else targets
+        self.weights = weights
+        self.fact_weights = None if weights is None else dict(weights)
+        self.n_restarts = n_restarts
+        self.random_state = np.random.RandomState(seed)
+        self.models = {}
+        self.n_points = 0
+
+    def _scale(self, points):
+        points = pd.DataFrame(points)
+        lows = np.array([low for low, _, _ in self.parameter_space.values()])
+        highs = np.array([high for _, high, _ in self.parameter_space.values()])
+        return (points[list(self.parameter_space)].to_numpy(dtype=float) - lows) / (highs - lows)
+
+    def fit(self, data):
+        """
+        Fits the emulator to training data (one row per run, as returned by collect_training_data).
+        """
+        names = list(self.parameter_space)
+        facts = [fact for fact in self.targets if fact in data.columns]
+        data = data.dropna(subset=facts)
+        points = data.groupby(names)[facts].mean().reset_index()
+        self.n_points = len(points)
+        if self.n_points < MIN_TRAINING_POINTS:
+            raise ValueError("Too few parameter points to fit the emulator: {}".format(self.n_points))
+
+        if self.fact_weights is None:
+            # Pooled variance of the replicates of a point, or the variance across points without replicates
+            replicate_variance = data.groupby(names)[facts].var(ddof=1).mean()
+            replicate_variance = replicate_variance.fillna(data[facts].var(ddof=1)).replace(0.0, np.nan)
+            self.fact_weights = (1.0 / replicate_variance).fillna(1.0).to_dict()
+
+        x = self._scale(points)
+        for fact in facts:
+            self.models[fact] = GaussianProcess(self.n_restarts, seed=self.random_state.randint(2 ** 31)).fit(x, points[fact])
+        return self
+
+    def predict(self, points):
+        """
+        Returns the predicted facts and their standard deviations at the points, as two dataframes.
+        """
+        x = self._scale(points)
+        means, stds = {}, {}
+        for fact, model in self.models.items():
+            means[fact], stds[fact] = model.predict(x)
+        return pd.DataFrame(means), pd.DataFrame(stds)
+
+    def get_expected_distance(self, points):
+        """
+        Returns the expected SMM distance of the points to the targets, sum_k w_k * E[(fact_k - target_k)^2],
+        and the standard deviation of the predicted distance (first order).
+        """
+        means, stds = self.predict(points)
+        distance = np.zeros(len(means))
+        variance = np.zeros(len(means))
+        for fact in self.models:
+            error = means[fact].to_numpy() - self.targets[fact]
+            weight = self.fact_weights[fact]
+            distance += weight * (error ** 2 + stds[fact].to_numpy() ** 2)
+            variance += (2.0 * weight * error * stds[fact].to_numpy()) ** 2
+        return distance, np.sqrt(variance)
+
+    def is_confident(self, points, tolerance=0.5):
+        """
+        Returns for every point whether all facts are predicted within tolerance replicate standard deviations,
+        so that simulating the point would tell little.
+        """
+        _, stds = self.predict(points)
+        confident = np.ones(len(stds), dtype=bool)
+        for fact in self.models:
+            confident &= stds[fact].to_numpy() * np.sqrt(self.fact_weights[fact]) <= tolerance
+        return confident
+
+    def sample_points(self, n_points):
+        sampler = stats.qmc.LatinHypercube(d=len(self.parameter_space), seed=self.random_state)
+        points = []
+        for sample in sampler.random(n_points):
+            point = {}
+            for u, (name, (low, high, integer)) in zip(sample, self.parameter_space.items()):
+                value = low + u * (high - low)
+                point[name] = int(round(value)) if integer else float(value)
+            points.append(point)
+        return points
+
+    def propose(self, n_points, n_candidates=2000, kappa=2.0, min_separation=0.05):
+        """
+        Proposes the points to simulate next: the most uncertain of the candidates that may still beat the best
+        predicted distance (lower confidence bound within it), kept min_separation apart on the unit box.
+        """
+        candidates = self.sample_points(n_candidates)
+        distance, distance_std = self.get_expected_distance(candidates)
+        lower_bound = distance - kappa * distance_std
+        plausible = lower_bound <= (distance + kappa * distance_std).min()
+        # The most uncertain plausible candidates first, then the most promising others
+        order = np.lexsort((lower_bound, -np.where(plausible, distance_std, -np.inf)))
+
+        x = self._scale(candidates)
+        chosen = []
+        for index in order:
+            if all(np.linalg.norm(x[index] - x[other]) >= min_separation for other in chosen):
+                chosen.append(index)
+            if len(chosen) == n_points:
+                break
+        return [candidates[index] for index in chosen]
+
+
+def run_active_learning(calibrator, n_rounds=5, batch_size=8, n_initial=16, min_points=20, tolerance=0.5,
+                        emulator=None):
+    """
+    Alternates fitting the emulator to all runs of the calibrator's configuration (past ones included) and
+    simulating the points it proposes. Once it has min_points parameter points (a reliable noise estimate),
+    proposed points predicted within tolerance are not simulated, and it stops when all of them are.
+    Returns the fitted emulator and the best simulated point.
+    """
+    best = None
+    with multiprocessing.Pool(calibrator.processes) as pool:
+        # The emulator scores points with the calibrator's weights, estimated once
+        calibrator.estimate_weights(pool)
+        emulator = FactsEmulator(calibrator.parameter_space, calibrator.targets, calibrator.weights) \
+            if emulator is None else emulator
+        for round_index in range(n_rounds):
+            start_time = time.time()
+            data = collect_training_data(calibrator.parameter_space, calibrator.base_params, calibrator.max_steps)
+            n_points = 0 if len(data) == 0 else len(data.groupby(list(calibrator.parameter_space)))
+            if n_points < MIN_TRAINING_POINTS:
+                # Nothing to learn from yet, space-filling design
+                points = emulator.sample_points(max(n_initial, MIN_TRAINING_POINTS))
+            else:
+                emulator.fit(data)
+                points = emulator.propose(batch_size)
+                if n_points >= min_points:
+                    points = [point for point, confident in zip(points, emulator.is_confident(points, tolerance))
+                              if not confident]
+                if len(points) == 0:
+                    print("Round {}: the emulator is confident everywhere it could improve".format(round_index))
+                    break
+
+            results = calibrator.evaluate(points, pool)
+            round_best = min(results, key=lambda result: result["distance"])
+            if best is None or round_best["distance"] < best["distance"]:
+                best = round_best
+            print("Round {}: {} training points, {} simulated, best distance {:.4f}, {:.0f}s".format(
+                round_index, n_points, len(points), best["distance"], time.time() - start_time))
+
+    emulator.fit(collect_training_data(calibrator.parameter_space, calibrator.base_params, calibrator.max_steps))
+    return emulator, best
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    base_params = dict(
+        initial_fundamentalist=100,
+        initial_technical=100,
+        initial_mimetic=100,
+        initial_noise=100,
+        network_type="small world",
+    )
+    calibrator = SMMCalibrator(base_params=base_params, n_replicates=5, max_steps=1530)
+    emulator, best = run_active_learning(calibrator, n_rounds=10, batch_size=8)
+    print("Best simulated candidate:", best)
+
+    # Emulated facts of a few points, no simulation needed
+    points = emulator.sample_points(5)
+    means, stds = emulator.predict(points)
+    print(pd.concat([pd.DataFrame(points), means.add_prefix("fact_"), stds.add_prefix("std_")], axis=1))
+
+    print("Completed!")
+    end_time = time.time()
+    duration = end_time - start_time
+    print("Processing time: {}".format(duration))
@@ -0,0 +1,315 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+# Compact trader type codes of the event log
+TRADER_TYPE_CODES = {"Fundamentalist": 0, "Technical": 1, "Mimetic": 2, "Noise": 3}
+
+EVENT_DTYPE = np.dtype([("step", np.int32), ("trader_id", np.int32), ("type", np.int8),
+                        ("size", np.float64), ("price", np.float64)])
+
+
+class TradeLog:
+    """
+    Append-only, typed log of the non-zero orders of all traders as (step, trader_id, type, size, price) records,
+    plus the opening and closing price of every step. Agent histories (order, position, cash, portfolio, net wealth) are sparse views
+    derived from it, so memory scales with trading activity instead of agents x steps.
+    """
+
+    def __init__(self, capacity=4096):
+        self.events = np.empty(capacity, dtype=EVENT_DTYPE)
+        self.n_events = 0
+        self.step_prices = []
+        # Closing prices of the steps repriced within the step (intraday order batches), the others close at
+        # their opening price
+        self.close_prices = {}
+
+    def __len__(self):
+        return self.n_events
+
+    def start_step(self, step, price):
+        """
+        Records the price at which the traders of a step trade.
+        """
+        while len(self.step_prices) <= step:
+            self.step_prices.append(price)
+        self.step_prices[step] = price
+
+    def get_step_price(self, step):
+        return self.step_prices[step]
+
+    def close_step(self, step, price):
+        """
+        Records the price at which a step closed.
+        """
+        if price != self.step_prices[step]:
+            self.close_prices[step] = price
+
+    def get_close_price(self, step):
+        return self.close_prices.get(step, self.step_prices[step])
+
+    def record(self, step, trader_id, trader_type, size, price):
+        """
+        Appends an order event and returns its index in the log.
+        """
+        if self.n_events == len(self.events):
+            # Geometric growth keeps appends amortised O(1)
+            events = np.empty(2 * len(self.events), dtype=EVENT_DTYPE)
+            events[:self.n_events] = self.events[:self.n_events]
+            self.events = events
+        self.events[self.n_events] = (step, trader_id, TRADER_TYPE_CODES[trader_type], size, price)
+        self.n_events += 1
+        return self.n_events - 1
+
+    def get_events(self, trader_id=None, trader_type=None):
+        """
+        Returns the recorded events, optionally of a single trader or trader type.
+        """
+        events = self.events[:self.n_events]
+        if trader_id is not None:
+            events = events[events["trader_id"] == trader_id]
+        if trader_type is not None:
+            events = events[events["type"] == TRADER_TYPE_CODES[trader_type]]
+        return events
+
+    def get_size(self, event_id):
+        return self.events["size"][event_id]
+
+    def to_frame(self):
+        import pandas as pd
+        frame = pd.DataFrame(self.get_events())
+        codes = {code: name for name, code in TRADER_TYPE_CODES.items()}
+        frame["type"] = frame["type"].map(codes)
+        return frame
+
+
+class SparseHistory(ABC):
+    """
+    Base of the lazy per-agent histories: a read-only sequence of one value per step, indexable like a list
+    (including negative indices), with O(1) access to the latest value.
+    A history with an owner (the trader) lets it catch up on the steps it slept through before every read.
+    """
+
+    def __init__(self, owner=None):
+        self.length = 0
+        self.owner = owner
+
+    def _sync(self):
+        if self.owner is not None:
+            self.owner.catch_up()
+
+    def __len__(self):
+        self._sync()
+        return self.length
+
+    def _normalize(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("history index out of range")
+        return index
+
+    def __getitem__(self, index):
+        self._sync()
+        if isinstance(index, slice):
+            return [self.get(i) for i in range(*index.indices(self.length))]
+        return self.get(self._normalize(index))
+
+    def __iter__(self):
+        self._sync()
+        return (self.get(i) for i in range(self.length))
+
+    @abstractmethod
+    def get(self, index):
+        pass
+
+    def dense(self):
+        """
+        Reconstructs the dense history as an array.
+        """
+        self._sync()
+        return np.array([self.get(i) for i in range(self.length)], dtype=float)
+
+
+class OrderHistory(SparseHistory):
+    """
+    Orders of a trader: zero by default, non-zero orders are appended to the trade log.
+    Also folds the cash after every event, in the same order of operations as a dense cash history.
+    """
+
+    def __init__(self, trader, trade_log, initial_cash):
+        super().__init__(trader)
+        self.trader = trader
+        self.trade_log = trade_log
+        self.trader_type = type(trader).__name__
+        self.initial_cash = initial_cash
+
+        self.indices = []
+        self.event_ids = []
+        self.cash_after = []
+        self.last = 0
+
+        self.append(0)
+
+    def append(self, order):
+        if order != 0:
+            price = self.trader.market_maker.get_current_price()
+            event_id = self.trade_log.record(self.trader.model.schedule.time, self.trader.unique_id,
+                                             self.trader_type, order, price)
+            last_cash = self.cash_after[-1] if self.cash_after else self.initial_cash
+            self.indices.append(self.length)
+            self.event_ids.append(event_id)
+            self.cash_after.append(last_cash - order * price)
+        self.last = order
+        self.length += 1
+
+    def extend_zeros(self, n_steps):
+        """
+        Appends the zero orders of n_steps steps without trading.
+        """
+        if n_steps > 0:
+            self.last = 0
+            self.length += n_steps
+
+    def get(self, index):
+        if index == self.length - 1:
+            return self.last
+        position = bisect_left(self.indices, index)
+        if position < len(self.indices) and self.indices[position] == index:
+            return self.trade_log.get_size(self.event_ids[position])
+        return 0
+
+    def get_cash(self, index):
+        """
+        Cash after the order at the given index.
+        """
+        if index >= self.length - 1:
+            return self.cash_after[-1] if self.cash_after else self.initial_cash
+        position = bisect_right(self.indices, index) - 1
+        return self.cash_after[position] if position >= 0 else self.initial_cash
+
+
+class PositionHistory(SparseHistory):
+    """
+    Positions of a trader, stored as change points and carried forward in between.
+    """
+
+    def __init__(self, initial_position=0, owner=None):
+        super().__init__(owner)
+        self.indices = []
+        self.values = []
+        self.last = None
+        self.append(initial_position)
+
+    def append(self, position):
+        self.extend(position, 1)
+
+    def extend(self, position, n_steps):
+        """
+        Appends the same position for n_steps steps.
+        """
+        if n_steps <= 0:
+            return
+        if self.length == 0 or position != self.last:
+            self.indices.append(self.length)
+            self.values.append(position)
+        self.last = position
+        self.length += n_steps
+
+    def get(self, index):
+        if index == self.length - 1:
+            return self.last
+        return self.values[bisect_right(self.indices, index) - 1]
+
+
+class CashHistory(SparseHistory):
+    """
+    Cash of a trader, derived from its order events.
+    """
+
+    def __init__(self, orders, owner=None):
+        super().__init__(owner)
+        self.orders = orders
+        self.length = 1
+
+    def advance(self, n_steps=1):
+        self.length += n_steps
+
+    def get(self, index):
+        return self.orders.get_cash(index)
+
+
+class PortfolioHistory(SparseHistory):
+    """
+    Portfolio value of a trader, derived from its positions and the step prices of the trade log.
+    Entry i > 0 is valued at the price of step i - 1, when it was recorded: the opening price of the step,
+    the intraday price of a trade repriced within the step (kept per entry), or the closing price for the steps
+    a trader slept through.
+    """
+
+    def __init__(self, positions, trade_log, owner=None):
+        super().__init__(owner)
+        self.positions = positions
+        self.trade_log = trade_log
+        self.last = 0
+        self.length = 1
+
+        # Entries valued at another price than the opening price of their step
+        self.price_indices = []
+        self.prices = []
+        # Ranges [start, end) of entries valued at the closing price of their step
+        self.close_starts = []
+        self.close_ends = []
+
+    def advance(self, price):
+        if price != self.trade_log.get_step_price(self.length - 1):
+            self.price_indices.append(self.length)
+            self.prices.append(price)
+        self.last = self.positions.last * price
+        self.length += 1
+
+    def extend_closed(self, n_steps):
+        """
+        Appends n_steps entries valued at the closing prices of their steps.
+        """
+        if n_steps <= 0:
+            return
+        self.close_starts.append(self.length)
+        self.close_ends.append(self.length + n_steps)
+        self.length += n_steps
+        self.last = self.positions.get(self.length - 1) * self.trade_log.get_close_price(self.length - 2)
+
+    def get(self, index):
+        if index == self.length - 1:
+            return self.last
+        if index == 0:
+            return 0
+        position = bisect_left(self.price_indices, index)
+        if position < len(self.price_indices) and self.price_indices[position] == index:
+            return self.positions.get(index) * self.prices[position]
+        position = bisect_right(self.close_starts, index) - 1
+        if position >= 0 and index < self.close_ends[position]:
+            return self.positions.get(index) * self.trade_log.get_close_price(index - 1)
+        return self.positions.get(index) * self.trade_log.get_step_price(index - 1)
+
+
+class WealthHistory(SparseHistory):
+    """
+    Net wealth of a trader, cash plus portfolio.
+    """
+
+    def __init__(self, cash, portfolio, owner=None):
+        super().__init__(owner)
+        self.cash = cash
+        self.portfolio = portfolio
+        self.last = cash.get(0)
+        self.length = 1
+
+    def advance(self, n_steps=1):
+        self.length += n_steps
+        self.last = self.cash.get(self.length - 1) + self.portfolio.get(self.length - 1)
+
+    def get(self, index):
+        if index == self.length - 1:
+            return self.last
+        return self.cash.get(index) + self.portfolio.get(index)
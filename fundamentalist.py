@@ -11,11 +11,11 @@ class Fundamentalist(Trader):
         super().__init__(unique_id, model_reference)
 
         self.perception_offset = draw_from_uniform(model_reference.VALUE_PERCEPTION_MIN,
-                                                   model_reference.VALUE_PERCEPTION_MAX)
+                                                   model_reference.VALUE_PERCEPTION_MAX, self.parameter_stream)
         self.entry_threshold = draw_from_uniform(model_reference.ENTRY_THRESHOLD_MIN,
-                                                 model_reference.ENTRY_THRESHOLD_MAX)
+                                                 model_reference.ENTRY_THRESHOLD_MAX, self.parameter_stream)
         self.exit_threshold = draw_from_uniform(model_reference.EXIT_THRESHOLD_MIN,
-                                                model_reference.EXIT_THRESHOLD_MAX)
+                                                model_reference.EXIT_THRESHOLD_MAX, self.parameter_stream)
 
         self.current_price = 0.0
         self.value_perception = 0.0
@@ -0,0 +1,109 @@
+import numpy as np
+
+from bootstrap import bootstrap_interval
+
+# Estimators of the Hurst exponent, each applied to a whole (replicates x steps) matrix at once.
+# Series of one replicate are rows; a 1-D series is treated as a single replicate.
+
+
+def _as_matrix(series):
+    series = np.asarray(series, dtype=float)
+    if series.ndim == 1:
+        series = series[np.newaxis, :]
+    return series
+
+
+def _default_windows(n_steps, min_window=10, n_windows=20):
+    """
+    Log-spaced window sizes between min_window and half the series length.
+    """
+    max_window = max(min_window + 1, n_steps // 2)
+    return np.unique(np.logspace(np.log10(min_window), np.log10(max_window), n_windows).astype(int))
+
+
+def _log_log_slopes(x, y):
+    """
+    Least squares slopes of log(y) against log(x), per row of y (replicates x points).
+    """
+    log_x = np.log(np.asarray(x, dtype=float))
+    log_y = np.log(y)
+    centered_x = log_x - log_x.mean()
+    centered_y = log_y - log_y.mean(axis=1, keepdims=True)
+    return (centered_y @ centered_x) / np.sum(centered_x ** 2)
+
+
+def hurst_variance(series, lags=range(2, 20)):
+    """
+    Variance-of-lags method: the standard deviation of lagged differences scales as lag^H.
+    Applied to the series itself (price-like), as the original stylized facts did.
+    Adapted from https://robotwealth.com/demystifying-the-hurst-exponent-part-1/
+    """
+    series = _as_matrix(series)
+    lags = list(lags)
+    tau = np.empty((series.shape[0], len(lags)))
+    for j, lag in enumerate(lags):
+        # Views of the series shifted by lag, differenced for all replicates at once
+        tau[:, j] = np.sqrt(np.std(series[:, lag:] - series[:, :-lag], axis=1))
+    return 2.0 * _log_log_slopes(lags, tau)
+
+
+def hurst_rescaled_range(series, windows=None):
+    """
+    Rescaled range (R/S) analysis of increments (e.g. returns): the mean R/S over non-overlapping windows
+    of size n scales as n^H.
+    """
+    series = _as_matrix(series)
+    n_replicates, n_steps = series.shape
+    windows = _default_windows(n_steps) if windows is None else np.asarray(windows)
+
+    rescaled_ranges = np.empty((n_replicates, len(windows)))
+    for j, window in enumerate(windows):
+        n_chunks = n_steps // window
+        chunks = series[:, :n_chunks * window].reshape(n_replicates, n_chunks, window)
+        profile = np.cumsum(chunks - chunks.mean(axis=2, keepdims=True), axis=2)
+        ranges = profile.max(axis=2) - profile.min(axis=2)
+        deviations = chunks.std(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(deviations > 0, ranges / deviations, np.nan)
+        rescaled_ranges[:, j] = np.nanmean(ratios, axis=1)
+    return _log_log_slopes(windows, rescaled_ranges)
+
+
+def hurst_dfa(series, windows=None, order=1):
+    """
+    Detrended fluctuation analysis of increments (e.g. returns): the root mean square of the integrated series,
+    detrended with a polynomial of the given order in non-overlapping windows of size n, scales as n^H.
+    """
+    series = _as_matrix(series)
+    n_replicates, n_steps = series.shape
+    windows = _default_windows(n_steps) if windows is None else np.asarray(windows)
+
+    profile = np.cumsum(series - series.mean(axis=1, keepdims=True), axis=1)
+    fluctuations = np.empty((n_replicates, len(windows)))
+    for j, window in enumerate(windows):
+        n_chunks = n_steps // window
+        chunks = profile[:, :n_chunks * window].reshape(n_replicates, n_chunks, window)
+        # Polynomial fits of all windows of all replicates at once, through the pseudo-inverse
+        vandermonde = np.vander(np.arange(window, dtype=float), order + 1)
+        coefficients = chunks @ np.linalg.pinv(vandermonde).T
+        residuals = chunks - coefficients @ vandermonde.T
+        fluctuations[:, j] = np.sqrt(np.mean(residuals ** 2, axis=(1, 2)))
+    return _log_log_slopes(windows, fluctuations)
+
+
+HURST_METHODS = {
+    "variance": hurst_variance,
+    "rescaled_range": hurst_rescaled_range,
+    "dfa": hurst_dfa,
+}
+
+
+def get_hurst_exponents(series, method="variance", n_bootstrap=0, confidence=0.95, seed=None, **kwargs):
+    """
+    Hurst exponent of every replicate with the chosen method, and optionally a bootstrap confidence interval
+    of their mean, returned as (exponents, (low, high)).
+    """
+    exponents = HURST_METHODS[method](series, **kwargs)
+    if n_bootstrap <= 0:
+        return exponents
+    return exponents, bootstrap_interval(exponents, np.mean, n_bootstrap, confidence, seed)
@@ -1,36 +1,32 @@
-from numpy import *
-from pylab import plot, show
+import numpy as np
 
-from hurst import compute_Hc, random_walk
+from hurstexponent import hurst_variance, hurst_rescaled_range, hurst_dfa, get_hurst_exponents
+
+# Replicates of a random walk (H = 0.5), one per row
+np.random.seed(42)
+n_replicates = 20
+n_steps = 99999
+random_changes = 1. + np.random.randn(n_replicates, n_steps) / 1000.
+series = np.cumprod(random_changes, axis=1)  # create random walks from random changes
+returns = random_changes - 1.
+print("series", series[0])
 
 # Method 1
-# first, create an arbitrary time series, ts
-ts = [0]
-for i in range(1,100000):
-    ts.append(ts[i-1]*1.0 + random.randn())
-print("ts", array(ts))
+# Standard deviation of the differenced series using various lags (price series)
+hurst_1 = hurst_variance(series, lags=range(2, 20))
+print('hurst_1 = ', hurst_1.mean())
 
 # Method 2
-# Use random_walk() function or generate a random walk series manually:
-# series = random_walk(99999, cumprod=True)
-random.seed(42)
-random_changes = 1. + random.randn(99999) / 1000.
-series = cumprod(random_changes)  # create a random walk from random changes
-print("series", series)
-
+# Rescaled range of the returns
+hurst_2 = hurst_rescaled_range(returns)
+print('hurst_2 = ', hurst_2.mean())
 
-# Method 1
-# calculate standard deviation of differenced series using various lags
-lags = range(2, 20)
-tau = [sqrt(std(subtract(series[lag:], series[:-lag]))) for lag in lags]
-# plot on log-log scale
-# plot(log(lags), log(tau)); show()
-# calculate Hurst as slope of log-log plot
-m = polyfit(log(lags), log(tau), 1)
-hurst = m[0]*2.0
-print('hurst_1 = ',hurst)
+# Method 3
+# Detrended fluctuation analysis of the returns
+hurst_3 = hurst_dfa(returns)
+print('hurst_3 = ', hurst_3.mean())
 
-# Method 2
-# Evaluate Hurst equation
-H, c, data = compute_Hc(series, kind='price', simplified=True)
-print('hurst_2 = ',H)
\ No newline at end of file
+# Bootstrap confidence intervals of the mean across replicates
+for method, values in [("variance", series), ("rescaled_range", returns), ("dfa", returns)]:
+    exponents, (low, high) = get_hurst_exponents(values, method=method, n_bootstrap=1000, seed=42)
+    print('{}: {:.3f} [{:.3f}, {:.3f}]'.format(method, exponents.mean(), low, high))
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Wealth distribution statistics added to the recorded columns
+INEQUALITY_STATS = ["gini", "top1_share", "top10_share", "tail_index"]
+
+# Points of the Lorenz curve the Gini coefficient is computed from
+LORENZ_POINTS = 100
+
+
+def gini(values, n_quantiles=LORENZ_POINTS):
+    """
+    Gini coefficient of the given values, from a Lorenz curve with n_quantiles points obtained by partial
+    selection (np.partition), which costs O(N log n_quantiles) and underestimates by at most 1/n_quantiles.
+    With n_quantiles None (or at least the population) the values are sorted and the coefficient is exact.
+    Net wealth can be negative, in which case the coefficient is not bounded by 1.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    total = values.sum()
+    if n < 2 or total == 0:
+        return np.nan
+
+    if n_quantiles is None or n_quantiles >= n:
+        sorted_values = np.sort(values)
+        ranks = np.arange(1, n + 1)
+        return (2.0 * np.sum(ranks * sorted_values) / (n * total)) - (n + 1.0) / n
+
+    # Group boundaries, values are only ordered between groups
+    boundaries = np.linspace(0, n, n_quantiles + 1).astype(int)
+    partitioned = np.partition(values, boundaries[1:-1])
+    group_sums = np.add.reduceat(partitioned, boundaries[:-1])
+    group_shares = np.diff(boundaries) / n
+    lorenz = np.concatenate(([0.0], np.cumsum(group_sums) / total))
+    return 1.0 - np.sum(group_shares * (lorenz[1:] + lorenz[:-1]))
+
+
+def top_share(values, fraction):
+    """
+    Share of the total held by the top fraction of the population, by partial selection in O(N).
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    total = values.sum()
+    if n == 0 or total <= 0:
+        return np.nan
+    k = max(1, int(np.ceil(fraction * n)))
+    return np.partition(values, n - k)[n - k:].sum() / total
+
+
+def hill_tail_index(values, tail_fraction=0.1):
+    """
+    Hill estimator of the Pareto tail index of the positive values, from the top tail_fraction order statistics.
+    Only those k + 1 values are sorted, after an O(N) partial selection.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[values > 0]
+    n = len(values)
+    k = int(tail_fraction * n)
+    if k < 2:
+        return np.nan
+    tail = np.sort(np.partition(values, n - k - 1)[n - k - 1:])
+    log_tail = np.log(tail)
+    log_excess = np.sum(log_tail[1:] - log_tail[0])
+    return k / log_excess if log_excess > 0 else np.nan
+
+
+def get_inequality_stats(values):
+    """
+    Returns all INEQUALITY_STATS of the given values.
+    """
+    return {
+        "gini": gini(values),
+        "top1_share": top_share(values, 0.01),
+        "top10_share": top_share(values, 0.10),
+        "tail_index": hill_tail_index(values),
+    }
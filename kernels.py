@@ -0,0 +1,130 @@
+import numpy as np
+
+# Numba is optional: when it is installed the kernels below are compiled,
+# otherwise the very same functions run as plain Python/NumPy.
+# Set NUMBA_DISABLE_JIT=1 to force the fallback with numba installed.
+# Transcendental functions (exp, arctan) are left to NumPy's ufuncs outside the kernels: math.* and numba's
+# versions differ from them in the last bit for some inputs, which changes seeded runs after a few crossovers.
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+@njit(cache=True)
+def update_price(last_price, last_order, liquidity, noise):
+    """
+    Market maker price recursion, P_t = P_{t-1} + order / liquidity + noise, floored at zero.
+    """
+    current_price = last_price + last_order / liquidity + noise
+    if current_price < 0:
+        current_price = 0.0
+    return current_price
+
+
+@njit(cache=True)
+def update_value(last_value, increment, time_step, trend_size, trend_start, trend_end):
+    """
+    Fundamental value random walk, V_t = V_{t-1} + increment (+ trend_size within the trend period).
+    """
+    current_value = last_value + increment
+    if trend_start <= time_step < trend_end:
+        current_value += trend_size
+    return current_value
+
+
+@njit(cache=True)
+def value_path(initial_value, increments, first_time_step, trend_size, trend_start, trend_end):
+    """
+    Runs the fundamental value random walk over several steps, returns the values following initial_value.
+    """
+    values = np.empty(len(increments))
+    last_value = initial_value
+    for i in range(len(increments)):
+        last_value = update_value(last_value, increments[i], first_time_step + i, trend_size, trend_start, trend_end)
+        values[i] = last_value
+    return values
+
+
+@njit(cache=True)
+def price_path(initial_price, orders, noises, liquidity):
+    """
+    Runs the price recursion over several steps for given net orders and noise terms.
+    """
+    prices = np.empty(len(orders))
+    last_price = initial_price
+    for i in range(len(orders)):
+        last_price = update_price(last_price, orders[i], liquidity, noises[i])
+        prices[i] = last_price
+    return prices
+
+
+@njit(cache=True)
+def moving_average(prices, window):
+    """
+    Sum of the prices (summed in order, as the builtin sum) divided by the window length.
+    """
+    total = 0.0
+    for i in range(len(prices)):
+        total += prices[i]
+    return total / window
+
+
+@njit(cache=True)
+def technical_position(previous_position, last_position, last_short_ma, last_long_ma, short_ma, long_ma,
+                       slope, current_price, exit_low, exit_high, normalization_constant, within_risk_tolerance):
+    """
+    Crossover state machine of a technical trader, returns its new position.
+    exit_low and exit_high are the extremes of the exit window, only used when a position is open.
+    """
+    target_position = normalization_constant * abs(slope)
+    if previous_position == 0:
+        # Short term MA crosses long term MA from below: open a long position
+        if last_short_ma < last_long_ma and short_ma >= long_ma:
+            return target_position
+        # Short term MA crosses long term MA from above: open a short position
+        elif last_short_ma > last_long_ma and short_ma <= long_ma:
+            return -1 * target_position
+        return 0.0
+    elif previous_position > 0:
+        # Liquidate when the current price is the lowest of the exit window
+        if current_price <= exit_low:
+            return 0.0
+        return target_position if within_risk_tolerance else last_position
+    elif previous_position < 0:
+        # Liquidate when the current price is the highest of the exit window
+        if current_price >= exit_high:
+            return 0.0
+        return -1 * target_position if within_risk_tolerance else last_position
+    return last_position
+
+
+@njit(cache=True)
+def normalize(weights):
+    """
+    Weights divided by their total (summed in order, as the builtin sum), e.g. np.exp(w) for a softmax.
+    """
+    total = 0.0
+    for i in range(len(weights)):
+        total += weights[i]
+    return weights / total
+
+
+@njit(cache=True)
+def choose_index(probabilities, uniform_sample):
+    """
+    Draws an index from a discrete distribution given a uniform sample in [0, 1),
+    with the same inverse-cdf rule as numpy.random.choice, so that both agree for the same random state.
+    """
+    cdf = np.cumsum(probabilities)
+    total = cdf[-1]
+    for i in range(len(cdf)):
+        if uniform_sample < cdf[i] / total:
+            return i
+    return len(cdf) - 1
@@ -1,5 +1,9 @@
 from mesa.batchrunner import FixedBatchRunner
 from model import *
+from cache import ResultCache, run_model_cached
+from progress import ProgressReporter, ProgressMonitor
+from panel import AgentPanelRecorder
+from sharedresults import SharedRecords, get_record_columns
 import multiprocessing
 import time
 import os
@@ -10,19 +14,55 @@ dir_exp = os.path.join(dir_data, experiment)
 if not os.path.exists(dir_exp):
     os.makedirs(dir_exp)
 
+max_steps = 1530
+model_params = dict(
+    initial_fundamentalist=100,
+    initial_technical=100,
+    initial_mimetic=100,
+    initial_noise=100,
+    network_type="small world",
+    verbose=True
+)
+
+# Per-agent panel (wealth, position, cash, type, risk tolerance) every panel_every steps, None to disable
+panel_every = None
+panel_sample_size = None
+
+# Workers write their records into one shared (replicates x steps x columns) array instead of a CSV each,
+# saved by the parent as batch_records.npy
+shared_memory_mode = False
+
+progress_queue = None
+shared_records = None
+
+def init_worker(queue, records_spec=None):
+    global progress_queue, shared_records
+    progress_queue = queue
+    if records_spec is not None:
+        shared_records = SharedRecords(*records_spec)
+
 def run_simulation(i):
     print("Iteration {} running...".format(i))
-    batch = FixedBatchRunner(model_cls=HeterogeneityInArtificialMarket, max_steps=1530)
-    model = HeterogeneityInArtificialMarket(
-        initial_fundamentalist=100,
-        initial_technical=100,
-        initial_mimetic=100,
-        initial_noise=100,
-        network_type="small world",
-        verbose=True
-    )
-    batch.run_model(model)
-    df = model.datacollector.get_model_vars_dataframe()
+    # Progress records go to the parent's monitor instead of every worker printing each step
+    reporter = ProgressReporter(interval_seconds=2.0, total_steps=max_steps, worker_id="replicate_{}".format(i),
+                                progress_queue=progress_queue)
+    observers = []
+    if panel_every is not None:
+        observers.append(AgentPanelRecorder(os.path.join(dir_exp, "panel_record_"+str(i)+".npy"), max_steps=max_steps,
+                                            every=panel_every, sample_size=panel_sample_size, seed=i))
+    if shared_records is not None:
+        observers.append(shared_records.writer(i))
+        run_model_cached(model_cls=HeterogeneityInArtificialMarket, model_params=dict(model_params, progress=reporter),
+                         seed=i, max_steps=max_steps, observers=observers, return_record=False)
+        reporter.done()
+        print("Iteration {} completed.".format(i))
+        return
+
+    # Replicate i is seeded with i, so an identical configuration is served from the result cache
+    df = run_model_cached(model_cls=HeterogeneityInArtificialMarket, model_params=dict(model_params, progress=reporter),
+                          seed=i, max_steps=max_steps, cache=ResultCache(), batch_runner_cls=FixedBatchRunner,
+                          observers=observers)
+    reporter.done()
     file_name = os.path.join(dir_exp, "batch_record_"+str(i)+".csv")
     df.to_csv(file_name, header=True, index=False)
     print("Iteration {} completed.".format(i))
@@ -33,15 +73,29 @@ if __name__ == '__main__':
     start_time = time.time()
     print("Start multiprocessing...")
 
+    iterations = 10
+    progress_queue = multiprocessing.Queue()
+    monitor = ProgressMonitor(progress_queue, total_runs=iterations, steps_per_run=max_steps)
+    monitor.start()
+
+    records = None
+    if shared_memory_mode:
+        records = SharedRecords(iterations, max_steps, get_record_columns(HeterogeneityInArtificialMarket, model_params))
+
     optimal_thread_count = multiprocessing.cpu_count()
-    pool = multiprocessing.Pool(optimal_thread_count)
+    pool = multiprocessing.Pool(optimal_thread_count, initializer=init_worker,
+                                initargs=(progress_queue, records.get_spec() if records is not None else None))
     # pool = multiprocessing.Pool(5)
 
-    iterations = 10
     pool.map(run_simulation, list(range(iterations)))
 
     pool.close()
     pool.join()
+    monitor.stop()
+
+    if records is not None:
+        records.save(os.path.join(dir_exp, "batch_records.npy"))
+        records.close()
 
     print("Completed!")
     end_time = time.time()
@@ -1,7 +1,13 @@
 import inspect
 import numpy as np
+import kernels
 from utils import draw_from_normal
 
+# Rows of the market history array
+HISTORY_ROWS = ["value", "price", "order", "fundamental_order", "technical_order", "mimetic_order", "noise_order"]
+VALUE, PRICE, ORDER, FUNDAMENTAL_ORDER, TECHNICAL_ORDER, MIMETIC_ORDER, NOISE_ORDER = range(len(HISTORY_ROWS))
+HISTORY_CAPACITY = 1024
+
 
 class MarketMaker:
     """
@@ -10,20 +16,26 @@ class MarketMaker:
     """
 
     def __init__(self, initial_value=100.0, mu_value=0.0, sigma_value=0.25,
-                 mu_price=0.0, sigma_price=0.4, liquidity=400, trend_size=0.0, trend_start=0, trend_end=0, log_price_formation=True):
+                 mu_price=0.0, sigma_price=0.4, liquidity=400, trend_size=0.0, trend_start=0, trend_end=0, log_price_formation=True,
+                 value_stream=None, price_stream=None, price_engine=None, capacity=HISTORY_CAPACITY, value_path=None):
 
         self.trend_size = trend_size
         self.trend_start = trend_start
         self.trend_end = trend_end
 
-        self.value_history = [initial_value]
+        # Time series of the market, one row per series of HISTORY_ROWS, preallocated and doubled when full.
+        # Entries beyond the length of a series are NaN
+        self.history = np.full((len(HISTORY_ROWS), capacity), np.nan)
+        self.history_lengths = [0] * len(HISTORY_ROWS)
+
+        self._append(VALUE, initial_value)
         # mean of the fundamental price noise term (mu = 0.0)
         self.mu_value = mu_value
         # standard deviation for random term in fundamental value formation (sigma_V = 0.25)
         self.sigma_value = sigma_value
 
         # Initial price (P_0 = 100)
-        self.price_history = [self.value_history[0]]
+        self._append(PRICE, initial_value)
         # mean of the fundamental price noise term (mu = 0.0)
         self.mu_price = mu_price
         # standard deviation for random term in price formation (sigma_P = 0.4)
@@ -39,63 +51,154 @@ class MarketMaker:
         self.net_mimetic_order = 0
         self.net_noise_order = 0
 
-        # time series of net daily orders by trader type
-        self.order_history = []
-        self.fundamental_order_history = []
-        self.technical_order_history = []
-        self.mimetic_order_history = []
-        self.noise_order_history = []
-
         # model parameter dictionary of the market maker
         self.market_maker_parameters = {
-            "V_0": self.value_history[0], "mu_V": self.mu_value, "sigma_V": self.sigma_value,
-            "P_0": self.price_history[0], "mu_P": self.mu_price, "sigma_P": self.sigma_price,
+            "V_0": initial_value, "mu_V": self.mu_value, "sigma_V": self.sigma_value,
+            "P_0": initial_value, "mu_P": self.mu_price, "sigma_P": self.sigma_price,
             "liquidity": self.liquidity
         }
 
         self.log_price_formation = log_price_formation
 
+        # Random streams of the value process and the price noise (None draws from the global numpy state)
+        self.value_stream = value_stream
+        self.price_stream = price_stream
+
+        # Precomputed value process (a ValuePath), None to draw the value step by step from value_stream
+        self.value_path = value_path
+
+        # Alternative price formation (e.g. an OrderBookEngine), None for P_t = P_{t-1} + order / liquidity + noise
+        self.price_engine = price_engine
+
+        # Moving averages of the price by window, one value per step, shared by the technical traders
+        self.moving_averages = {}
+
+        # Price within a step, moved by the impact of intraday order batches (event-driven schedule)
+        self.intraday_price = None
+        self.intraday_order = 0
+        self.intraday_price_history = []
+
+    def _append(self, row, value):
+        n = self.history_lengths[row]
+        if n == self.history.shape[1]:
+            self._grow()
+        self.history[row, n] = value
+        self.history_lengths[row] = n + 1
+
+    def _grow(self):
+        history = np.full((len(HISTORY_ROWS), 2 * self.history.shape[1]), np.nan)
+        history[:, :self.history.shape[1]] = self.history
+        self.history = history
+
+    def _view(self, row, low_limit=None, high_limit=None):
+        """
+        Returns a read-only view of a window of a series, without copying.
+        A view shows the history at the time of the call, it is not updated by later steps.
+        """
+        view = self.history[row, :self.history_lengths[row]][low_limit:high_limit]
+        view.flags.writeable = False
+        return view
+
+    def _last(self, row):
+        n = self.history_lengths[row]
+        if n == 0:
+            raise IndexError("list index out of range")
+        return self.history.item(row, n - 1)
+
+    @property
+    def value_history(self):
+        return self._view(VALUE)
+
+    @property
+    def price_history(self):
+        return self._view(PRICE)
+
+    @property
+    def order_history(self):
+        return self._view(ORDER)
+
+    @property
+    def fundamental_order_history(self):
+        return self._view(FUNDAMENTAL_ORDER)
+
+    @property
+    def technical_order_history(self):
+        return self._view(TECHNICAL_ORDER)
+
+    @property
+    def mimetic_order_history(self):
+        return self._view(MIMETIC_ORDER)
+
+    @property
+    def noise_order_history(self):
+        return self._view(NOISE_ORDER)
+
     def get_prices(self, low_limit=0, high_limit=None):
         """
         Returns the price history of the asset.
         """
-        return self.price_history[low_limit:high_limit].copy()
+        return self._view(PRICE, low_limit, high_limit)
+
+    def get_moving_average(self, t, window):
+        """
+        Returns the moving average of the prices in the window ending at step t (the prices up to t only,
+        divided by the window length). The series of a window is computed once, for all traders using it.
+        """
+        series = self.moving_averages.setdefault(window, [])
+        while len(series) <= t:
+            step = len(series)
+            series.append(kernels.moving_average(self._view(PRICE, max(0, step - window + 1), step + 1), window))
+        return series[t]
 
     def get_values(self, low_limit, high_limit):
         """
         Returns the value history of the asset.
         """
-        return self.value_history[low_limit:high_limit].copy()
+        return self._view(VALUE, low_limit, high_limit)
 
     def get_orders(self, low_limit, high_limit):
         """
         Returns the order history of the asset.
         """
-        return self.order_history[low_limit:high_limit].copy()
+        return self._view(ORDER, low_limit, high_limit)
 
     def get_fundamental_orders(self, low_limit, high_limit):
         """
         Returns the fundamental order history of the asset.
         """
-        return self.fundamental_order_history[low_limit:high_limit].copy()
+        return self._view(FUNDAMENTAL_ORDER, low_limit, high_limit)
 
     def get_technical_orders(self, low_limit, high_limit):
         """
         Returns the technical order history of the asset.
         """
-        return self.technical_order_history[low_limit:high_limit].copy()
+        return self._view(TECHNICAL_ORDER, low_limit, high_limit)
 
     def get_mimetic_orders(self, low_limit, high_limit):
         """
         Returns the mimetic order history of the asset.
         """
-        return self.mimetic_order_history[low_limit:high_limit].copy()
+        return self._view(MIMETIC_ORDER, low_limit, high_limit)
 
     def get_noise_orders(self, low_limit, high_limit):
         """
         Returns the noise order history of the asset.
         """
-        return self.noise_order_history[low_limit:high_limit].copy()
+        return self._view(NOISE_ORDER, low_limit, high_limit)
+
+    def get_history(self):
+        """
+        Returns the whole market history, a read-only (series x steps) view with the rows of HISTORY_ROWS.
+        """
+        view = self.history[:, :max(self.history_lengths)]
+        view.flags.writeable = False
+        return view
+
+    def save_history(self, file_name):
+        """
+        Saves the whole market history into a .npy file in one write.
+        """
+        np.save(file_name, self.get_history())
 
     def get_market_parameters(self):
         """
@@ -105,29 +208,42 @@ class MarketMaker:
 
     def get_current_price(self):
         """
-        Returns the current price of the asset.
+        Returns the current price of the asset, the intraday price within a step that was repriced.
         """
-        return self.price_history[-1]
+        if self.intraday_price is not None:
+            return self.intraday_price
+        return self._last(PRICE)
+
+    def reprice_intraday(self):
+        """
+        Moves the intraday price by the impact of the orders that arrived since the last repricing.
+        The price of the next step is still formed from the net order of the whole step.
+        """
+        last_price = self.get_current_price()
+        self.intraday_price = max(last_price + (self.net_order - self.intraday_order) / self.liquidity, 0.0)
+        self.intraday_order = self.net_order
+        self.intraday_price_history.append(self.intraday_price)
 
     def get_current_value(self):
         """
         Returns the current fundamental value.
         """
-        return self.value_history[-1]
+        return self._last(VALUE)
 
     def get_current_order(self):
         """
-        Returns the current fundamental value.
+        Returns the current net order.
         """
-        return self.order_history[-1]
+        return self._last(ORDER)
 
-    def submit_order(self, order):
+    def submit_order(self, order, limit_price=None):
         """
         Receives an order from an agent and adds it to the total daily orders, depending on the agent type.
+        With a price engine the order is also passed on to it, as a limit order when a limit price is given.
         """
         try:
-            stack = inspect.stack()
-            calling_class_name = stack[1][0].f_locals["self"].__class__.__name__
+            # The calling frame only: inspect.stack() reads the source context of every frame of the stack
+            calling_class_name = inspect.currentframe().f_back.f_locals["self"].__class__.__name__
 
             self.net_order += order
 
@@ -141,6 +257,9 @@ class MarketMaker:
                 self.net_noise_order += order
             else:
                 raise Exception("Incorrect calling class names in submitOrder")
+
+            if self.price_engine is not None:
+                self.price_engine.submit(order, limit_price, calling_class_name)
         except Exception as e:
             print(e)
         return
@@ -160,18 +279,20 @@ class MarketMaker:
         Updates the fundamental value of the asset via a random walk process.
         """
         try:
-            last_value = self.value_history[-1]
-            current_value = last_value + draw_from_normal(mu=self.mu_value, sigma=self.sigma_value)
+            last_value = self._last(VALUE)
+            current_time_step = self.history_lengths[VALUE]
 
-            current_time_step = len(self.value_history)
-
-            if self.trend_start <= current_time_step < self.trend_end:
-                current_value += self.trend_size
+            if self.value_path is not None:
+                current_value = self.value_path.get(current_time_step)
+            else:
+                current_value = kernels.update_value(last_value, draw_from_normal(mu=self.mu_value, sigma=self.sigma_value,
+                                                                      random_state=self.value_stream),
+                                                     current_time_step, self.trend_size, self.trend_start, self.trend_end)
 
             if current_value < 0:
                 raise Exception("Fundamental value became negative")
 
-            self.value_history.append(current_value)
+            self._append(VALUE, current_value)
         except Exception as e:
             print(e)
         return
@@ -181,20 +302,21 @@ class MarketMaker:
         Updates the current price based on a combination of previous price, total orders, market liquidity, and noise term. 
         """
         try:
-            last_price = self.price_history[-1]
-            last_order = self.order_history[-1]
-
-            if self.log_price_formation:
-                current_price = last_price * np.exp( ( last_order / self.liquidity + draw_from_normal(mu=self.mu_price, sigma=self.sigma_price) ) / last_price )
+            last_price = self._last(PRICE)
+            last_order = self._last(ORDER)
+
+            noise = draw_from_normal(mu=self.mu_price, sigma=self.sigma_price, random_state=self.price_stream)
+            if self.price_engine is not None:
+                # The engine matches the orders submitted since the last update
+                current_price = self.price_engine.form_price(last_price, noise)
+            elif self.log_price_formation:
+                # np.exp rather than a kernel, to keep NumPy's results bit for bit
+                current_price = max(last_price * np.exp((last_order / self.liquidity + noise) / last_price), 0.0)
             else:
-                current_price = last_price + last_order / self.liquidity + draw_from_normal(mu=self.mu_price,
-                                                                                            sigma=self.sigma_price)
-
-            if current_price < 0:
-                current_price = 0
-                # raise Exception("Current price became negative")
+                # Price is floored at zero by the kernel
+                current_price = kernels.update_price(last_price, last_order, self.liquidity, noise)
 
-            self.price_history.append(current_price)
+            self._append(PRICE, current_price)
         except Exception as e:
             print(e)
         return
@@ -211,11 +333,11 @@ class MarketMaker:
                 print("Net order = {} | Total order = {}".format(self.net_order, total_order))
                 raise Exception("Orders don't sum up correctly in _update_orders")
 
-            self.order_history.append(self.net_order)
-            self.fundamental_order_history.append(self.net_fundamental_order)
-            self.technical_order_history.append(self.net_technical_order)
-            self.mimetic_order_history.append(self.net_mimetic_order)
-            self.noise_order_history.append(self.net_noise_order)
+            self._append(ORDER, self.net_order)
+            self._append(FUNDAMENTAL_ORDER, self.net_fundamental_order)
+            self._append(TECHNICAL_ORDER, self.net_technical_order)
+            self._append(MIMETIC_ORDER, self.net_mimetic_order)
+            self._append(NOISE_ORDER, self.net_noise_order)
 
             self._reset_orders()
         except Exception as e:
@@ -231,4 +353,6 @@ class MarketMaker:
         self.net_technical_order = 0
         self.net_mimetic_order = 0
         self.net_noise_order = 0
+        self.intraday_price = None
+        self.intraday_order = 0
         return
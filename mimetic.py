@@ -1,4 +1,5 @@
 import numpy as np
+import kernels
 from trader import Trader
 from utils import draw_from_uniform
 
@@ -22,7 +23,8 @@ class Mimetic(Trader):
 
         self.current_time = 0
 
-        self.evaluation_period = int(draw_from_uniform(self.model_reference.MIN_PERIOD, self.model_reference.MAX_PERIOD))
+        self.evaluation_period = int(draw_from_uniform(self.model_reference.MIN_PERIOD, self.model_reference.MAX_PERIOD,
+                                                       self.parameter_stream))
 
     def trade(self, t):
         """Describe trading behavior of fundamentalist trader"""
@@ -59,11 +61,19 @@ class Mimetic(Trader):
 
         self.update_agent_finances()
 
+    def next_wakeup(self, time):
+        # Mimetic traders only act at multiples of their evaluation period
+        return (int(time) // self.evaluation_period + 1) * self.evaluation_period
+
+    def get_held_position(self):
+        # Same as a step between evaluations
+        return 0
+
     def _find_neighbours(self):
         self.neighbours = [trader for trader in self.model_reference.all_traders if
                            (trader.unique_id in self.neighbour_ids)]
-        self.weights = [1.0 for _ in self.neighbours]
-        self.softmax_weights = np.exp(self.weights) / sum(np.exp(self.weights))
+        self.weights = np.ones(len(self.neighbours))
+        self.softmax_weights = kernels.normalize(np.exp(self.weights))
 
     def _sort_neighbours(self):
         self.neighbour_list = []
@@ -94,12 +104,13 @@ class Mimetic(Trader):
         best_trader_index = self.neighbours.index(best_trader)
 
         self.weights[best_trader_index] = self.weights[best_trader_index] + 1.0
-        self.softmax_weights = np.exp(self.weights) / sum(np.exp(self.weights))
+        self.softmax_weights = kernels.normalize(np.exp(self.weights))
 
         # print("weights: {}, probabilities: {}".format(self.weights, self.softmax_weights))
 
     def _choose_order(self):
-        chosen_trader = np.random.choice(a=self.neighbours, size=1, replace=True, p=self.softmax_weights)[0]
+        # Same inverse-cdf rule as np.random.choice(a=self.neighbours, p=self.softmax_weights)
+        chosen_trader = self.neighbours[kernels.choose_index(self.softmax_weights, self.model_reference.streams.get("mimetic").random())]
         chosen_trader_id = chosen_trader.unique_id
 
         chosen_trader_order = [tr for tr in self.neighbour_list if tr[0].unique_id == chosen_trader_id][0][2]
@@ -1,3 +1,6 @@
+from functools import partial
+import hashlib
+import json
 import networkx as nx
 from networkx.generators.random_graphs import watts_strogatz_graph
 import random
@@ -15,7 +18,51 @@ from mimetic import Mimetic
 from noise import Noise
 
 from market import MarketMaker
+from orderbook import OrderBookEngine
+from scheduler import EventActivation
+from inequality import INEQUALITY_STATS, get_inequality_stats
+from events import TradeLog
+from progress import ProgressReporter
 from utils import draw_from_uniform
+from streams import RandomStreams
+from valuepath import ValuePath, get_value_path
+
+# Trader types and their column names in the collected record
+TRADER_GROUPS = {"fundamental": "ftrader", "technical": "ttrader", "mimetic": "mtrader", "noise": "ntrader", "all": "all"}
+
+# Collected statistics of trader groups, column "<metric>_<group>_<stats>". Inequality statistics are of wealth only
+METRIC_FAMILIES = ["order", "position", "wealth", "cash", "portfolio"]
+STATS_TYPES = ["sum", "mean", "median", "std"]
+
+
+def get_collected_statistics(collection=None, inequality_interval=1):
+    """
+    Returns (metric, stats type, trader type, group) of every collected trader statistic, in column order.
+    collection selects them declaratively, e.g. {"metrics": ["order"], "groups": ["all"], "stats": ["sum"]};
+    a missing key (or collection None) selects all. Price, value and step are always collected.
+    """
+    collection = dict() if collection is None else collection
+    metrics = collection.get("metrics", METRIC_FAMILIES)
+    groups = collection.get("groups", list(TRADER_GROUPS.values()))
+    stats_types = collection.get("stats", STATS_TYPES + INEQUALITY_STATS)
+    for name, allowed in (("metrics", METRIC_FAMILIES), ("groups", list(TRADER_GROUPS.values())),
+                          ("stats", STATS_TYPES + INEQUALITY_STATS)):
+        unknown = set(collection.get(name, [])) - set(allowed)
+        if unknown:
+            raise ValueError("Unknown collected {}: {}".format(name, sorted(unknown)))
+
+    statistics_list = []
+    for param_name in METRIC_FAMILIES:
+        for stats_type in STATS_TYPES:
+            for trader_type, group in TRADER_GROUPS.items():
+                if param_name in metrics and stats_type in stats_types and group in groups:
+                    statistics_list.append((param_name, stats_type, trader_type, group))
+    if inequality_interval is not None and "wealth" in metrics:
+        for trader_type, group in TRADER_GROUPS.items():
+            for stats_type in INEQUALITY_STATS:
+                if stats_type in stats_types and group in groups:
+                    statistics_list.append(("wealth", stats_type, trader_type, group))
+    return statistics_list
 
 
 class HeterogeneityInArtificialMarket(Model):
@@ -73,10 +120,23 @@ class HeterogeneityInArtificialMarket(Model):
     INITIAL_VALUE = 100.0
     MU_VALUE = 0.0
     SIGMA_VALUE = 0.25
+    # Scheduled jumps of the value {step: jump} and regimes [(start, end, mu, sigma)] of its increments
+    VALUE_SHOCKS = None
+    VALUE_REGIMES = None
 
     MU_PRICE = 0.0
     SIGMA_PRICE = 0.4
 
+    # For the event-driven schedule: intraday order batches, noise trader arrivals per step (at most 1, None: every step)
+    # and relative price band within which flat technical traders sleep (None: every step)
+    INTRADAY_BATCHES = 1
+    NOISE_ARRIVAL_RATE = None
+    TECHNICAL_PRICE_BAND = None
+
+    # For the order book price formation
+    ORDER_BOOK_TICK_SIZE = 0.01
+    ORDER_BOOK_DEPTH_LEVELS = 200
+
     # For all agents
     PARETO_ALPHA = 1.3
     PARETO_XM = 1.0
@@ -92,10 +152,26 @@ class HeterogeneityInArtificialMarket(Model):
             initial_mimetic=25,
             initial_noise=25,
             network_type='customize',
-            verbose=True
+            verbose=True,
+            seed=None,
+            progress=None,
+            inequality_interval=1,
+            price_formation="aggregate",
+            scheduler="random",
+            collection=None,
+            collection_interval=1
     ):
         super().__init__()
 
+        # Every purpose draws from its own named substream of the seed (common random numbers across runs).
+        # The global sources are still seeded for code outside the model that draws from them.
+        self.seed = seed
+        self.streams = RandomStreams(seed)
+        self.random = self.streams.python_random("schedule")
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+
         self.initial_fundamentalist = initial_fundamentalist
         self.initial_technical = initial_technical
         self.initial_mimetic = initial_mimetic
@@ -103,20 +179,52 @@ class HeterogeneityInArtificialMarket(Model):
 
         self.network_type = network_type
         self.verbose = verbose
+
+        # Rate-limited JSON progress lines, by default once per second when verbose
+        if progress is None and verbose:
+            progress = ProgressReporter()
+        self.progress = progress
         self.liquidity = sum([initial_fundamentalist, initial_technical, initial_mimetic, initial_noise])
 
         # ID list of agent type
         self.ftrader_ids, self.ttrader_ids, self.mtrader_ids, self.ntrader_ids, = self.generate_traders_id()
 
-        # Initialize schedule to activate agent randomly
-        self.schedule = RandomActivation(self)
-
-        # Initialize market maker
+        # Initialize schedule to activate agent randomly, or on their registered wake-ups
+        self.scheduler = scheduler
+        if scheduler == "random":
+            self.schedule = RandomActivation(self)
+        elif scheduler == "event":
+            self.schedule = EventActivation(self, intraday_batches=self.INTRADAY_BATCHES)
+        else:
+            raise ValueError("Unknown scheduler: {}".format(scheduler))
+
+        # Initialize market maker, forming prices from the aggregate net order or in a limit order book
+        self.price_formation = price_formation
+        price_engine = None
+        if price_formation == "order_book":
+            price_engine = OrderBookEngine(liquidity=self.liquidity, tick_size=self.ORDER_BOOK_TICK_SIZE,
+                                           depth_levels=self.ORDER_BOOK_DEPTH_LEVELS)
+        elif price_formation != "aggregate":
+            raise ValueError("Unknown price formation: {}".format(price_formation))
+        # The value path is exogenous: drawn up front, and shared by the runs of a seed in this process
+        value_params = dict(initial_value=self.INITIAL_VALUE, mu_value=self.MU_VALUE, sigma_value=self.SIGMA_VALUE,
+                            trend_size=self.TREND_SIZE, trend_start=self.TREND_START_TIME,
+                            trend_end=self.TREND_END_TIME, shocks=self.VALUE_SHOCKS, regimes=self.VALUE_REGIMES)
+        if seed is not None:
+            value_path = get_value_path(seed, **value_params)
+        else:
+            value_path = ValuePath(value_stream=self.streams.get("value"), **value_params)
         self.market_maker = MarketMaker(initial_value=self.INITIAL_VALUE, mu_value=self.MU_VALUE,
                                         sigma_value=self.SIGMA_VALUE, mu_price=self.MU_PRICE,
                                         sigma_price=self.SIGMA_PRICE, liquidity=self.liquidity,
                                         trend_size=self.TREND_SIZE, trend_start=self.TREND_START_TIME,
-                                        trend_end=self.TREND_END_TIME, log_price_formation=self.LOG_PRICE_FORMATION)
+                                        trend_end=self.TREND_END_TIME, log_price_formation=self.LOG_PRICE_FORMATION,
+                                        value_stream=self.streams.get("value"),
+                                        price_stream=self.streams.get("price"), price_engine=price_engine,
+                                        value_path=value_path)
+
+        # Append-only log of non-zero orders, backing the sparse trader histories
+        self.trade_log = TradeLog()
 
         # List of trader objects
         self.fundamental_traders = []
@@ -128,6 +236,10 @@ class HeterogeneityInArtificialMarket(Model):
         self.clustered_ntrader_ids = []
         self.coordinated_ntrader_behaviour = dict()
 
+        self.inequality_interval = inequality_interval
+        self.inequality_stats = dict()
+        self.inequality_step = None
+
         # Initialize traders & networks
         if network_type == "customize":
             self.network, self.G = self.generate_trader_networks()
@@ -135,144 +247,35 @@ class HeterogeneityInArtificialMarket(Model):
             self.network, self.G = self.generate_small_world_networks()
         self.generate_traders()
 
-        # Data collector for chart visualization
-        self.datacollector = DataCollector(
-            model_reporters={
-                "step": lambda m: m.schedule.time,
-                "price": lambda m: m.get_market_parameters(param_name='price'),
-                "value": lambda m: m.get_market_parameters(param_name='value'),
-
-                "order_ftrader_sum": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='order', stats_type='sum'),
-                "order_ttrader_sum": lambda m: m.get_agent_stats(trader_type='technical', param_name='order', stats_type='sum'),
-                "order_mtrader_sum": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='order', stats_type='sum'),
-                "order_ntrader_sum": lambda m: m.get_agent_stats(trader_type='noise', param_name='order', stats_type='sum'),
-                "order_all_sum": lambda m: m.get_agent_stats(trader_type='all', param_name='order', stats_type='sum'),
-
-                "order_ftrader_mean": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='order', stats_type='mean'),
-                "order_ttrader_mean": lambda m: m.get_agent_stats(trader_type='technical', param_name='order', stats_type='mean'),
-                "order_mtrader_mean": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='order', stats_type='mean'),
-                "order_ntrader_mean": lambda m: m.get_agent_stats(trader_type='noise', param_name='order', stats_type='mean'),
-                "order_all_mean": lambda m: m.get_agent_stats(trader_type='all', param_name='order', stats_type='mean'),
-
-                "order_ftrader_median": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='order', stats_type='median'),
-                "order_ttrader_median": lambda m: m.get_agent_stats(trader_type='technical', param_name='order', stats_type='median'),
-                "order_mtrader_median": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='order', stats_type='median'),
-                "order_ntrader_median": lambda m: m.get_agent_stats(trader_type='noise', param_name='order', stats_type='median'),
-                "order_all_median": lambda m: m.get_agent_stats(trader_type='all', param_name='order', stats_type='median'),
-
-                "order_ftrader_std": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='order', stats_type='std'),
-                "order_ttrader_std": lambda m: m.get_agent_stats(trader_type='technical', param_name='order', stats_type='std'),
-                "order_mtrader_std": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='order', stats_type='std'),
-                "order_ntrader_std": lambda m: m.get_agent_stats(trader_type='noise', param_name='order', stats_type='std'),
-                "order_all_std": lambda m: m.get_agent_stats(trader_type='all', param_name='order', stats_type='std'),
-
-
-                "position_ftrader_sum": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='position', stats_type='sum'),
-                "position_ttrader_sum": lambda m: m.get_agent_stats(trader_type='technical', param_name='position', stats_type='sum'),
-                "position_mtrader_sum": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='position', stats_type='sum'),
-                "position_ntrader_sum": lambda m: m.get_agent_stats(trader_type='noise', param_name='position', stats_type='sum'),
-                "position_all_sum": lambda m: m.get_agent_stats(trader_type='all', param_name='position', stats_type='sum'),
-
-                "position_ftrader_mean": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='position', stats_type='mean'),
-                "position_ttrader_mean": lambda m: m.get_agent_stats(trader_type='technical', param_name='position', stats_type='mean'),
-                "position_mtrader_mean": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='position', stats_type='mean'),
-                "position_ntrader_mean": lambda m: m.get_agent_stats(trader_type='noise', param_name='position', stats_type='mean'),
-                "position_all_mean": lambda m: m.get_agent_stats(trader_type='all', param_name='position', stats_type='mean'),
-
-                "position_ftrader_median": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='position', stats_type='median'),
-                "position_ttrader_median": lambda m: m.get_agent_stats(trader_type='technical', param_name='position', stats_type='median'),
-                "position_mtrader_median": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='position', stats_type='median'),
-                "position_ntrader_median": lambda m: m.get_agent_stats(trader_type='noise', param_name='position', stats_type='median'),
-                "position_all_median": lambda m: m.get_agent_stats(trader_type='all', param_name='position', stats_type='median'),
-
-                "position_ftrader_std": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='position', stats_type='std'),
-                "position_ttrader_std": lambda m: m.get_agent_stats(trader_type='technical', param_name='position', stats_type='std'),
-                "position_mtrader_std": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='position', stats_type='std'),
-                "position_ntrader_std": lambda m: m.get_agent_stats(trader_type='noise', param_name='position', stats_type='std'),
-                "position_all_std": lambda m: m.get_agent_stats(trader_type='all', param_name='position', stats_type='std'),
-
-
-                "wealth_ftrader_sum": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='wealth', stats_type='sum'),
-                "wealth_ttrader_sum": lambda m: m.get_agent_stats(trader_type='technical', param_name='wealth', stats_type='sum'),
-                "wealth_mtrader_sum": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='wealth', stats_type='sum'),
-                "wealth_ntrader_sum": lambda m: m.get_agent_stats(trader_type='noise', param_name='wealth', stats_type='sum'),
-                "wealth_all_sum": lambda m: m.get_agent_stats(trader_type='all', param_name='wealth', stats_type='sum'),
-
-                "wealth_ftrader_mean": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='wealth', stats_type='mean'),
-                "wealth_ttrader_mean": lambda m: m.get_agent_stats(trader_type='technical', param_name='wealth', stats_type='mean'),
-                "wealth_mtrader_mean": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='wealth', stats_type='mean'),
-                "wealth_ntrader_mean": lambda m: m.get_agent_stats(trader_type='noise', param_name='wealth', stats_type='mean'),
-                "wealth_all_mean": lambda m: m.get_agent_stats(trader_type='all', param_name='wealth', stats_type='mean'),
-
-                "wealth_ftrader_median": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='wealth', stats_type='median'),
-                "wealth_ttrader_median": lambda m: m.get_agent_stats(trader_type='technical', param_name='wealth', stats_type='median'),
-                "wealth_mtrader_median": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='wealth', stats_type='median'),
-                "wealth_ntrader_median": lambda m: m.get_agent_stats(trader_type='noise', param_name='wealth', stats_type='median'),
-                "wealth_all_median": lambda m: m.get_agent_stats(trader_type='all', param_name='wealth', stats_type='median'),
-
-                "wealth_ftrader_std": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='wealth', stats_type='std'),
-                "wealth_ttrader_std": lambda m: m.get_agent_stats(trader_type='technical', param_name='wealth', stats_type='std'),
-                "wealth_mtrader_std": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='wealth', stats_type='std'),
-                "wealth_ntrader_std": lambda m: m.get_agent_stats(trader_type='noise', param_name='wealth', stats_type='std'),
-                "wealth_all_std": lambda m: m.get_agent_stats(trader_type='all', param_name='wealth', stats_type='std'),
-
-
-                "cash_ftrader_sum": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='cash', stats_type='sum'),
-                "cash_ttrader_sum": lambda m: m.get_agent_stats(trader_type='technical', param_name='cash', stats_type='sum'),
-                "cash_mtrader_sum": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='cash', stats_type='sum'),
-                "cash_ntrader_sum": lambda m: m.get_agent_stats(trader_type='noise', param_name='cash', stats_type='sum'),
-                "cash_all_sum": lambda m: m.get_agent_stats(trader_type='all', param_name='cash', stats_type='sum'),
-
-                "cash_ftrader_mean": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='cash', stats_type='mean'),
-                "cash_ttrader_mean": lambda m: m.get_agent_stats(trader_type='technical', param_name='cash', stats_type='mean'),
-                "cash_mtrader_mean": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='cash', stats_type='mean'),
-                "cash_ntrader_mean": lambda m: m.get_agent_stats(trader_type='noise', param_name='cash', stats_type='mean'),
-                "cash_all_mean": lambda m: m.get_agent_stats(trader_type='all', param_name='cash', stats_type='mean'),
-
-                "cash_ftrader_median": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='cash', stats_type='median'),
-                "cash_ttrader_median": lambda m: m.get_agent_stats(trader_type='technical', param_name='cash', stats_type='median'),
-                "cash_mtrader_median": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='cash', stats_type='median'),
-                "cash_ntrader_median": lambda m: m.get_agent_stats(trader_type='noise', param_name='cash', stats_type='median'),
-                "cash_all_median": lambda m: m.get_agent_stats(trader_type='all', param_name='cash', stats_type='median'),
-
-                "cash_ftrader_std": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='cash', stats_type='std'),
-                "cash_ttrader_std": lambda m: m.get_agent_stats(trader_type='technical', param_name='cash', stats_type='std'),
-                "cash_mtrader_std": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='cash', stats_type='std'),
-                "cash_ntrader_std": lambda m: m.get_agent_stats(trader_type='noise', param_name='cash', stats_type='std'),
-                "cash_all_std": lambda m: m.get_agent_stats(trader_type='all', param_name='cash', stats_type='std'),
-
-
-                "portfolio_ftrader_sum": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='portfolio', stats_type='sum'),
-                "portfolio_ttrader_sum": lambda m: m.get_agent_stats(trader_type='technical', param_name='portfolio', stats_type='sum'),
-                "portfolio_mtrader_sum": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='portfolio', stats_type='sum'),
-                "portfolio_ntrader_sum": lambda m: m.get_agent_stats(trader_type='noise', param_name='portfolio', stats_type='sum'),
-                "portfolio_all_sum": lambda m: m.get_agent_stats(trader_type='all', param_name='portfolio', stats_type='sum'),
-
-                "portfolio_ftrader_mean": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='portfolio', stats_type='mean'),
-                "portfolio_ttrader_mean": lambda m: m.get_agent_stats(trader_type='technical', param_name='portfolio', stats_type='mean'),
-                "portfolio_mtrader_mean": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='portfolio', stats_type='mean'),
-                "portfolio_ntrader_mean": lambda m: m.get_agent_stats(trader_type='noise', param_name='portfolio', stats_type='mean'),
-                "portfolio_all_mean": lambda m: m.get_agent_stats(trader_type='all', param_name='portfolio', stats_type='mean'),
-
-                "portfolio_ftrader_median": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='portfolio', stats_type='median'),
-                "portfolio_ttrader_median": lambda m: m.get_agent_stats(trader_type='technical', param_name='portfolio', stats_type='median'),
-                "portfolio_mtrader_median": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='portfolio', stats_type='median'),
-                "portfolio_ntrader_median": lambda m: m.get_agent_stats(trader_type='noise', param_name='portfolio', stats_type='median'),
-                "portfolio_all_median": lambda m: m.get_agent_stats(trader_type='all', param_name='portfolio', stats_type='median'),
-
-                "portfolio_ftrader_std": lambda m: m.get_agent_stats(trader_type='fundamental', param_name='portfolio', stats_type='std'),
-                "portfolio_ttrader_std": lambda m: m.get_agent_stats(trader_type='technical', param_name='portfolio', stats_type='std'),
-                "portfolio_mtrader_std": lambda m: m.get_agent_stats(trader_type='mimetic', param_name='portfolio', stats_type='std'),
-                "portfolio_ntrader_std": lambda m: m.get_agent_stats(trader_type='noise', param_name='portfolio', stats_type='std'),
-                "portfolio_all_std": lambda m: m.get_agent_stats(trader_type='all', param_name='portfolio', stats_type='std')
-            }
-        )
+        # Data collector for chart visualization, with only the requested statistics every collection_interval steps
+        self.collection = collection
+        self.collection_interval = collection_interval
+        self.agent_values = dict()
+        self.agent_values_step = None
+        # Reporters are partials of methods, not lambdas, so that a model can be pickled (snapshots)
+        model_cls = HeterogeneityInArtificialMarket
+        model_reporters = {
+            "step": partial(model_cls.get_step),
+            "price": partial(model_cls.get_market_parameters, param_name='price'),
+            "value": partial(model_cls.get_market_parameters, param_name='value'),
+        }
+        for param_name, stats_type, trader_type, group in get_collected_statistics(collection, inequality_interval):
+            if stats_type in INEQUALITY_STATS:
+                # Wealth distribution analytics (Gini, top shares, tail index), every inequality_interval steps
+                model_reporters["{}_{}_{}".format(param_name, group, stats_type)] = \
+                    partial(model_cls.get_wealth_inequality, trader_type=trader_type, stats_type=stats_type)
+            else:
+                model_reporters["{}_{}_{}".format(param_name, group, stats_type)] = \
+                    partial(model_cls.get_agent_stats, trader_type=trader_type, param_name=param_name,
+                            stats_type=stats_type)
+
+        self.datacollector = DataCollector(model_reporters=model_reporters)
 
         pass
 
     def generate_traders_id(self):
         total_agents_id = list(range(self.liquidity))
-        random.shuffle(total_agents_id)
+        self.streams.python_random("ids").shuffle(total_agents_id)
         ftrader_ids = [total_agents_id.pop() for _ in range(self.initial_fundamentalist)]
         ttrader_ids = [total_agents_id.pop() for _ in range(self.initial_technical)]
         mtrader_ids = [total_agents_id.pop() for _ in range(self.initial_mimetic)]
@@ -317,7 +320,8 @@ class HeterogeneityInArtificialMarket(Model):
         pass
 
     def generate_small_world_networks(self):
-        small_world_network = watts_strogatz_graph(self.liquidity, k=5, p=0.5)
+        small_world_network = watts_strogatz_graph(self.liquidity, k=5, p=0.5,
+                                                    seed=self.streams.python_random("network"))
 
         return NetworkGrid(small_world_network), small_world_network
 
@@ -334,26 +338,28 @@ class HeterogeneityInArtificialMarket(Model):
         # Generate graph and networks of mimetic traders
         network.add_nodes_from(total_agents)
 
+        network_random = self.streams.python_random("network")
+
         # Mimetic trader network
         # Randomly assign 2 ftraders & 2 ttraders to every mimetic trader
         for mimetic_id in self.mtrader_ids:
-            random_pick_agent_ids = random.sample(self.ftrader_ids,2) + random.sample(self.ttrader_ids, 2)
+            random_pick_agent_ids = network_random.sample(self.ftrader_ids,2) + network_random.sample(self.ttrader_ids, 2)
             l_pairs = list([[mimetic_id, agent_id] for agent_id in random_pick_agent_ids])
             network.add_edges_from(l_pairs)
 
         # Fundamentalist trader network
         # Randomly assign 2 ftraders & 2 ttraders to every ftraders
         for fundamentalist_id in self.ftrader_ids:
-            random_pick_agent_ids = random.sample([id for id in self.ftrader_ids if id != fundamentalist_id], 2) \
-                                    + random.sample(self.ttrader_ids, 2)
+            random_pick_agent_ids = network_random.sample([id for id in self.ftrader_ids if id != fundamentalist_id], 2) \
+                                    + network_random.sample(self.ttrader_ids, 2)
             l_pairs = list([[fundamentalist_id, agent_id] for agent_id in random_pick_agent_ids])
             network.add_edges_from(l_pairs)
 
         # Technical trader network
         # Randomly assign 2 ftraders & 2 ttraders to every ttraders
         for technical_id in self.ttrader_ids:
-            random_pick_agent_ids = random.sample([id for id in self.ttrader_ids if id != technical_id], 2) \
-                                    + random.sample(self.ftrader_ids, 2)
+            random_pick_agent_ids = network_random.sample([id for id in self.ttrader_ids if id != technical_id], 2) \
+                                    + network_random.sample(self.ftrader_ids, 2)
             l_pairs = list([[technical_id, agent_id] for agent_id in random_pick_agent_ids])
             network.add_edges_from(l_pairs)
 
@@ -361,7 +367,7 @@ class HeterogeneityInArtificialMarket(Model):
         # Randomly group 5 noise traders together
         for noise_id in self.ntrader_ids:
             pick_agent_ids = [id for id in self.ntrader_ids if id != noise_id]
-            random_pick_agent_ids = random.sample(pick_agent_ids, 4)
+            random_pick_agent_ids = network_random.sample(pick_agent_ids, 4)
             l_pairs = list([[noise_id, agent_id] for agent_id in random_pick_agent_ids])
             network.add_edges_from(l_pairs)
 
@@ -369,12 +375,14 @@ class HeterogeneityInArtificialMarket(Model):
 
     def create_ntrader_clusters(self):
         remaining_list = self.ntrader_ids.copy()
+        cluster_stream = self.streams.get("clusters")
 
         self.clustered_ntrader_ids = []
 
         while len(remaining_list) >= 1:
-            sample_size = int(draw_from_uniform(lower=self.MIN_CLUSTER_SIZE, upper=self.MAX_CLUSTER_SIZE))
-            sample_list = np.random.choice(a=remaining_list, size=sample_size, replace=True)
+            sample_size = int(draw_from_uniform(lower=self.MIN_CLUSTER_SIZE, upper=self.MAX_CLUSTER_SIZE,
+                                                random_state=cluster_stream))
+            sample_list = cluster_stream.choice(a=remaining_list, size=sample_size, replace=True)
             sample_list = list(set(sample_list))
             remaining_list = [id for id in remaining_list if id not in sample_list]
 
@@ -384,7 +392,7 @@ class HeterogeneityInArtificialMarket(Model):
         self.coordinated_ntrader_behaviour = {"buy": [], "sell": [], "hold": []}
 
         for cluster in self.clustered_ntrader_ids:
-            random_float = draw_from_uniform(0.0, 1.0)
+            random_float = draw_from_uniform(0.0, 1.0, self.streams.get("clusters"))
 
             if 0.0 <= random_float < self.BUY_PROBABILITY:
                 # set cluster to buy and add to behaviour dictionary
@@ -400,26 +408,22 @@ class HeterogeneityInArtificialMarket(Model):
         self.create_ntrader_clusters()
         self.coordinate_ntrader_clusters()
         self.market_maker.update_price()
+        self.trade_log.start_step(self.schedule.time, self.market_maker.get_current_price())
         self.schedule.step()
+        self.trade_log.close_step(self.schedule.time - 1, self.market_maker.get_current_price())
 
-        self.datacollector.collect(self)
-        if self.verbose:
-            print("Step: {}, Value: {}, Price: {}, Orders: {}, F-sum-pos: {}, T-sum-pos: {}, F-median-wealth: {}, "
-                  "T-median-wealth: {}".format(self.schedule.time, self.market_maker.get_current_value(),
-                                        self.market_maker.get_current_price(), self.market_maker.get_current_order(),
-                                        self.get_agent_stats(trader_type='fundamental',
-                                                       param_name='position', stats_type='sum'),
-                                        self.get_agent_stats(trader_type='technical',
-                                                       param_name='position', stats_type='sum'),
-                                        self.get_agent_stats(trader_type='fundamental',
-                                                       param_name='wealth', stats_type='median'),
-                                        self.get_agent_stats(trader_type='technical',
-                                                       param_name='wealth', stats_type='median')))
+        if self.schedule.time % self.collection_interval == 0:
+            self.datacollector.collect(self)
+        if self.progress is not None:
+            self.progress.report(self)
         pass
 
     def get_network(self):
         return self.network
 
+    def get_step(self):
+        return self.schedule.time
+
     def get_market_parameters(self, param_name):
         if param_name == "price":
             return self.market_maker.get_current_price()
@@ -447,21 +451,15 @@ class HeterogeneityInArtificialMarket(Model):
             print("Error, unknown agent type")
             exit()
 
-        all_parameters = []
-        for trader in trader_list:
-            if param_name == 'position':
-                all_parameters.append(trader.get_position(self.schedule.time))
-            elif param_name == 'order':
-                all_parameters.append(trader.get_order(self.schedule.time))
-            elif param_name == 'portfolio':
-                all_parameters.append(trader.get_portfolio(self.schedule.time))
-            elif param_name == 'cash':
-                all_parameters.append(trader.get_cash(self.schedule.time))
-            elif param_name == 'wealth':
-                all_parameters.append(trader.get_net_wealth(self.schedule.time))
-            else:
-                print("Error, unknown parameter type")
-                exit()
+        # Values of a trader type are gathered once per step, for all statistics of it
+        if self.agent_values_step != self.schedule.time:
+            self.agent_values_step = self.schedule.time
+            self.agent_values = dict()
+        if (trader_type, param_name) in self.agent_values:
+            all_parameters = self.agent_values[(trader_type, param_name)]
+        else:
+            all_parameters = self.get_agent_values(trader_list, param_name)
+            self.agent_values[(trader_type, param_name)] = all_parameters
 
         if len(all_parameters) > 0:
             if stats_type == 'max':
@@ -484,3 +482,67 @@ class HeterogeneityInArtificialMarket(Model):
         else:
             return None
 
+    def get_agent_values(self, trader_list, param_name):
+        all_parameters = []
+        for trader in trader_list:
+            if param_name == 'position':
+                all_parameters.append(trader.get_position(self.schedule.time))
+            elif param_name == 'order':
+                all_parameters.append(trader.get_order(self.schedule.time))
+            elif param_name == 'portfolio':
+                all_parameters.append(trader.get_portfolio(self.schedule.time))
+            elif param_name == 'cash':
+                all_parameters.append(trader.get_cash(self.schedule.time))
+            elif param_name == 'wealth':
+                all_parameters.append(trader.get_net_wealth(self.schedule.time))
+            else:
+                print("Error, unknown parameter type")
+                exit()
+        return all_parameters
+
+    def get_wealth_inequality(self, trader_type, stats_type):
+        """Wealth distribution statistic of a trader type, NaN between evaluations.
+        All statistics of all types are computed once per evaluated step.
+
+        """
+        if self.schedule.time % self.inequality_interval != 0:
+            return np.nan
+
+        if self.inequality_step != self.schedule.time:
+            self.inequality_step = self.schedule.time
+            self.inequality_stats = dict()
+            traders_by_type = {"fundamental": self.fundamental_traders, "technical": self.technical_traders,
+                               "mimetic": self.mimetic_traders, "noise": self.noise_traders,
+                               "all": self.all_traders}
+            for _trader_type, trader_list in traders_by_type.items():
+                wealth = np.fromiter((trader.get_net_wealth(self.schedule.time) for trader in trader_list),
+                                     dtype=float, count=len(trader_list))
+                self.inequality_stats[_trader_type] = get_inequality_stats(wealth)
+
+        return self.inequality_stats[trader_type][stats_type]
+
+
+def make_model_class(constants):
+    """
+    Returns the model class with the given class constants overridden, or the model class itself.
+    """
+    if not constants:
+        return HeterogeneityInArtificialMarket
+    # One class per set of constants, registered in this module under a stable name so that its models
+    # can be pickled (snapshots); a process unpickling them makes the class with the same constants first
+    digest = hashlib.sha256(json.dumps(constants, sort_keys=True, default=repr).encode()).hexdigest()[:16]
+    qualname = "{}_{}".format(HeterogeneityInArtificialMarket.__name__, digest)
+    if qualname not in globals():
+        model_cls = type(HeterogeneityInArtificialMarket.__name__, (HeterogeneityInArtificialMarket,), dict(constants))
+        model_cls.__qualname__ = qualname
+        globals()[qualname] = model_cls
+    return globals()[qualname]
+
+
+def split_parameters(parameters):
+    """
+    Splits a parameter point into class constants (upper-case names) and constructor arguments.
+    """
+    constants = {name: value for name, value in parameters.items() if name.isupper()}
+    model_params = {name: value for name, value in parameters.items() if not name.isupper()}
+    return constants, model_params
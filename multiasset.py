@@ -0,0 +1,464 @@
+import numpy as np
+from mesa import Model
+from mesa.datacollection import DataCollector
+from scipy.stats import pareto
+from functools import partial
+
+from events import TRADER_TYPE_CODES
+from model import HeterogeneityInArtificialMarket
+from streams import RandomStreams
+from utils import draw_from_normal
+
+
+def _per_asset(parameter, n_assets):
+    """
+    Broadcasts a scalar or per-asset parameter to an array over the assets.
+    """
+    return np.broadcast_to(np.asarray(parameter, dtype=float), (n_assets,)).copy()
+
+
+class MultiAssetMarketMaker:
+    """
+    Market maker of K assets, with the recursions of MarketMaker applied to all assets at once:
+        V_t = V_{t-1} + N(mu_V, sigma_V) (+ trend_size within the trend period)
+        P_t = P_{t-1} + order_{t-1} / liquidity + N(mu_P, sigma_P)     (floored at zero)
+    Every parameter is a scalar or an array over the assets, so trend schedules can differ per asset.
+    Value shocks share a common factor with correlation value_correlation, to study cross-asset contagion.
+
+    Histories are preallocated (steps x assets) arrays, net orders are held per trader type (4 x assets) and
+    per trader positions as an (n_traders x assets) array. Traders are identified by their id, an index into
+    trader_types (their TRADER_TYPE_CODES), which attributes their orders to their type. Single-asset traders
+    trade one asset through the MarketMaker interface of asset(k).
+    """
+
+    def __init__(self, n_assets, initial_value=100.0, mu_value=0.0, sigma_value=0.25, mu_price=0.0, sigma_price=0.4,
+                 liquidity=400, trend_size=0.0, trend_start=0, trend_end=0, log_price_formation=False,
+                 value_correlation=0.0, trader_types=(), capacity=1024, value_stream=None, price_stream=None):
+        self.n_assets = n_assets
+
+        self.mu_value = _per_asset(mu_value, n_assets)
+        self.sigma_value = _per_asset(sigma_value, n_assets)
+        self.mu_price = _per_asset(mu_price, n_assets)
+        self.sigma_price = _per_asset(sigma_price, n_assets)
+        self.liquidity = _per_asset(liquidity, n_assets)
+        self.trend_size = _per_asset(trend_size, n_assets)
+        self.trend_start = _per_asset(trend_start, n_assets)
+        self.trend_end = _per_asset(trend_end, n_assets)
+        self.log_price_formation = log_price_formation
+        self.value_correlation = value_correlation
+
+        self.value_stream = np.random.default_rng() if value_stream is None else value_stream
+        self.price_stream = np.random.default_rng() if price_stream is None else price_stream
+
+        # Histories, rows [0, n_values) / [0, n_prices) / [0, n_orders) are filled
+        self._values = np.empty((capacity, n_assets))
+        self._prices = np.empty((capacity, n_assets))
+        self._orders = np.empty((capacity, n_assets))
+        self._type_orders = np.empty((capacity, len(TRADER_TYPE_CODES), n_assets))
+        # Cumulative sums of the prices, row i holds the sum of the first i prices (moving averages in O(1))
+        self._price_sums = np.empty((capacity + 1, n_assets))
+        self._values[0] = _per_asset(initial_value, n_assets)
+        self._prices[0] = self._values[0]
+        self._price_sums[0] = 0.0
+        self._price_sums[1] = self._prices[0]
+        self.n_values = 1
+        self.n_prices = 1
+        self.n_orders = 0
+
+        # Net orders of the current step per trader type, and positions of every trader
+        self.trader_types = np.asarray(trader_types, dtype=np.int64)
+        self.net_orders = np.zeros((len(TRADER_TYPE_CODES), n_assets))
+        self.positions = np.zeros((len(self.trader_types), n_assets))
+
+    def _grow(self, rows):
+        if rows <= len(self._values):
+            return
+        old_capacity = len(self._values)
+        capacity = max(rows, 2 * old_capacity)
+        for name in ["_values", "_prices", "_orders", "_type_orders", "_price_sums"]:
+            history = getattr(self, name)
+            # The price sums have one more row than the other histories
+            grown = np.empty((capacity + len(history) - old_capacity,) + history.shape[1:])
+            grown[:len(history)] = history
+            setattr(self, name, grown)
+
+    @property
+    def value_history(self):
+        return self._values[:self.n_values]
+
+    @property
+    def price_history(self):
+        return self._prices[:self.n_prices]
+
+    @property
+    def order_history(self):
+        return self._orders[:self.n_orders]
+
+    @property
+    def type_order_history(self):
+        """
+        Net orders per step, trader type (TRADER_TYPE_CODES) and asset.
+        """
+        return self._type_orders[:self.n_orders]
+
+    def get_current_prices(self):
+        return self._prices[self.n_prices - 1].copy()
+
+    def get_current_values(self):
+        return self._values[self.n_values - 1].copy()
+
+    def get_moving_averages(self, step, windows):
+        """
+        Returns the moving averages of the prices in the windows ending at step (the prices up to step only,
+        divided by the window length, as MarketMaker.get_moving_average), as a (windows x assets) array.
+        """
+        windows = np.asarray(windows)
+        starts = np.maximum(0, step + 1 - windows)
+        return (self._price_sums[step + 1] - self._price_sums[starts]) / windows[:, np.newaxis]
+
+    def asset(self, k):
+        return AssetView(self, k)
+
+    def submit_order(self, orders, trader_id):
+        """
+        Adds an order vector (or a single order on every asset) of a trader to the net orders of its type and
+        to its position.
+        """
+        self.net_orders[self.trader_types[trader_id]] += orders
+        self.positions[trader_id] += orders
+
+    def submit_orders(self, orders, trader_ids):
+        """
+        Adds the (traders x assets) orders of many traders at once, as submit_order for each of them.
+        """
+        trader_ids = np.asarray(trader_ids)
+        np.add.at(self.net_orders, self.trader_types[trader_ids], orders)
+        np.add.at(self.positions, trader_ids, orders)
+
+    def update_price(self):
+        """
+        Updates the values, prices and order histories of all assets.
+        """
+        self._grow(max(self.n_values, self.n_prices, self.n_orders) + 1)
+        self._update_values()
+        self._update_prices()
+        self._update_orders()
+
+    def _update_values(self):
+        idiosyncratic = self.value_stream.standard_normal(self.n_assets)
+        if self.value_correlation > 0:
+            common = self.value_stream.standard_normal()
+            shocks = np.sqrt(self.value_correlation) * common + np.sqrt(1.0 - self.value_correlation) * idiosyncratic
+        else:
+            shocks = idiosyncratic
+        time_step = self.n_values
+        in_trend = (self.trend_start <= time_step) & (time_step < self.trend_end)
+        values = self._values[self.n_values - 1] + self.mu_value + self.sigma_value * shocks \
+            + np.where(in_trend, self.trend_size, 0.0)
+        negative = values < 0
+        if negative.any():
+            print("Fundamental value became negative")
+            values[negative] = self._values[self.n_values - 1][negative]
+        self._values[self.n_values] = values
+        self.n_values += 1
+
+    def _update_prices(self):
+        last_prices = self._prices[self.n_prices - 1]
+        last_orders = self._orders[self.n_orders - 1] if self.n_orders > 0 else np.zeros(self.n_assets)
+        noises = self.mu_price + self.sigma_price * self.price_stream.standard_normal(self.n_assets)
+        if self.log_price_formation:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                prices = last_prices * np.exp((last_orders / self.liquidity + noises) / last_prices)
+        else:
+            prices = last_prices + last_orders / self.liquidity + noises
+        self._prices[self.n_prices] = np.maximum(np.nan_to_num(prices), 0.0)
+        self._price_sums[self.n_prices + 1] = self._price_sums[self.n_prices] + self._prices[self.n_prices]
+        self.n_prices += 1
+
+    def _update_orders(self):
+        self._type_orders[self.n_orders] = self.net_orders
+        self._orders[self.n_orders] = self.net_orders.sum(axis=0)
+        self.n_orders += 1
+        self.net_orders[:] = 0.0
+
+
+class AssetView:
+    """
+    The MarketMaker interface of one asset of a MultiAssetMarketMaker, for single-asset traders.
+    """
+
+    def __init__(self, market, k):
+        self.market = market
+        self.k = k
+
+    def get_prices(self, low_limit=0, high_limit=None):
+        return self.market.price_history[low_limit:high_limit, self.k].tolist()
+
+    def get_values(self, low_limit, high_limit):
+        return self.market.value_history[low_limit:high_limit, self.k].tolist()
+
+    def get_orders(self, low_limit, high_limit):
+        return self.market.order_history[low_limit:high_limit, self.k].tolist()
+
+    def get_current_price(self):
+        return self.market.price_history[-1, self.k]
+
+    def get_current_value(self):
+        return self.market.value_history[-1, self.k]
+
+    def get_current_order(self):
+        return self.market.order_history[-1, self.k]
+
+    def submit_order(self, order, trader_id):
+        """
+        Receives an order of a trader on this asset, added to the net orders of its type and to its position.
+        """
+        self.market.net_orders[self.market.trader_types[trader_id], self.k] += order
+        self.market.positions[trader_id, self.k] += order
+
+
+class MultiAssetArtificialMarket(Model):
+    """
+    The artificial market on n_assets assets of a MultiAssetMarketMaker, with the four trader types acting on
+    all assets at once. Every trader holds a position vector (a row of the market maker's positions) and the
+    orders of all traders are submitted with their ids in one batch per step, so a step costs a few array
+    operations over (traders x assets) instead of one model per asset.
+
+    The trading rules are those of the single-asset traders applied per asset, with the parameters (class
+    constants) of model_cls. Risk tolerance applies to the gross exposure over all assets. Noise trader
+    clusters coordinate per asset, and mimetic traders copy the net order vector of one of four fundamentalist
+    or technical neighbours, holding their position between evaluations.
+    """
+
+    def __init__(self, n_assets=10, initial_fundamentalist=25, initial_technical=25, initial_mimetic=25,
+                 initial_noise=25, value_correlation=0.0, seed=None, collection_interval=1,
+                 model_cls=HeterogeneityInArtificialMarket):
+        super().__init__()
+        self.n_assets = n_assets
+        self.constants = model_cls
+        self.streams = RandomStreams(seed)
+        self.collection_interval = collection_interval
+        self.time = 0
+
+        # Trader ids are consecutive per type, an id indexes the rows of every per-trader array
+        counts = [initial_fundamentalist, initial_technical, initial_mimetic, initial_noise]
+        trader_types = np.repeat([TRADER_TYPE_CODES[name] for name in ["Fundamentalist", "Technical", "Mimetic",
+                                                                       "Noise"]], counts)
+        self.n_traders = len(trader_types)
+        bounds = np.cumsum([0] + counts)
+        self.ftrader_ids, self.ttrader_ids, self.mtrader_ids, self.ntrader_ids = \
+            [np.arange(bounds[i], bounds[i + 1]) for i in range(4)]
+
+        c = model_cls
+        self.market_maker = MultiAssetMarketMaker(
+            n_assets, initial_value=c.INITIAL_VALUE, mu_value=c.MU_VALUE, sigma_value=c.SIGMA_VALUE,
+            mu_price=c.MU_PRICE, sigma_price=c.SIGMA_PRICE, liquidity=self.n_traders, trend_size=c.TREND_SIZE,
+            trend_start=c.TREND_START_TIME, trend_end=c.TREND_END_TIME, log_price_formation=c.LOG_PRICE_FORMATION,
+            value_correlation=value_correlation, trader_types=trader_types,
+            value_stream=self.streams.get("value"), price_stream=self.streams.get("price"))
+
+        self._generate_traders()
+
+        self.order_sum = 0.0
+        model_reporters = {
+            "step": partial(MultiAssetArtificialMarket.get_step),
+            "order_all_sum": partial(MultiAssetArtificialMarket.get_order_sum),
+            "wealth_all_mean": partial(MultiAssetArtificialMarket.get_wealth_mean),
+        }
+        for k in range(n_assets):
+            model_reporters["price_{}".format(k)] = partial(MultiAssetArtificialMarket.get_asset_parameter,
+                                                            param_name="price", k=k)
+            model_reporters["value_{}".format(k)] = partial(MultiAssetArtificialMarket.get_asset_parameter,
+                                                            param_name="value", k=k)
+        self.datacollector = DataCollector(model_reporters=model_reporters)
+
+    def _generate_traders(self):
+        c = self.constants
+        streams = {name: self.streams.get("parameters_" + name.lower())
+                   for name in ["Fundamentalist", "Technical", "Mimetic", "Noise"]}
+
+        # Wealth and risk tolerance of every trader, drawn from the stream of its type
+        self.cash = np.empty(self.n_traders)
+        self.risk_tolerance = np.empty(self.n_traders)
+        for name, ids in zip(streams, [self.ftrader_ids, self.ttrader_ids, self.mtrader_ids, self.ntrader_ids]):
+            self.cash[ids] = c.BASE_WEALTH * pareto.rvs(b=c.PARETO_ALPHA, scale=c.PARETO_XM, size=len(ids),
+                                                        random_state=streams[name])
+            self.risk_tolerance[ids] = draw_from_normal(mu=c.MU_RISK_TOLERANCE, sigma=c.SIGMA_RISK_TOLERANCE,
+                                                        lower=0.1, upper=0.9, random_state=streams[name],
+                                                        size=len(ids))
+        self.initial_cash = self.cash.copy()
+
+        n_f, n_t, n_m = len(self.ftrader_ids), len(self.ttrader_ids), len(self.mtrader_ids)
+        stream = streams["Fundamentalist"]
+        self.perception_offsets = stream.uniform(c.VALUE_PERCEPTION_MIN, c.VALUE_PERCEPTION_MAX,
+                                                 (n_f, self.n_assets))
+        self.entry_thresholds = stream.uniform(c.ENTRY_THRESHOLD_MIN, c.ENTRY_THRESHOLD_MAX, n_f)
+        self.exit_thresholds = stream.uniform(c.EXIT_THRESHOLD_MIN, c.EXIT_THRESHOLD_MAX, n_f)
+
+        stream = streams["Technical"]
+        self.short_windows = stream.uniform(c.SHORT_WINDOW_MIN, c.SHORT_WINDOW_MAX, n_t).astype(int)
+        self.long_windows = stream.uniform(c.LONG_WINDOW_MIN, c.LONG_WINDOW_MAX, n_t).astype(int)
+        self.exit_windows = stream.uniform(c.EXIT_WINDOW_MIN, c.EXIT_WINDOW_MAX, n_t).astype(int)
+
+        # Mimetic traders imitate four fundamentalist or technical neighbours
+        stream = streams["Mimetic"]
+        self.evaluation_periods = stream.uniform(c.MIN_PERIOD, c.MAX_PERIOD, n_m).astype(int)
+        candidates = np.concatenate([self.ftrader_ids, self.ttrader_ids])
+        if n_m > 0 and len(candidates) == 0:
+            raise ValueError("Mimetic traders need fundamentalist or technical traders to imitate")
+        network_stream = self.streams.get("network")
+        self.neighbours = np.array([network_stream.choice(candidates, size=4, replace=len(candidates) < 4)
+                                    for _ in range(n_m)], dtype=np.int64).reshape(n_m, 4)
+        self.imitation_weights = np.ones((n_m, 4))
+
+        # Positions and wealth of the last MAX_PERIOD + 1 states (entry 0 is the initial state), for imitation
+        self.state_capacity = c.MAX_PERIOD + 1
+        self.past_positions = np.zeros((self.state_capacity, self.n_traders, self.n_assets))
+        self.past_wealth = np.zeros((self.state_capacity, self.n_traders))
+        self.past_wealth[0] = self.cash
+
+    def get_portfolio(self, prices=None):
+        prices = self.market_maker.get_current_prices() if prices is None else prices
+        return self.market_maker.positions * prices
+
+    def get_net_wealth(self, prices=None):
+        return self.cash + self.get_portfolio(prices).sum(axis=1)
+
+    def is_within_risk_tolerance(self, prices):
+        """
+        Whether the gross exposure over all assets of every trader is within its risk tolerance.
+        """
+        portfolio = self.get_portfolio(prices)
+        return np.abs(portfolio).sum(axis=1) < self.risk_tolerance * (self.cash + portfolio.sum(axis=1))
+
+    def step(self):
+        self.market_maker.update_price()
+        t = self.time
+        prices = self.market_maker.get_current_prices()
+        positions = self.market_maker.positions
+        within = self.is_within_risk_tolerance(prices)
+
+        orders = np.zeros((self.n_traders, self.n_assets))
+        orders[self.ftrader_ids] = self._fundamentalist_orders(prices, positions[self.ftrader_ids],
+                                                               within[self.ftrader_ids])
+        orders[self.ttrader_ids] = self._technical_orders(t, prices, positions[self.ttrader_ids],
+                                                          within[self.ttrader_ids])
+        orders[self.mtrader_ids] = self._mimetic_orders(t, within[self.mtrader_ids])
+        orders[self.ntrader_ids] = self._noise_orders(within[self.ntrader_ids])
+
+        # All orders in one batch, attributed to the types of the traders and added to their positions
+        self.market_maker.submit_orders(orders, np.arange(self.n_traders))
+        self.cash -= (orders * prices).sum(axis=1)
+        self.order_sum = np.abs(orders).sum()
+
+        self.time += 1
+        self.past_positions[self.time % self.state_capacity] = positions
+        self.past_wealth[self.time % self.state_capacity] = self.get_net_wealth(prices)
+        if self.time % self.collection_interval == 0:
+            self.datacollector.collect(self)
+
+    def _fundamentalist_orders(self, prices, positions, within):
+        gaps = self.market_maker.get_current_values() + self.perception_offsets - prices
+        entry = self.entry_thresholds[:, np.newaxis]
+        exit = self.exit_thresholds[:, np.newaxis]
+        # Open a position on a large mispricing, liquidate on a small one, otherwise follow it within tolerance
+        new_positions = np.where(positions == 0,
+                                 np.where(np.abs(gaps) > entry, gaps, 0.0),
+                                 np.where(np.abs(gaps) < exit, 0.0,
+                                          np.where(within[:, np.newaxis], gaps, positions)))
+        return new_positions - positions
+
+    def _technical_orders(self, t, prices, positions, within):
+        if len(positions) == 0:
+            return positions
+        market = self.market_maker
+        last_short = market.get_moving_averages(max(t - 1, 0), self.short_windows)
+        last_long = market.get_moving_averages(max(t - 1, 0), self.long_windows)
+        short = market.get_moving_averages(t, self.short_windows)
+        long = market.get_moving_averages(t, self.long_windows)
+        targets = self.constants.TECHNICAL_NORM_FACTOR * np.abs(np.arctan(short - last_short)
+                                                                 - np.arctan(long - last_long))
+
+        # Extremes of the exit windows, once per distinct window
+        exit_low = np.empty_like(positions)
+        exit_high = np.empty_like(positions)
+        price_history = market.price_history
+        for window in np.unique(self.exit_windows):
+            window_prices = price_history[max(0, t - window + 1):t + 1]
+            traders = self.exit_windows == window
+            exit_low[traders] = window_prices.min(axis=0)
+            exit_high[traders] = window_prices.max(axis=0)
+
+        # The crossover state machine of kernels.technical_position, for every trader and asset
+        within = within[:, np.newaxis]
+        opened = np.where((last_short < last_long) & (short >= long), targets,
+                          np.where((last_short > last_long) & (short <= long), -targets, 0.0))
+        held_long = np.where(prices <= exit_low, 0.0, np.where(within, targets, positions))
+        held_short = np.where(prices >= exit_high, 0.0, np.where(within, -targets, positions))
+        new_positions = np.where(positions == 0, opened, np.where(positions > 0, held_long, held_short))
+        return new_positions - positions
+
+    def _mimetic_orders(self, t, within):
+        n_m = len(self.mtrader_ids)
+        if n_m == 0:
+            return np.zeros((0, self.n_assets))
+        periods = self.evaluation_periods
+        evaluating = (t >= periods) & (t % periods == 0)
+        current = t % self.state_capacity
+        past = (t - periods) % self.state_capacity
+
+        # Wealth gained and net orders of the neighbours over the evaluation period
+        gains = self.past_wealth[current, self.neighbours] - self.past_wealth[past[:, np.newaxis], self.neighbours]
+        net_orders = self.past_positions[current, self.neighbours] \
+            - self.past_positions[past[:, np.newaxis], self.neighbours]
+
+        # The weight of the best neighbour grows, one neighbour is drawn from the softmax of the weights
+        rows = np.arange(n_m)
+        self.imitation_weights[rows[evaluating], gains[evaluating].argmax(axis=1)] += 1.0
+        probabilities = np.exp(self.imitation_weights)
+        cdf = np.cumsum(probabilities, axis=1) / probabilities.sum(axis=1, keepdims=True)
+        samples = self.streams.get("mimetic").random(n_m)
+        chosen = np.minimum((cdf <= samples[:, np.newaxis]).sum(axis=1), 3)
+
+        copied = net_orders[rows, chosen]
+        return np.where((evaluating & within)[:, np.newaxis], copied, 0.0)
+
+    def _noise_orders(self, within):
+        c = self.constants
+        n_n = len(self.ntrader_ids)
+        if n_n == 0:
+            return np.zeros((0, self.n_assets))
+        cluster_stream = self.streams.get("clusters")
+        order_stream = self.streams.get("noise_orders")
+
+        def get_directions(uniforms):
+            return np.where(uniforms < c.BUY_PROBABILITY, 1.0,
+                            np.where(uniforms < c.BUY_PROBABILITY + c.SELL_PROBABILITY, -1.0, 0.0))
+
+        # Noise traders form clusters every step, each cluster buys, sells or holds each asset together
+        n_clusters = max(1, int(round(2.0 * n_n / (c.MIN_CLUSTER_SIZE + c.MAX_CLUSTER_SIZE))))
+        clusters = cluster_stream.integers(n_clusters, size=n_n)
+        cluster_directions = get_directions(cluster_stream.random((n_clusters, self.n_assets)))[clusters]
+
+        herding = self.streams.get("herding").random((n_n, self.n_assets)) <= c.HERDING_PROBABILITY
+        own_directions = get_directions(order_stream.random((n_n, self.n_assets)))
+        sizes = draw_from_normal(mu=c.MU_ORDER_SIZE, sigma=c.SIGMA_ORDER_SIZE, lower=0.0, random_state=order_stream,
+                                 size=(n_n, self.n_assets))
+        orders = np.where(herding, cluster_directions, own_directions) * sizes
+        return np.where(within[:, np.newaxis], orders, 0.0)
+
+    def get_step(self):
+        return self.time
+
+    def get_order_sum(self):
+        return self.order_sum
+
+    def get_wealth_mean(self):
+        return self.past_wealth[self.time % self.state_capacity].mean()
+
+    def get_asset_parameter(self, param_name, k):
+        if param_name == "price":
+            return self.market_maker.price_history[-1, k]
+        elif param_name == "value":
+            return self.market_maker.value_history[-1, k]
+        raise ValueError("Unknown asset parameter: {}".format(param_name))
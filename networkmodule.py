@@ -0,0 +1,102 @@
+import time
+from mesa.visualization.ModularVisualization import VisualizationElement
+
+
+class DeltaNetworkModule(VisualizationElement):
+    """
+    Network visualisation that sends the static topology once per model and then only per-node deltas.
+
+    topology_method(G) returns the static part of a node portrayal (its tooltip),
+    state_method(agent) returns the dynamic part as a dictionary with "size" and "color".
+    Edges are sampled down to max_edges and updates are throttled to fps frames per second.
+    """
+    package_includes = ["d3.min.js"]
+    local_includes = ["DeltaNetworkModule.js"]
+
+    def __init__(self, topology_method, state_method, canvas_height=500, canvas_width=500, fps=10,
+                 max_edges=5000):
+        self.topology_method = topology_method
+        self.state_method = state_method
+        self.canvas_height = canvas_height
+        self.canvas_width = canvas_width
+        self.fps = fps
+        self.max_edges = max_edges
+
+        self.model_id = None
+        self.last_render_time = 0.0
+        self.node_ids = []
+        self.palette = {}
+        self.sizes = []
+        self.colors = []
+
+        new_element = "new DeltaNetworkModule({}, {})".format(self.canvas_width, self.canvas_height)
+        self.js_code = "elements.push(" + new_element + ");"
+
+    def render(self, model):
+        if id(model) != self.model_id:
+            self.model_id = id(model)
+            return self._render_topology(model.G)
+
+        # Throttle to the target frame rate, the next delta is computed against the last one sent
+        now = time.time()
+        if self.fps and (now - self.last_render_time) < 1.0 / self.fps:
+            return None
+        self.last_render_time = now
+        return self._render_delta(model.G)
+
+    def _get_state(self, G):
+        sizes = []
+        colors = []
+        new_colors = []
+        for node_id in self.node_ids:
+            state = self.state_method(G.nodes[node_id]["agent"][0])
+            if state["color"] not in self.palette:
+                self.palette[state["color"]] = len(self.palette)
+                new_colors.append(state["color"])
+            sizes.append(int(state["size"]))
+            colors.append(self.palette[state["color"]])
+        return sizes, colors, new_colors
+
+    def _render_topology(self, G):
+        self.node_ids = list(G.nodes)
+        self.palette = {}
+        self.last_render_time = time.time()
+        self.sizes, self.colors, new_colors = self._get_state(G)
+
+        index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        edges = list(G.edges)
+        total_edges = len(edges)
+        if total_edges > self.max_edges:
+            # Deterministic stride sampling keeps the drawn graph stable between resets
+            stride = total_edges / self.max_edges
+            edges = [edges[int(i * stride)] for i in range(self.max_edges)]
+
+        flat_edges = []
+        for (source, target) in edges:
+            flat_edges.append(index[source])
+            flat_edges.append(index[target])
+
+        return {
+            "type": "topology",
+            "tooltip": [self.topology_method(G.nodes[node_id]["agent"][0]) for node_id in self.node_ids],
+            "size": self.sizes,
+            "color": self.colors,
+            "palette": new_colors,
+            "edges": flat_edges,
+            "total_edges": total_edges,
+        }
+
+    def _render_delta(self, G):
+        sizes, colors, new_colors = self._get_state(G)
+
+        changed = [i for i in range(len(sizes)) if sizes[i] != self.sizes[i] or colors[i] != self.colors[i]]
+        self.sizes = sizes
+        self.colors = colors
+
+        return {
+            "type": "delta",
+            "ids": changed,
+            "size": [sizes[i] for i in changed],
+            "color": [colors[i] for i in changed],
+            "palette": new_colors,
+        }
@@ -19,22 +19,39 @@ class Noise(Trader):
         self.mu_order_size = self.model_reference.MU_ORDER_SIZE
         self.sigma_order_size = self.model_reference.SIGMA_ORDER_SIZE
 
+        self.herding_stream = self.model_reference.streams.get("herding")
+        self.order_stream = self.model_reference.streams.get("noise_orders")
+
+        # Poisson arrivals per step under an EventActivation schedule, None to act every step
+        self.arrival_rate = self.model_reference.NOISE_ARRIVAL_RATE
+        self.arrival_stream = self.model_reference.streams.get("arrivals")
+        if self.arrival_rate is not None and not 0.0 < self.arrival_rate <= 1.0:
+            # A trader acts at most once per step
+            raise ValueError("NOISE_ARRIVAL_RATE must be in (0, 1], got {}".format(self.arrival_rate))
+
         if not ((0.0 <= self.buy_probability <= 0.5) and (0.0 <= self.sell_probability <= 0.5)):
             print("error in Noise trader probabilities")
 
+    def next_wakeup(self, time):
+        if self.arrival_rate is None:
+            return time + 1
+        return time + self.arrival_stream.exponential(1.0 / self.arrival_rate)
+
     def trade(self, t):
         # if t == 1:
         #     exit()
-        if draw_from_uniform(0.0, 1.0) <= self.herding_probability:
+        if draw_from_uniform(0.0, 1.0, self.herding_stream) <= self.herding_probability:
             # participate in herding
             ntrader_id = self.unique_id
 
             if ntrader_id in self.model_reference.coordinated_ntrader_behaviour["buy"]:
                 # buy
-                order = draw_from_normal(mu=self.mu_order_size, sigma=self.sigma_order_size, lower=0.0)
+                order = draw_from_normal(mu=self.mu_order_size, sigma=self.sigma_order_size, lower=0.0,
+                                         random_state=self.order_stream)
             elif ntrader_id in self.model_reference.coordinated_ntrader_behaviour["sell"]:
                 # sell
-                order = draw_from_normal(mu=-self.mu_order_size, sigma=self.sigma_order_size, upper=0.0)
+                order = draw_from_normal(mu=-self.mu_order_size, sigma=self.sigma_order_size, upper=0.0,
+                                         random_state=self.order_stream)
             elif ntrader_id in self.model_reference.coordinated_ntrader_behaviour["hold"]:
                 # hold
                 order = 0.0
@@ -43,14 +60,16 @@ class Noise(Trader):
                 order = 0.0
         else:
             # trade randomly
-            random_float = draw_from_uniform(0.0, 1.0)
+            random_float = draw_from_uniform(0.0, 1.0, self.order_stream)
 
             if 0.0 <= random_float < self.buy_probability:
                 # buy order
-                order = draw_from_normal(mu=self.mu_order_size, sigma=self.sigma_order_size, lower=0.0)
+                order = draw_from_normal(mu=self.mu_order_size, sigma=self.sigma_order_size, lower=0.0,
+                                         random_state=self.order_stream)
             elif self.buy_probability <= random_float < (self.buy_probability + self.sell_probability):
                 # sell order
-                order = draw_from_normal(mu=-self.mu_order_size, sigma=self.sigma_order_size, upper=0.0)
+                order = draw_from_normal(mu=-self.mu_order_size, sigma=self.sigma_order_size, upper=0.0,
+                                         random_state=self.order_stream)
             else:
                 order = 0.0
 
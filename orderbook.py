@@ -0,0 +1,170 @@
+import heapq
+import itertools
+import numpy as np
+
+BUY = 1
+SELL = -1
+
+
+class LimitOrderBook:
+    """
+    Limit order book with price-time priority. Each side is a binary heap of (price key, sequence, order id),
+    so inserting is O(log n). Cancelling marks the order and is O(1). Cancelled and filled orders are
+    dropped lazily when they reach the top of their heap, and the heaps are rebuilt once stale entries outnumber
+    the live orders.
+    """
+
+    # Stale heap entries tolerated before a rebuild, on top of the number of live orders
+    MIN_STALE_ENTRIES = 4096
+
+    def __init__(self):
+        self.bids = []
+        self.asks = []
+        self.orders = {}
+        self.sequence = itertools.count()
+        self.next_order_id = itertools.count()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, side, price, size, owner=None):
+        """
+        Rests a limit order in the book (without matching) and returns its id.
+        """
+        order_id = next(self.next_order_id)
+        self.orders[order_id] = [side, price, size, owner]
+        if side == BUY:
+            heapq.heappush(self.bids, (-price, next(self.sequence), order_id))
+        else:
+            heapq.heappush(self.asks, (price, next(self.sequence), order_id))
+        return order_id
+
+    def cancel(self, order_id):
+        self.orders.pop(order_id, None)
+        if len(self.bids) + len(self.asks) > 2 * len(self.orders) + self.MIN_STALE_ENTRIES:
+            self._compact()
+
+    def _compact(self):
+        self.bids = [entry for entry in self.bids if entry[2] in self.orders]
+        self.asks = [entry for entry in self.asks if entry[2] in self.orders]
+        heapq.heapify(self.bids)
+        heapq.heapify(self.asks)
+
+    def _top(self, heap):
+        # Drop cancelled and filled orders from the top
+        while heap and heap[0][2] not in self.orders:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def best_bid(self):
+        top = self._top(self.bids)
+        return -top[0] if top is not None else None
+
+    def best_ask(self):
+        top = self._top(self.asks)
+        return top[0] if top is not None else None
+
+    def match(self, side, size, limit_price=None):
+        """
+        Matches an incoming order against the opposite side, up to limit_price (None for a market order).
+        Returns the trades as (price, size, resting owner) and the unfilled size.
+        """
+        heap = self.asks if side == BUY else self.bids
+        trades = []
+        while size > 0:
+            top = self._top(heap)
+            if top is None:
+                break
+            price = top[0] if side == BUY else -top[0]
+            if limit_price is not None and (price > limit_price if side == BUY else price < limit_price):
+                break
+            resting = self.orders[top[2]]
+            fill = min(size, resting[2])
+            trades.append((price, fill, resting[3]))
+            size -= fill
+            resting[2] -= fill
+            if resting[2] <= 0:
+                del self.orders[top[2]]
+                heapq.heappop(heap)
+        return trades, size
+
+    def submit(self, side, size, limit_price=None, owner=None):
+        """
+        Matches an order and rests the unfilled part of a limit order. Returns the trades, the resting order id.
+        """
+        trades, remaining = self.match(side, size, limit_price)
+        order_id = None
+        if remaining > 0 and limit_price is not None:
+            order_id = self.add(side, limit_price, remaining, owner)
+        return trades, order_id
+
+
+class OrderBookEngine:
+    """
+    Price formation by a continuous double auction, as an alternative to P_t = P_{t-1} + order / liquidity + noise.
+
+    The orders that traders submit during a step are queued and matched in arrival order at the next price update
+    (batched matching). Market orders walk the book; the unfilled part of limit orders rests in the book.
+    A liquidity-providing market maker quotes depth_levels price levels on each side, one tick apart,
+    around the last price plus the price noise, with tick_size * liquidity shares per level. The impact
+    of a market order against those quotes alone is therefore close to order / liquidity, as in the aggregate
+    formation. Its quotes are replaced at every update.
+    The price of a step is the last trade print, or the mid quote when nothing traded.
+    """
+
+    def __init__(self, liquidity=400, tick_size=0.01, depth_levels=200):
+        self.liquidity = liquidity
+        self.tick_size = tick_size
+        self.depth_levels = depth_levels
+        self.book = LimitOrderBook()
+        self.pending = []
+        self.quote_ids = []
+
+        # Trade prints and traded volume of every price update
+        self.trades = []
+        self.volume_history = []
+
+    def submit(self, order, limit_price=None, owner=None):
+        """
+        Queues a signed order (positive buys, negative sells) for the next batch.
+        """
+        if order != 0:
+            self.pending.append((BUY if order > 0 else SELL, abs(order), limit_price, owner))
+
+    def _quote(self, center):
+        for order_id in self.quote_ids:
+            self.book.cancel(order_id)
+        self.quote_ids = []
+        # Quotes that would cross resting limit orders of traders are left out, the book is never crossed
+        best_bid, best_ask = self.book.best_bid(), self.book.best_ask()
+        level_size = self.tick_size * self.liquidity
+        center = round(center / self.tick_size) * self.tick_size
+        for level in range(1, self.depth_levels + 1):
+            offset = (level - 0.5) * self.tick_size
+            if best_ask is None or center - offset < best_ask:
+                self.quote_ids.append(self.book.add(BUY, center - offset, level_size, "MarketMaker"))
+            if best_bid is None or center + offset > best_bid:
+                self.quote_ids.append(self.book.add(SELL, center + offset, level_size, "MarketMaker"))
+
+    def form_price(self, last_price, noise):
+        """
+        Requotes around last_price + noise, matches the queued orders and returns the price of the step.
+        """
+        self._quote(last_price + noise)
+        step_trades = []
+        for side, size, limit_price, owner in self.pending:
+            trades, _ = self.book.submit(side, size, limit_price, owner)
+            step_trades += trades
+        self.pending = []
+
+        self.trades.append(step_trades)
+        self.volume_history.append(sum(size for _, size, _ in step_trades))
+        if step_trades:
+            return max(step_trades[-1][0], 0.0)
+        best_bid, best_ask = self.book.best_bid(), self.book.best_ask()
+        if best_bid is None or best_ask is None:
+            return last_price
+        return max((best_bid + best_ask) / 2.0, 0.0)
+
+    def get_trade_prices(self):
+        return np.array([price for trades in self.trades for price, _, _ in trades])
@@ -0,0 +1,131 @@
+import json
+import numpy as np
+
+from events import TRADER_TYPE_CODES
+
+# Per-agent fields that can be recorded, as functions of a trader
+PANEL_FIELDS = {
+    "wealth": lambda trader: trader.net_wealth[-1],
+    "position": lambda trader: trader.position[-1],
+    "cash": lambda trader: trader.cash[-1],
+    "portfolio": lambda trader: trader.portfolio[-1],
+    "trader_type": lambda trader: TRADER_TYPE_CODES[type(trader).__name__],
+    "risk_tolerance": lambda trader: trader.risk_tolerance,
+    "initial_cash": lambda trader: trader.initial_cash,
+}
+
+DEFAULT_PANEL_FIELDS = ["wealth", "position", "cash", "trader_type", "risk_tolerance"]
+
+
+def allocate_sample(sample_size, stratum_sizes):
+    """
+    Returns the sample sizes of the strata, proportional to their sizes and summing to sample_size: each
+    stratum gets the floor of its quota, the remaining agents go to the largest remainders (ties to the first).
+    """
+    stratum_sizes = np.asarray(stratum_sizes)
+    quotas = sample_size * stratum_sizes / float(stratum_sizes.sum())
+    allocation = np.floor(quotas).astype(int)
+    remaining = sample_size - allocation.sum()
+    order = np.argsort(-(quotas - allocation), kind="stable")
+    allocation[order[:remaining]] += 1
+    return allocation.tolist()
+
+
+class AgentPanelRecorder:
+    """
+    Records a panel of per-agent fields every k steps, for all agents or a sample stratified by trader type.
+    Snapshots are written into a preallocated float32 (snapshots x agents x fields) .npy file that is
+    memory-mapped, so the panel streams to disk instead of growing in memory.
+    A JSON sidecar (file_name + ".json") describes the fields, agent ids and recorded steps.
+
+    Use it next to the DataCollector, calling collect(model) after every step, e.g.
+        recorder = AgentPanelRecorder("panel.npy", max_steps=1530, every=10, sample_size=100)
+        run_model_cached(..., observers=[recorder])
+    """
+
+    def __init__(self, file_name, max_steps, every=10, fields=None, sample_size=None, seed=None, flush_every=10):
+        self.file_name = file_name
+        self.max_steps = max_steps
+        self.every = every
+        self.fields = DEFAULT_PANEL_FIELDS if fields is None else list(fields)
+        self.sample_size = sample_size
+        self.seed = seed
+        self.flush_every = flush_every
+
+        for field in self.fields:
+            if field not in PANEL_FIELDS:
+                raise ValueError("Unknown panel field: {}".format(field))
+        if max_steps < every:
+            raise ValueError("No snapshot to record: max_steps ({}) is less than every ({})".format(max_steps, every))
+
+        self.agents = None
+        self.buffer = None
+        self.steps = []
+
+    def select_agents(self, model):
+        """
+        Returns all traders, or a sample stratified by trader type with proportional allocation.
+        A private random state is used so that sampling does not perturb the model's random streams.
+        """
+        if self.sample_size is None or self.sample_size >= len(model.all_traders):
+            return list(model.all_traders)
+
+        random_state = np.random.RandomState(self.seed)
+        strata = [model.fundamental_traders, model.technical_traders, model.mimetic_traders, model.noise_traders]
+        selected = []
+        for stratum, n_stratum in zip(strata, allocate_sample(self.sample_size, [len(s) for s in strata])):
+            indices = random_state.choice(len(stratum), size=n_stratum, replace=False)
+            selected += [stratum[i] for i in sorted(indices)]
+        return selected
+
+    def _allocate(self, model):
+        self.agents = self.select_agents(model)
+        n_snapshots = self.max_steps // self.every
+        self.buffer = np.lib.format.open_memmap(self.file_name, mode="w+", dtype=np.float32,
+                                                shape=(n_snapshots, len(self.agents), len(self.fields)))
+
+    def collect(self, model):
+        step = model.schedule.time
+        if step % self.every != 0:
+            return
+        if self.buffer is None:
+            self._allocate(model)
+
+        snapshot = len(self.steps)
+        if snapshot >= self.buffer.shape[0]:
+            return
+        for j, field in enumerate(self.fields):
+            get_field = PANEL_FIELDS[field]
+            self.buffer[snapshot, :, j] = [get_field(trader) for trader in self.agents]
+        self.steps.append(step)
+
+        if len(self.steps) % self.flush_every == 0:
+            self.buffer.flush()
+
+    def __call__(self, model):
+        self.collect(model)
+
+    def close(self):
+        if self.buffer is None:
+            return
+        self.buffer.flush()
+        meta = {
+            "fields": self.fields,
+            "agent_ids": [trader.unique_id for trader in self.agents],
+            "steps": self.steps,
+            "every": self.every,
+        }
+        with open(self.file_name + ".json", "w") as file:
+            json.dump(meta, file, indent=4)
+        self.buffer = None
+
+
+def load_panel(file_name):
+    """
+    Returns the recorded (snapshots x agents x fields) panel as a read-only memory map, and its description.
+    Snapshots that were never recorded are cut off.
+    """
+    with open(file_name + ".json", "r") as file:
+        meta = json.load(file)
+    panel = np.load(file_name, mmap_mode="r")
+    return panel[:len(meta["steps"])], meta
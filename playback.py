@@ -0,0 +1,312 @@
+import glob
+import os
+
+import numpy as np
+import tornado.escape
+from mesa.visualization.ModularVisualization import ModularServer, SocketHandler, VisualizationElement
+from mesa.visualization.modules import TextElement
+from mesa.visualization.UserParam import UserSettableParameter
+
+from cache import read_record
+from events import TRADER_TYPE_CODES
+from panel import load_panel
+
+dir_data = os.path.join('.', 'Data')
+
+# Points of a series sent to (and kept by) a chart, longer windows are decimated
+MAX_POINTS = 1000
+RUN_MEMO_SIZE = 4
+
+
+def get_recorded_runs(data_dir=dir_data):
+    """
+    Returns the record files of the experiments (Data/Experiment*/batch_record_*.csv).
+    """
+    return sorted(glob.glob(os.path.join(data_dir, "Experiment*", "batch_record_*.csv")))
+
+
+def get_panel_file(record_file):
+    """
+    Returns the agent panel recorded next to a record by main.py (panel_record_i.npy), or None.
+    """
+    directory, name = os.path.split(record_file)
+    panel_file = os.path.join(directory, name.replace("batch_record_", "panel_record_").replace(".csv", ".npy"))
+    if panel_file != record_file and os.path.exists(panel_file) and os.path.exists(panel_file + ".json"):
+        return panel_file
+    return None
+
+
+def decimate(start, end, max_points):
+    """
+    Returns at most max_points indices from start to end (inclusive) at a regular stride, the last one included.
+    """
+    if end < start:
+        return np.empty(0, dtype=np.int64)
+    stride = max(1, int(np.ceil((end - start + 1) / float(max_points))))
+    indices = np.arange(end, start - 1, -stride)[::-1]
+    return indices
+
+
+class RecordedRun:
+    """
+    Recorded run replayed in the browser: the collected series of a record file and, optionally, the
+    per-agent panel snapshots of the same run. Loaded once and only read afterwards, a run is shared by all
+    viewers, each with its own PlaybackCursor.
+    """
+
+    def __init__(self, record_file, panel_file=None):
+        self.record_file = record_file
+        record = read_record(record_file, memoize=False)
+        self.steps = record["step"].to_numpy() if "step" in record.columns else np.arange(1, len(record) + 1)
+        self.series = {column: record[column].to_numpy(dtype=float) for column in record.columns
+                       if column != "step"}
+
+        self.panel = None
+        self.panel_meta = None
+        if panel_file is not None:
+            self.panel, self.panel_meta = load_panel(panel_file)
+            self.panel_steps = np.asarray(self.panel_meta["steps"])
+
+    def __len__(self):
+        return len(self.steps)
+
+    def get_series(self, columns, indices):
+        return [np.round(self.series[column][indices], 6).tolist() for column in columns]
+
+    def get_snapshot(self, index):
+        """
+        Returns the latest panel snapshot at or before a record index (agents x fields) and its step, or None.
+        """
+        if self.panel is None:
+            return None, None
+        snapshot = np.searchsorted(self.panel_steps, self.steps[index], side="right") - 1
+        if snapshot < 0:
+            return None, None
+        return np.asarray(self.panel[snapshot]), int(self.panel_steps[snapshot])
+
+
+_run_memo = {}
+
+
+def get_recorded_run(record_file, panel_file=None):
+    """
+    Returns the run of a record file, loaded once for all viewers (a few runs are kept in the process).
+    """
+    key = (os.path.abspath(record_file), panel_file)
+    if key not in _run_memo:
+        if len(_run_memo) >= RUN_MEMO_SIZE:
+            del _run_memo[next(iter(_run_memo))]
+        _run_memo[key] = RecordedRun(record_file, panel_file)
+    return _run_memo[key]
+
+
+class PlaybackCursor:
+    """
+    Playback state of one viewer: the current record index, the steps advanced per frame and the index
+    last rendered (None after a seek, when the elements send their whole window again).
+    """
+
+    def __init__(self, run, speed=1, max_points=MAX_POINTS):
+        self.run = run
+        self.speed = speed
+        self.max_points = max_points
+        self.position = 0
+        self.previous = None
+
+    @property
+    def step(self):
+        return int(self.run.steps[self.position])
+
+    def at_end(self):
+        return self.position >= len(self.run) - 1
+
+    def advance(self):
+        # The first frame after a seek shows the sought position
+        if self.previous is not None:
+            self.position = min(self.position + max(1, int(self.speed)), len(self.run) - 1)
+
+    def rendered(self):
+        self.previous = self.position
+
+    def seek(self, fraction):
+        self.position = int(round(min(max(fraction, 0.0), 1.0) * (len(self.run) - 1)))
+        self.previous = None
+
+
+class PlaybackChartModule(VisualizationElement):
+    """
+    Chart of recorded series up to the playback position. After a reset or seek the whole window is sent,
+    decimated to max_points, afterwards only the steps advanced (decimated at high speeds). Each frame carries
+    the limit in use (the viewer's Chart points, at most max_points) and the browser halves its points
+    whenever they exceed it, so long horizons stay cheap to draw.
+    """
+    package_includes = ["Chart.min.js"]
+    local_includes = ["PlaybackChartModule.js"]
+
+    def __init__(self, series, canvas_height=200, canvas_width=500, max_points=MAX_POINTS):
+        self.series = series
+        self.canvas_height = canvas_height
+        self.canvas_width = canvas_width
+        self.max_points = max_points
+        self.columns = [s["Label"] for s in series]
+
+        new_element = "new PlaybackChartModule({}, {}, {}, {})".format(
+            tornado.escape.json_encode(series), canvas_width, canvas_height, max_points)
+        self.js_code = "elements.push(" + new_element + ");"
+
+    def render(self, cursor):
+        run = cursor.run
+        max_points = min(self.max_points, cursor.max_points)
+        if cursor.previous is None:
+            indices = decimate(0, cursor.position, max_points)
+            frame_type = "window"
+        else:
+            indices = decimate(cursor.previous + 1, cursor.position, max(1, max_points // 10))
+            frame_type = "append"
+        return {
+            "type": frame_type,
+            "max_points": max_points,
+            "steps": run.steps[indices].tolist(),
+            "data": run.get_series(self.columns, indices),
+        }
+
+
+class PanelSummaryElement(TextElement):
+    """
+    Playback position and, with a recorded agent panel, the mean of every panel field by trader type
+    at the latest snapshot.
+    """
+
+    def render(self, cursor):
+        run = cursor.run
+        text = "Step {} of {} ({}, {} steps per frame)".format(cursor.step, int(run.steps[-1]),
+                                                               os.path.basename(run.record_file), cursor.speed)
+        snapshot, step = run.get_snapshot(cursor.position)
+        if snapshot is None:
+            return text
+
+        fields = run.panel_meta["fields"]
+        type_codes = snapshot[:, fields.index("trader_type")] if "trader_type" in fields else None
+        rows = ["<tr><th>Agents at step {}</th>{}</tr>".format(
+            step, "".join("<th>{}</th>".format(field) for field in fields if field != "trader_type"))]
+        for trader_type, code in TRADER_TYPE_CODES.items():
+            agents = snapshot if type_codes is None else snapshot[type_codes == code]
+            if len(agents) == 0:
+                continue
+            means = agents.mean(axis=0)
+            rows.append("<tr><td>{} ({})</td>{}</tr>".format(
+                trader_type if type_codes is not None else "All", len(agents),
+                "".join("<td>{:.2f}</td>".format(means[j]) for j, field in enumerate(fields)
+                        if field != "trader_type")))
+            if type_codes is None:
+                break
+        return text + "<table class='table table-condensed'>" + "".join(rows) + "</table>"
+
+
+class PlaybackSocketHandler(SocketHandler):
+    """
+    Handler for websocket, replaying the recorded run with a cursor of its own: frames are rendered from the
+    shared run, and the speed and position of a viewer (or the run chosen, on reset) do not affect the others.
+    """
+
+    def open(self):
+        self.params = self.application.get_default_params()
+        self.cursor = self.application.new_cursor(self.params)
+        super().open()
+
+    @property
+    def viz_state_message(self):
+        return {"type": "viz_state", "data": self.application.render_cursor(self.cursor)}
+
+    def on_message(self, message):
+        if self.application.verbose:
+            print(message)
+        msg = tornado.escape.json_decode(message)
+        if msg["type"] == "get_step":
+            if self.cursor.at_end() and self.cursor.previous is not None:
+                self.write_message({"type": "end"})
+            else:
+                self.cursor.advance()
+                self.write_message(self.viz_state_message)
+        elif msg["type"] == "reset":
+            self.cursor = self.application.new_cursor(self.params)
+            self.write_message(self.viz_state_message)
+        elif msg["type"] == "submit_params":
+            param, value = msg["param"], msg["value"]
+            if param not in self.params:
+                return
+            self.params[param] = value
+            # Playback controls apply immediately (a seek on the next frame), the run on the next reset
+            if param == "position":
+                self.cursor.seek(float(value) / 100.0)
+            elif param in ("speed", "max_points"):
+                setattr(self.cursor, param, int(value))
+        else:
+            if self.application.verbose:
+                print("Unexpected message!")
+
+
+class PlaybackServer(ModularServer):
+    """
+    Visualization server replaying recorded runs (Data/Experiment*) instead of simulating: every viewer
+    seeks, changes speed and resets on its own, the runs are loaded once and nothing is simulated.
+    A per-agent panel recorded next to a record (main.py, panel_every) is summarised as well.
+    """
+    socket_handler = (r"/ws", PlaybackSocketHandler)
+    handlers = [ModularServer.page_handler, socket_handler, ModularServer.static_handler, ModularServer.local_handler]
+
+    def __init__(self, visualization_elements, name="Artificial Market playback", record_files=None,
+                 server_params=None):
+        record_files = get_recorded_runs() if record_files is None else record_files
+        if len(record_files) == 0:
+            raise ValueError("No recorded runs to play back")
+        model_params = {
+            "record_file": UserSettableParameter("choice", "Recorded run", value=record_files[0],
+                                                 choices=record_files),
+        }
+        if server_params is None:
+            # Chart points beyond the charts' own limit would not be drawn
+            max_points = max([getattr(element, "max_points", MAX_POINTS) for element in visualization_elements]
+                             + [100])
+            server_params = {
+                "speed": UserSettableParameter("slider", "Steps per frame", 1, 1, 100),
+                "position": UserSettableParameter("slider", "Position (%)", 0, 0, 100),
+                "max_points": UserSettableParameter("slider", "Chart points", min(MAX_POINTS, max_points), 100,
+                                                    max_points, 100),
+            }
+        self.server_kwargs = server_params
+        super().__init__(RecordedRun, visualization_elements, name, model_params)
+
+    @property
+    def user_params(self):
+        result = super().user_params
+        for param, val in self.server_kwargs.items():
+            if isinstance(val, UserSettableParameter):
+                result[param] = val.json
+        return result
+
+    def get_default_params(self):
+        params = {}
+        for kwargs in (self.model_kwargs, self.server_kwargs):
+            for param, val in kwargs.items():
+                params[param] = val.value if isinstance(val, UserSettableParameter) else val
+        return params
+
+    def reset_model(self):
+        """Load the default run, shared by the viewers that play it back."""
+        record_file = self.get_default_params()["record_file"]
+        self.model = get_recorded_run(record_file, get_panel_file(record_file))
+
+    def new_cursor(self, params):
+        run = get_recorded_run(params["record_file"], get_panel_file(params["record_file"]))
+        cursor = PlaybackCursor(run, speed=int(params["speed"]), max_points=int(params["max_points"]))
+        cursor.seek(float(params["position"]) / 100.0)
+        return cursor
+
+    def render_cursor(self, cursor):
+        visualization_state = [element.render(cursor) for element in self.visualization_elements]
+        cursor.rendered()
+        return visualization_state
+
+    def render_model(self):
+        return self.render_cursor(PlaybackCursor(self.model))
@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+
+# Collected columns reported with every progress record
+DEFAULT_FIELDS = ["position_ftrader_sum", "position_ttrader_sum", "wealth_ftrader_median", "wealth_ttrader_median"]
+
+
+class ProgressReporter:
+    """
+    Emits rate-limited JSON progress records of a model run.
+    Statistics are read from the values the DataCollector has already collected for the current step,
+    never recomputed. Records are written as JSON lines to a stream, or put on a queue for a ProgressMonitor.
+    """
+
+    def __init__(self, interval_steps=None, interval_seconds=1.0, total_steps=None, worker_id=None,
+                 fields=None, stream=None, progress_queue=None):
+        self.interval_steps = interval_steps
+        self.interval_seconds = interval_seconds
+        self.total_steps = total_steps
+        self.worker_id = worker_id if worker_id is not None else os.getpid()
+        self.fields = DEFAULT_FIELDS if fields is None else fields
+        self.stream = sys.stdout if stream is None else stream
+        self.progress_queue = progress_queue
+
+        self.start_time = time.time()
+        self.last_time = self.start_time
+        self.last_step = 0
+
+    def __getstate__(self):
+        # Streams can not be pickled (model snapshots), the copy reports to stdout
+        state = self.__dict__.copy()
+        state["stream"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.stream is None:
+            self.stream = sys.stdout
+
+    def is_due(self, step, now):
+        if self.interval_steps is not None and step - self.last_step >= self.interval_steps:
+            return True
+        if self.interval_seconds is not None and now - self.last_time >= self.interval_seconds:
+            return True
+        return self.total_steps is not None and step >= self.total_steps
+
+    def report(self, model, force=False):
+        step = model.schedule.time
+        now = time.time()
+        if not force and not self.is_due(step, now):
+            return
+
+        elapsed = now - self.last_time
+        record = {
+            "worker": self.worker_id,
+            "step": step,
+            "total_steps": self.total_steps,
+            "elapsed": now - self.start_time,
+            "steps_per_second": (step - self.last_step) / elapsed if elapsed > 0 else None,
+            "value": model.market_maker.get_current_value(),
+            "price": model.market_maker.get_current_price(),
+            "order": model.market_maker.get_current_order() if len(model.market_maker.order_history) > 0 else None,
+        }
+        model_vars = model.datacollector.model_vars
+        for field in self.fields:
+            if field in model_vars and len(model_vars[field]) > 0:
+                record[field] = model_vars[field][-1]
+        self.last_time = now
+        self.last_step = step
+        self.emit(record)
+
+    def emit(self, record):
+        if self.progress_queue is not None:
+            self.progress_queue.put(record)
+        else:
+            self.stream.write(json.dumps(record, default=float) + "\n")
+            self.stream.flush()
+
+    def done(self):
+        self.emit({"worker": self.worker_id, "done": True})
+
+    def finish(self, model):
+        self.report(model, force=True)
+        self.done()
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return "{:02d}:{:02d}:{:02d}".format(seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+class ProgressMonitor(threading.Thread):
+    """
+    Aggregates the progress records of pool workers (received through a queue) into one periodic progress view,
+    with per-worker steps per second and ETA.
+    """
+
+    def __init__(self, progress_queue, total_runs, steps_per_run, refresh_seconds=5.0, stream=None):
+        super().__init__(daemon=True)
+        self.progress_queue = progress_queue
+        self.total_runs = total_runs
+        self.steps_per_run = steps_per_run
+        self.refresh_seconds = refresh_seconds
+        self.stream = sys.stdout if stream is None else stream
+        self.workers = {}
+        self.done = set()
+        self.start_time = time.time()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        last_refresh = time.time()
+        while not self.stop_event.is_set():
+            try:
+                self.update(self.progress_queue.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            if time.time() - last_refresh >= self.refresh_seconds:
+                self.stream.write(self.render() + "\n")
+                self.stream.flush()
+                last_refresh = time.time()
+
+    def update(self, record):
+        worker = record["worker"]
+        if record.get("done"):
+            self.done.add(worker)
+            self.workers.pop(worker, None)
+        else:
+            self.workers[worker] = record
+
+    def render(self):
+        steps_done = len(self.done) * self.steps_per_run + sum(r["step"] for r in self.workers.values())
+        steps_total = self.total_runs * self.steps_per_run
+        elapsed = time.time() - self.start_time
+        rate = steps_done / elapsed if elapsed > 0 else 0.0
+        eta = (steps_total - steps_done) / rate if rate > 0 else None
+
+        lines = ["[progress] {}/{} runs done, {} running, {:.1f} steps/s, elapsed {}, ETA {}".format(
+            len(self.done), self.total_runs, len(self.workers), rate, format_duration(elapsed),
+            format_duration(eta))]
+        for worker, record in sorted(self.workers.items(), key=lambda item: str(item[0])):
+            worker_rate = record.get("steps_per_second")
+            worker_eta = None
+            if worker_rate:
+                worker_eta = (self.steps_per_run - record["step"]) / worker_rate
+            lines.append("    {}: step {}/{}, {} steps/s, ETA {}, price {:.2f}".format(
+                worker, record["step"], self.steps_per_run,
+                "{:.1f}".format(worker_rate) if worker_rate else "-", format_duration(worker_eta), record["price"]))
+        return "\n".join(lines)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        # Drain what is left and print the final view
+        while True:
+            try:
+                self.update(self.progress_queue.get_nowait())
+            except queue.Empty:
+                break
+        self.stream.write(self.render() + "\n")
+        self.stream.flush()
@@ -0,0 +1,126 @@
+import numpy as np
+
+COMPRESSION = 300
+TAIL_PROBABILITIES = [0.001, 0.01, 0.05, 0.5, 0.95, 0.99, 0.999]
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch of a stream of values (merging t-digest, Dunning & Ertl).
+    Values are summarised by at most about compression / 2 weighted centroids. The arcsine scale function
+    keeps centroids small near the tails, so extreme quantiles (e.g. 0.1% / 99.9%) have a small relative
+    error while memory stays bounded, however many values are added.
+    Digests of replicates and workers are combined with merge(), the minimum and maximum are exact.
+    """
+
+    def __init__(self, compression=COMPRESSION, buffer_size=None):
+        self.compression = compression
+        self.buffer_size = 10 * compression if buffer_size is None else buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer_means = []
+        self.buffer_weights = []
+        self.n_buffered = 0
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values, weights=None):
+        """
+        Adds an array of values (NaNs are ignored), optionally weighted.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float).ravel()
+        finite = ~np.isnan(values)
+        values, weights = values[finite], weights[finite]
+        if len(values) == 0:
+            return
+        self.buffer_means.append(values)
+        self.buffer_weights.append(weights)
+        self.n_buffered += len(values)
+        self.count += weights.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        if self.n_buffered >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Adds the values summarised by another digest.
+        """
+        other._compress()
+        if other.count == 0:
+            return
+        count, minimum, maximum = self.count, min(self.min, other.min), max(self.max, other.max)
+        self.update(other.means, other.weights)
+        self.count, self.min, self.max = count + other.count, minimum, maximum
+
+    def _compress(self):
+        if self.n_buffered == 0:
+            return
+        means = np.concatenate([self.means] + self.buffer_means)
+        weights = np.concatenate([self.weights] + self.buffer_weights)
+        self.buffer_means, self.buffer_weights, self.n_buffered = [], [], 0
+
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Centroids whose quantile midpoints fall within the same unit of the scale function
+        # k(q) = compression / (2 pi) * asin(2q - 1) are merged
+        q = (np.cumsum(weights) - weights / 2.0) / total
+        k = self.compression / (2.0 * np.pi) * np.arcsin(np.clip(2.0 * q - 1.0, -1.0, 1.0))
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def _centers(self):
+        self._compress()
+        # Cumulative weight at the middle of every centroid, anchored at the exact extremes
+        centers = np.cumsum(self.weights) - self.weights / 2.0
+        return np.r_[0.0, centers, self.count], np.r_[self.min, self.means, self.max]
+
+    def quantile(self, q):
+        """
+        Returns the estimated quantile(s) at probability q (a scalar or an array).
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        centers, means = self._centers()
+        return np.interp(np.asarray(q, dtype=float) * self.count, centers, means)
+
+    def cdf(self, x):
+        """
+        Returns the estimated fraction of values below x (a scalar or an array).
+        """
+        if self.count == 0:
+            return np.full(np.shape(x), np.nan) if np.ndim(x) else np.nan
+        centers, means = self._centers()
+        return np.interp(x, means, centers) / self.count
+
+    def get_histogram(self, bins=100, range=None):
+        """
+        Returns the estimated counts and the bin edges, as np.histogram.
+        """
+        if np.ndim(bins) == 0:
+            low, high = (self.min, self.max) if range is None else range
+            bins = np.linspace(low, high, bins + 1)
+        edges = np.asarray(bins, dtype=float)
+        return np.diff(self.cdf(edges)) * self.count, edges
+
+    def __len__(self):
+        self._compress()
+        return len(self.means)
+
+
+def get_digest(all_values, compression=COMPRESSION):
+    """
+    Returns the merged digest of several series (e.g. the returns of all replicates), one digest per series.
+    """
+    digest = TDigest(compression)
+    for values in all_values:
+        replicate_digest = TDigest(compression)
+        replicate_digest.update(values)
+        digest.merge(replicate_digest)
+    return digest
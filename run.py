@@ -1,3 +1,11 @@
-from server import server
+import sys
+from server import server, background_server, get_playback_server
 
-server.launch()
\ No newline at end of file
+# python run.py --background: simulation decoupled from the browser frame rate
+# python run.py --playback: replay of the recorded runs in Data/Experiment*
+if "--playback" in sys.argv:
+    get_playback_server().launch()
+elif "--background" in sys.argv:
+    background_server.launch()
+else:
+    server.launch()
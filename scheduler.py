@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import numpy as np
+from mesa.time import BaseScheduler
+
+
+class EventActivation(BaseScheduler):
+    """
+    Event-driven activation: a priority queue of agent wake-up times replaces waking every agent every step.
+
+    After acting, an agent returns its next wake-up time from next_wakeup(time), or None to sleep until a price
+    watcher registered with watch(agent, low, high) wakes it when the price leaves [low, high]. Watchers of all
+    agents are checked at once on arrays. Wake-up times may be fractional: a step is split into intraday_batches
+    arrival batches, and the market maker reprices on the orders of each batch before the next one arrives.
+
+    Agents act at most once per step, so arrivals at rates above one per step are not supported. Agents that
+    do not act are not touched: the trader histories catch up on the skipped steps in O(1) when the trader wakes
+    or is read (Trader.catch_up), and moving averages are shared series of the market maker. The cost of a step
+    therefore scales with the number of events instead of the number of agents.
+    """
+
+    def __init__(self, model, intraday_batches=1):
+        super().__init__(model)
+        self.intraday_batches = intraday_batches
+        self.events = []
+        self.sequence = itertools.count()
+        self.next_wakeups = {}
+
+        # Price watchers, one slot per agent, an inactive slot watches (-inf, inf)
+        self.watcher_slots = {}
+        self.watcher_agents = []
+        self.watch_low = np.empty(0)
+        self.watch_high = np.empty(0)
+
+        self.n_events = 0
+
+    def add(self, agent):
+        super().add(agent)
+        self.wake(agent, self.time)
+
+    def remove(self, agent):
+        super().remove(agent)
+        self.next_wakeups.pop(agent.unique_id, None)
+        self.unwatch(agent)
+
+    def wake(self, agent, time):
+        """
+        Schedules the agent at the given time, unless it is already scheduled earlier.
+        """
+        if time < self.next_wakeups.get(agent.unique_id, float("inf")):
+            self.next_wakeups[agent.unique_id] = time
+            heapq.heappush(self.events, (time, next(self.sequence), agent.unique_id))
+
+    def watch(self, agent, low, high):
+        """
+        Wakes the agent as soon as the price leaves [low, high].
+        """
+        slot = self.watcher_slots.get(agent.unique_id)
+        if slot is None:
+            slot = len(self.watcher_agents)
+            self.watcher_slots[agent.unique_id] = slot
+            self.watcher_agents.append(agent)
+            self.watch_low = np.append(self.watch_low, -np.inf)
+            self.watch_high = np.append(self.watch_high, np.inf)
+        self.watch_low[slot] = low
+        self.watch_high[slot] = high
+
+    def unwatch(self, agent):
+        slot = self.watcher_slots.get(agent.unique_id)
+        if slot is not None:
+            self.watch_low[slot] = -np.inf
+            self.watch_high[slot] = np.inf
+
+    def _check_watchers(self, price, time):
+        if len(self.watcher_agents) == 0:
+            return
+        for slot in np.nonzero((price < self.watch_low) | (price > self.watch_high))[0]:
+            agent = self.watcher_agents[slot]
+            self.unwatch(agent)
+            self.wake(agent, time)
+
+    def _pop_batch(self, batch_end):
+        """
+        Returns the agents scheduled before batch_end in time order, simultaneous ones in random order.
+        """
+        batch = []
+        while self.events and self.events[0][0] < batch_end:
+            time, _, unique_id = heapq.heappop(self.events)
+            # Entries superseded by an earlier wake-up are stale
+            if self.next_wakeups.get(unique_id) != time or unique_id not in self._agents:
+                continue
+            del self.next_wakeups[unique_id]
+            batch.append((time, self.model.random.random(), unique_id))
+        return [(time, self._agents[unique_id]) for time, _, unique_id in sorted(batch)]
+
+    def step(self):
+        step = self.time
+        market_maker = self.model.market_maker
+        self._check_watchers(market_maker.get_current_price(), step)
+
+        acted = set()
+        for batch_index in range(self.intraday_batches):
+            batch_end = step + (batch_index + 1.0) / self.intraday_batches
+            for time, agent in self._pop_batch(batch_end):
+                if agent.unique_id in acted:
+                    # Woken again by a watcher within the step, acts in the next one
+                    self.wake(agent, step + 1)
+                    continue
+                agent.step()
+                acted.add(agent.unique_id)
+                self.n_events += 1
+                next_wakeup = agent.next_wakeup(time)
+                if next_wakeup is not None:
+                    self.wake(agent, max(next_wakeup, step + 1))
+
+            if batch_index < self.intraday_batches - 1:
+                market_maker.reprice_intraday()
+                self._check_watchers(market_maker.get_current_price(), batch_end)
+
+        self.steps += 1
+        self.time += 1
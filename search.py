@@ -0,0 +1,232 @@
+# Successive-halving (Hyperband) search over market configurations: many candidates are screened at low
+# fidelity (fewer steps, traders and replicates) and only the best fraction is promoted to higher fidelity,
+# with the SMM distance to the target stylized facts as score
+from model import make_model_class, split_parameters
+from cache import ResultCache, make_model_key, put_model_record
+from calibration import SMMCalibrator, SMM_COLLECTION, get_moments, get_moments_key
+import pandas as pd
+import multiprocessing
+import pickle
+import json
+import math
+import time
+import os
+
+dir_search = os.path.join('.', 'Data', 'Search')
+dir_snapshots = os.path.join(dir_search, 'snapshots')
+
+# Fidelity levels, from screening to full fidelity (as main.py). Runs of a level with the traders of the next
+# level are continued from their snapshots there instead of being simulated again from the start
+FIDELITY_LEVELS = [
+    {"max_steps": 500, "n_traders": 100, "n_replicates": 3},
+    {"max_steps": 765, "n_traders": 400, "n_replicates": 5},
+    {"max_steps": 1530, "n_traders": 400, "n_replicates": 10},
+]
+ETA = 3
+TRADER_PARAMS = ["initial_fundamentalist", "initial_technical", "initial_mimetic", "initial_noise"]
+
+
+def get_level_params(base_params, n_traders):
+    """
+    Returns the constructor arguments of a fidelity level: the trader numbers of base_params scaled to n_traders.
+    """
+    counts = [base_params.get(name, 25) for name in TRADER_PARAMS]
+    scale = n_traders / float(sum(counts))
+    return dict(base_params, **{name: int(round(count * scale)) for name, count in zip(TRADER_PARAMS, counts)})
+
+
+def get_snapshot_file(snapshot_dir, model_cls, model_params, seed):
+    # The same run at any horizon
+    return os.path.join(snapshot_dir, make_model_key(model_cls, model_params, seed, None) + ".pkl")
+
+
+def run_with_snapshot(model_cls, model_params, seed, max_steps, cache, snapshot_dir=None, save_snapshot=True):
+    """
+    Returns the record of a run of max_steps, from the result cache, or continued from the latest snapshot of
+    the same run in snapshot_dir (a pickled model, bit-identical to running from the start), or simulated from
+    the start. With save_snapshot the model is snapshotted at max_steps, to be continued later.
+    """
+    key = make_model_key(model_cls, model_params, seed, max_steps)
+    record = cache.get_record(key)
+    if record is not None:
+        return record
+
+    model = None
+    snapshot_file = None
+    if snapshot_dir is not None:
+        snapshot_file = get_snapshot_file(snapshot_dir, model_cls, model_params, seed)
+        try:
+            with open(snapshot_file, "rb") as file:
+                model = pickle.load(file)
+            if model.schedule.steps > max_steps:
+                # A later snapshot is kept for the runs that continue it
+                model = None
+                save_snapshot = False
+        except (OSError, EOFError, pickle.UnpicklingError):
+            model = None
+    if model is None:
+        model = model_cls(seed=seed, **model_params)
+
+    while model.running and model.schedule.steps < max_steps:
+        model.step()
+
+    if snapshot_file is not None and save_snapshot:
+        # Written under a temporary name, a snapshot file is always complete
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with open(snapshot_file + ".tmp", "wb") as file:
+            pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(snapshot_file + ".tmp", snapshot_file)
+
+    record = model.datacollector.get_model_vars_dataframe()
+    put_model_record(cache, key, record, model_cls, model_params, seed, max_steps)
+    return record
+
+
+def evaluate_fidelity(task):
+    """
+    Returns the moments of one (candidate, seed) run at a fidelity level, cached as the SMM calibration's.
+    """
+    parameters, base_params, seed, level, snapshot_dir, save_snapshot = task
+    constants, model_params = split_parameters(parameters)
+    model_cls = make_model_class(constants)
+    model_params = dict(dict(get_level_params(base_params, level["n_traders"]), verbose=False,
+                             collection=SMM_COLLECTION), **model_params)
+
+    cache = ResultCache()
+    key = get_moments_key(model_cls, model_params, seed, level["max_steps"])
+    moments = cache.get_facts(key)
+    if moments is None:
+        record = run_with_snapshot(model_cls, model_params, seed, level["max_steps"], cache, snapshot_dir,
+                                   save_snapshot)
+        moments = get_moments(record)
+        cache.put(key, facts=moments, meta={"kind": "smm_moments", "parameters": parameters, "seed": seed,
+                                            "base_params": get_level_params(base_params, level["n_traders"]),
+                                            "max_steps": level["max_steps"]})
+    return moments
+
+
+class SuccessiveHalving:
+    """
+    Hyperband over the fidelity levels: every bracket samples candidates (Latin hypercube of the calibrator's
+    parameter space), evaluates them at its first level and promotes the best 1/eta of them to the next level,
+    up to full fidelity. Brackets start at successively higher levels with fewer candidates, so that
+    configurations whose low-fidelity facts mislead are still found.
+    Replicate seeds are shared by all candidates (common random numbers) and are the first seeds of the next
+    level, whose runs continue from the snapshots when the number of traders does not change.
+    """
+
+    def __init__(self, calibrator=None, levels=None, eta=ETA, snapshot_dir=dir_snapshots, output_dir=dir_search):
+        self.calibrator = SMMCalibrator() if calibrator is None else calibrator
+        self.levels = FIDELITY_LEVELS if levels is None else levels
+        self.eta = eta
+        self.snapshot_dir = snapshot_dir
+        self.output_dir = output_dir
+        self.evaluations = []
+
+    def _continues(self, level_index):
+        # Snapshots are only worth keeping if the next level continues the same runs
+        return level_index + 1 < len(self.levels) and \
+            self.levels[level_index + 1]["n_traders"] == self.levels[level_index]["n_traders"]
+
+    def evaluate(self, candidates, level_index, pool=None, bracket=0):
+        level = self.levels[level_index]
+        seeds = range(self.calibrator.seeds[0], self.calibrator.seeds[0] + level["n_replicates"])
+        # Runs continue the snapshots of the previous level, and are snapshotted for the next one
+        continued = level_index > 0 and self._continues(level_index - 1)
+        snapshot_dir = self.snapshot_dir if continued or self._continues(level_index) else None
+        tasks = [(candidate, self.calibrator.base_params, seed, level, snapshot_dir, self._continues(level_index))
+                 for candidate in candidates for seed in seeds]
+        all_moments = pool.map(evaluate_fidelity, tasks) if pool is not None else list(map(evaluate_fidelity, tasks))
+
+        results = []
+        for i, candidate in enumerate(candidates):
+            replicate_moments = all_moments[i * level["n_replicates"]:(i + 1) * level["n_replicates"]]
+            distance, means = self.calibrator.get_distance(replicate_moments)
+            result = dict(candidate, distance=distance, bracket=bracket, level=level_index, **level,
+                          **{"fact_" + name: value for name, value in means.items()})
+            results.append(result)
+            self.evaluations.append(result)
+        return results
+
+    def remove_snapshots(self, candidates, level_index):
+        level = self.levels[level_index]
+        n_replicates = max(level["n_replicates"] for level in self.levels)
+        for candidate in candidates:
+            constants, model_params = split_parameters(candidate)
+            model_cls = make_model_class(constants)
+            model_params = dict(dict(get_level_params(self.calibrator.base_params, level["n_traders"]), verbose=False,
+                                     collection=SMM_COLLECTION), **model_params)
+            for seed in range(self.calibrator.seeds[0], self.calibrator.seeds[0] + n_replicates):
+                snapshot_file = get_snapshot_file(self.snapshot_dir, model_cls, model_params, seed)
+                if os.path.exists(snapshot_file):
+                    os.remove(snapshot_file)
+
+    def successive_halving(self, candidates, first_level, pool=None, bracket=0):
+        """
+        Evaluates the candidates from the first level on, promoting the best 1/eta at every level.
+        Returns the results at the last level.
+        """
+        for level_index in range(first_level, len(self.levels)):
+            start_time = time.time()
+            results = self.evaluate(candidates, level_index, pool, bracket)
+            results = sorted(results, key=lambda result: result["distance"])
+            print("Bracket {}, level {}: {} candidates, best distance {:.4f}, {:.0f}s".format(
+                bracket, level_index, len(candidates), results[0]["distance"], time.time() - start_time))
+            if not self._continues(level_index):
+                # No later level continues these runs
+                self.remove_snapshots(candidates, level_index)
+            if level_index + 1 == len(self.levels):
+                break
+            n_promoted = max(1, len(candidates) // self.eta)
+            candidates = [{name: result[name] for name in self.calibrator.parameter_space} for result in results]
+            if self._continues(level_index):
+                self.remove_snapshots(candidates[n_promoted:], level_index)
+            candidates = candidates[:n_promoted]
+        return results
+
+    def run(self, n_brackets=None):
+        """
+        Runs the Hyperband brackets (all of them by default, from the lowest first level) and returns the best
+        candidate at full fidelity. Every evaluation is written to evaluations.csv in the output directory.
+        """
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        s_max = len(self.levels) - 1
+        brackets = list(range(s_max, -1, -1))[:n_brackets]
+        bounds = {name: (low, high) for name, (low, high, _) in self.calibrator.parameter_space.items()}
+        best = None
+        with multiprocessing.Pool(self.calibrator.processes) as pool:
+            # The same weights at every level, from the pilot point at the calibrator's fidelity
+            self.calibrator.estimate_weights(pool)
+            for bracket, s in enumerate(brackets):
+                n_candidates = int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s))
+                candidates = self.calibrator.sample_candidates(n_candidates, bounds)
+                results = self.successive_halving(candidates, s_max - s, pool, bracket)
+                if best is None or results[0]["distance"] < best["distance"]:
+                    best = results[0]
+                pd.DataFrame(self.evaluations).to_csv(os.path.join(self.output_dir, "evaluations.csv"), index=False)
+
+        with open(os.path.join(self.output_dir, "best.json"), "w") as file:
+            json.dump(best, file, indent=4, sort_keys=True, default=float)
+        return best
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+
+    base_params = dict(
+        initial_fundamentalist=100,
+        initial_technical=100,
+        initial_mimetic=100,
+        initial_noise=100,
+        network_type="small world",
+    )
+    search = SuccessiveHalving(SMMCalibrator(base_params=base_params, n_replicates=10))
+    best = search.run()
+    print("Best candidate:", best)
+
+    print("Completed!")
+    end_time = time.time()
+    duration = end_time - start_time
+    print("Processing time: {}".format(duration))
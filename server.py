@@ -1,7 +1,6 @@
 from mesa.visualization.ModularVisualization import ModularServer
 from mesa.visualization.UserParam import UserSettableParameter
 from mesa.visualization.modules import ChartModule
-from mesa.visualization.modules import NetworkModule
 
 
 from fundamentalist import Fundamentalist
@@ -12,6 +11,9 @@ from noise import Noise
 
 
 from model import HeterogeneityInArtificialMarket
+from networkmodule import DeltaNetworkModule
+from backgroundserver import BackgroundModularServer
+from playback import PlaybackServer, PlaybackChartModule, PanelSummaryElement
 
 TRADER_COLOR = {
     "FUNDAMENTALIST": "#0000FF",    # Blue
@@ -30,34 +32,16 @@ def get_agent_type(agent):
     elif isinstance(agent, Noise):
         return "NOISE"
 
-def network_portrayal(G):
-    # The model ensures there is always 1 agent per node
-
-    def node_color(agent):
-        return TRADER_COLOR[get_agent_type(agent)]
-
-    portrayal = dict()
-    nodes = list()
-    for (_, agents) in G.nodes.data("agent"):
-        node = dict()
-        node["size"] = 6
-        node["color"] = node_color(agents[0])
-        node["tooltip"]= "id: {}<br>type: {}".format(
-            agents[0].unique_id, get_agent_type(agents[0]))
-        nodes.append(node)
-    portrayal["nodes"] = nodes
-
-    portrayal["edges"] = [
-        {
-            "source": source,
-            "target": target,
-            "color": "#e8e8e8",
-            "width": 3,
-        }
-        for (source, target) in G.edges
-    ]
+def node_tooltip(agent):
+    """Static part of a node portrayal, sent once with the topology"""
+    return "id: {}<br>type: {}".format(agent.unique_id, get_agent_type(agent))
+
 
-    return portrayal
+def node_state(agent):
+    """Dynamic part of a node portrayal: colour by trader type, size by wealth relative to initial cash"""
+    wealth_ratio = agent.net_wealth[-1] / agent.initial_cash
+    size = 6 * min(max(wealth_ratio, 0.5), 2.0)
+    return {"size": round(size), "color": TRADER_COLOR[get_agent_type(agent)]}
 
 
 # dictionary of user settable parameters - these map to the model __init__ parameters
@@ -79,7 +63,7 @@ model_params = {
     ),
 }
 
-network = NetworkModule(network_portrayal, 500, 500, library="d3")
+network = DeltaNetworkModule(node_tooltip, node_state, 500, 500, fps=10)
 
 chart_element = ChartModule(
     [
@@ -97,4 +81,30 @@ server = ModularServer(
     model_params=model_params,
 )
 
-server.port = 8521
\ No newline at end of file
+server.port = 8521
+
+# Same visualisation with the model running ahead in a background worker
+background_server = BackgroundModularServer(
+    model_cls=HeterogeneityInArtificialMarket,
+    visualization_elements=[network, chart_element],
+    name="Artificial Market",
+    model_params=model_params,
+)
+
+background_server.port = 8521
+
+
+# Replay of the recorded runs in Data/Experiment*, nothing is simulated
+def get_playback_server():
+    playback_elements = [
+        PanelSummaryElement(),
+        PlaybackChartModule([{"Label": "price", "Color": '#FF0000'}, {"Label": "value", "Color": '#00FF00'}]),
+        PlaybackChartModule([{"Label": "order_all_sum", "Color": '#0000FF'}]),
+        PlaybackChartModule([{"Label": "wealth_ftrader_sum", "Color": TRADER_COLOR["FUNDAMENTALIST"]},
+                             {"Label": "wealth_ttrader_sum", "Color": TRADER_COLOR["TECHNICAL"]},
+                             {"Label": "wealth_mtrader_sum", "Color": TRADER_COLOR["MIMETIC"]},
+                             {"Label": "wealth_ntrader_sum", "Color": TRADER_COLOR["NOISE"]}]),
+    ]
+    playback_server = PlaybackServer(playback_elements, name="Artificial Market playback")
+    playback_server.port = 8521
+    return playback_server
@@ -0,0 +1,101 @@
+import json
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+
+def get_record_columns(model_cls, model_params):
+    """
+    Returns the collected columns of a model configuration, in record order.
+    """
+    model = model_cls(**dict(model_params, verbose=False))
+    return list(model.datacollector.model_reporters)
+
+
+class SharedRecords:
+    """
+    A (replicates x steps x columns) float64 array of collected records in shared memory.
+    The parent creates it, pool workers attach to it by name and write the rows of their replicate in place,
+    so no record is pickled or turned into a dataframe on its way to the parent.
+    Rows that were never written are NaN.
+    """
+
+    def __init__(self, n_replicates, n_steps, columns, name=None):
+        self.shape = (n_replicates, n_steps, len(columns))
+        self.columns = list(columns)
+        self.owner = name is None
+        if self.owner:
+            size = int(np.prod(self.shape)) * np.dtype(np.float64).itemsize
+            self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)
+        if self.owner:
+            self.array.fill(np.nan)
+
+    def get_spec(self):
+        """
+        What a worker needs to attach: SharedRecords(*spec).
+        """
+        return self.shape[0], self.shape[1], self.columns, self.memory.name
+
+    def writer(self, replicate):
+        return SharedRecordWriter(self, replicate)
+
+    def to_frame(self, replicate):
+        frame = pd.DataFrame(self.array[replicate], columns=self.columns)
+        return frame.dropna(how="all")
+
+    def get_statistics(self, column):
+        """
+        Per-step mean, standard deviation, minimum and maximum of a column across replicates.
+        """
+        values = self.array[:, :, self.columns.index(column)]
+        return pd.DataFrame({"mean": np.nanmean(values, axis=0), "std": np.nanstd(values, axis=0),
+                             "min": np.nanmin(values, axis=0), "max": np.nanmax(values, axis=0)})
+
+    def save(self, file_name):
+        """
+        Saves all records into one .npy file, with the columns in a JSON sidecar (file_name + ".json").
+        """
+        np.save(file_name, self.array)
+        with open(file_name + ".json", "w") as file:
+            json.dump({"columns": self.columns, "shape": self.shape}, file, indent=4)
+
+    def close(self):
+        del self.array
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedRecordWriter:
+    """
+    Observer of a model run writing the row the DataCollector collected in a step into the shared records.
+    """
+
+    def __init__(self, shared_records, replicate):
+        self.rows = shared_records.array[replicate]
+        self.columns = shared_records.columns
+        self.n_rows = 0
+
+    def __call__(self, model):
+        if self.n_rows >= len(self.rows):
+            return
+        model_vars = model.datacollector.model_vars
+        # Steps between collections (collection_interval) add no row
+        if len(model_vars[self.columns[0]]) <= self.n_rows:
+            return
+        row = self.rows[self.n_rows]
+        for j, column in enumerate(self.columns):
+            row[j] = model_vars[column][-1]
+        self.n_rows += 1
+
+
+def load_records(file_name):
+    """
+    Returns the saved (replicates x steps x columns) records as a read-only memory map, and the columns.
+    """
+    with open(file_name + ".json", "r") as file:
+        meta = json.load(file)
+    return np.load(file_name, mmap_mode="r"), meta["columns"]
@@ -0,0 +1,61 @@
+import random
+import zlib
+import numpy as np
+
+# Purposes that draw random numbers in a model run, each with its own independent substream
+STREAM_NAMES = [
+    "ids",                          # assignment of unique ids to trader types
+    "network",                      # trader network generation
+    "schedule",                     # random activation order of the traders
+    "value",                        # fundamental value process
+    "price",                        # price formation noise
+    "clusters",                     # noise trader clusters and their coordinated behaviour
+    "herding",                      # noise trader participation in herding
+    "noise_orders",                 # noise trader order direction and size
+    "arrivals",                     # noise trader arrival times (event-driven schedule)
+    "mimetic",                      # mimetic choice of the trader to imitate
+    "parameters_fundamentalist",    # per-type parameter draws at creation
+    "parameters_technical",
+    "parameters_mimetic",
+    "parameters_noise",
+]
+
+
+class RandomStreams:
+    """
+    Named, independent random substreams derived from one root seed.
+    A stream depends only on the root seed and its name, never on the order in which streams are requested or
+    on how many numbers other streams have drawn. Two runs with the same root seed therefore share every stream
+    that both use (common random numbers), e.g. the same value process under different trader parameters,
+    and a run is bit-reproducible in any process.
+    """
+
+    def __init__(self, seed=None):
+        self.root = np.random.SeedSequence(seed)
+        self.seed = seed
+        self.generators = {}
+        self.python_randoms = {}
+
+    def _seed_sequence(self, name, kind):
+        if name not in STREAM_NAMES:
+            raise ValueError("Unknown random stream: {}".format(name))
+        # A stable (not salted like hash()) key of the name identifies the substream
+        return np.random.SeedSequence(self.root.entropy, spawn_key=(zlib.crc32(name.encode()), kind))
+
+    def get(self, name):
+        """
+        Returns the numpy Generator of the named stream.
+        """
+        if name not in self.generators:
+            self.generators[name] = np.random.default_rng(self._seed_sequence(name, 0))
+        return self.generators[name]
+
+    def python_random(self, name):
+        """
+        Returns a random.Random of the named stream, for consumers using the standard library API
+        (shuffle, sample, networkx and mesa).
+        """
+        if name not in self.python_randoms:
+            state = self._seed_sequence(name, 1).generate_state(2, np.uint64)
+            self.python_randoms[name] = random.Random(int(state[0]) << 64 | int(state[1]))
+        return self.python_randoms[name]
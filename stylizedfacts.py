@@ -8,6 +8,10 @@ import os
 import pandas as pd
 import numpy as np
 import market
+from hurstexponent import hurst_variance
+from bootstrap import get_confidence_intervals
+from quantilesketch import get_digest, TAIL_PROBABILITIES
+from cache import ResultCache, make_key, get_files_digest, get_code_version, read_record
 
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -19,8 +23,10 @@ import scipy.stats as stats
 
 import json
 
-def get_stylized_facts(show=True):
+def get_stylized_facts(show=True, cache=None, n_bootstrap=2000, confidence=0.95, seed=0):
     stylized_facts = {}
+    # Per-replicate values of every fact, for the confidence intervals
+    replicate_facts = {}
     file_list = []
     dirname = os.path.dirname
     for file in os.listdir(dirname(dir)):
@@ -30,9 +36,23 @@ def get_stylized_facts(show=True):
     if len(file_list) == 0:
         return []
 
+    # Facts are addressed by the content of the records and the version of this analysis
+    cache_key = None
+    if cache is not None:
+        cache_key = make_key(kind="stylized_facts", digest=get_files_digest(file_list),
+                             code_version=get_code_version(['stylizedfacts.py', 'hurstexponent.py', 'bootstrap.py', 'quantilesketch.py']),
+                             n_bootstrap=n_bootstrap, confidence=confidence, seed=seed)
+        # The figures are cached as the numbers they plot and drawn again
+        cached = cache.get_facts(cache_key)
+        if cached is not None:
+            print("Stylized facts loaded from cache")
+            draw_figures(cached["figures"], show)
+            return cached["facts"]
+    figures = {}
+
     df_list = []
     for file in file_list:
-        _df = pd.read_csv(file, header=0)
+        _df = read_record(file, cache)
         _df_position = _df[["price", "order_all_sum"]]
         df_list.append(_df_position)
 
@@ -45,85 +65,74 @@ def get_stylized_facts(show=True):
     # Returns Autocorrelation
     returns_autocorr = get_returns_autocorrelation(all_returns, lags=35)
     returns_autocorr = pd.DataFrame(returns_autocorr)
-    visualise_autocorrelations(returns_autocorr, "Returns Autocorrelation", show)
+    figures["Returns Autocorrelation"] = get_autocorrelation_band(returns_autocorr)
 
     avg_returns_autocorr = returns_autocorr.mean(axis=1)
     returns_autocorr_mean = np.mean(avg_returns_autocorr[1:])
     stylized_facts["Returns Autocorrelation mean"] = returns_autocorr_mean
+    replicate_facts["Returns Autocorrelation mean"] = returns_autocorr[1:].mean(axis=0)
     print("Returns Autocorrelation mean: ", returns_autocorr_mean)
 
     # Volatility clustering (Absolute returns autocorrelation)
     absolute_returns = [returns.abs() for returns in all_returns]
     absolute_returns_autocorr = get_returns_autocorrelation(absolute_returns, lags=35)
     absolute_returns_autocorr = pd.DataFrame(absolute_returns_autocorr)
-    visualise_autocorrelations(absolute_returns_autocorr, "Absolute Returns Autocorrelation", show)
+    figures["Absolute Returns Autocorrelation"] = get_autocorrelation_band(absolute_returns_autocorr)
 
     avg_abs_returns_autocorr = absolute_returns_autocorr.mean(axis=1)
     abs_returns_autocorr_mean = np.mean(avg_abs_returns_autocorr[1:])
     stylized_facts["Absolute Returns Autocorrelation mean"] = abs_returns_autocorr_mean
+    replicate_facts["Absolute Returns Autocorrelation mean"] = absolute_returns_autocorr[1:].mean(axis=0)
     print("Returns Autocorrelation mean: ", abs_returns_autocorr_mean)
 
     # Long term memory for Return Autocorrelations
     hurst_returns_autocorr = get_hurst_exponent(all_returns, lag_1=2, lag_2=20)
     avg_hurst_returns_autocorr = np.mean(hurst_returns_autocorr)
     stylized_facts["Long term memory for Return Autocorrelations (hurst)"] = avg_hurst_returns_autocorr
+    replicate_facts["Long term memory for Return Autocorrelations (hurst)"] = hurst_returns_autocorr
     print('Long term memory for Return Autocorrelations (hurst):', avg_hurst_returns_autocorr)
 
     # Long term memory for Volatility clustering (Absolute returns autocorrelation)
     hurst_abs_returns_autocorr = get_hurst_exponent(absolute_returns, lag_1=2, lag_2=20)
     avg_hurst_abs_returns_autocorr = np.mean(hurst_abs_returns_autocorr)
     stylized_facts["Long term memory for Volatility clustering (hurst)"] = avg_hurst_abs_returns_autocorr
+    replicate_facts["Long term memory for Volatility clustering (hurst)"] = hurst_abs_returns_autocorr
     print('Long term memory for Volatility clustering (hurst):', avg_hurst_abs_returns_autocorr)
 
     # Correlation between volume and volatility
     correlations = get_volume_volatility_correlation(all_orders, all_returns)
     avg_correlations = np.mean(correlations)
     stylized_facts["Average correlation between volume and volatility"] = avg_correlations
+    replicate_facts["Average correlation between volume and volatility"] = correlations
     print('Average correlation between volume and volatility:', avg_correlations)
-
-    plt.figure(figsize=(10.0, 6.0))
-    # fig.tight_layout(pad=3.0)
-    # ax1.plot(range(len(correlations)), correlations, 'k-')
-    plt.boxplot(correlations)
-    # plt.xlabel("Iterations", fontsize=20)
-    plt.ylabel("Correlation between volume and volatility", fontsize=20)
-    plt.title("Correlation between volume and volatility", fontsize=25)
-    plt.yticks(fontsize=16)
-    plt.xticks(fontsize=16)
-    # plt.ylim(-1, 1)
-    plt.savefig(os.path.join(dir, "Correlation between volume and volatility.png"))
-    if show:
-        plt.show()
+    figures["correlations"] = [float(correlation) for correlation in correlations]
 
     # Fat tails - Kurtosis
     kurtosis = get_kurtosis(all_returns)
     avg_kurtosis = np.mean(kurtosis)
     stylized_facts["Fat Tails (Average Kurtoris)"] = avg_kurtosis
+    replicate_facts["Fat Tails (Average Kurtoris)"] = kurtosis
     print('Average Kurtoris:', avg_kurtosis)
 
-    # Returns distribution histogram
-    plt.figure(figsize=(10.0, 6.0))
-    plt.hist(all_returns[0], bins="auto")
-    plt.xlabel("Returns", fontsize=20)
-    plt.ylabel("Frequency", fontsize=20)
-    plt.title("Returns distribution histogram", fontsize=25)
-    plt.yticks(fontsize=16)
-    plt.xticks(fontsize=16)
-    # plt.ylim(-1, 1)
-    plt.savefig(os.path.join(dir, "Returns distribution histogram.png"))
-    # if show:
-    plt.show()
+    # Pooled returns distribution of all replicates, from per-replicate quantile sketches merged together
+    returns_digest = get_digest(all_returns)
+    tail_quantiles = returns_digest.quantile(TAIL_PROBABILITIES)
+    stylized_facts["Returns quantiles"] = {str(q): float(value) for q, value in zip(TAIL_PROBABILITIES, tail_quantiles)}
+    print('Returns quantiles:', stylized_facts["Returns quantiles"])
 
+    counts, edges = returns_digest.get_histogram(bins=100)
+    figures["histogram"] = {"counts": np.asarray(counts).tolist(), "edges": np.asarray(edges).tolist()}
+    figures["qq"] = get_qq_points(returns_digest)
+    draw_figures(figures, show)
 
-    # Returns QQ plot
-    # sm.qqplot(all_returns[0], line ='45') 
-    # py.show()
-    stats.probplot(all_returns[0], dist="norm", plot=py)
-    time.sleep(1)
-    # if show:
-    py.show()
-    py.savefig(os.path.join(dir, "QQ plot.png"))
-    time.sleep(1)
+    # Bootstrap and jackknife confidence intervals of every fact across replicates
+    stylized_facts["confidence_intervals"] = {
+        name: get_confidence_intervals(values, n_bootstrap=n_bootstrap, confidence=confidence, seed=seed)
+        for name, values in replicate_facts.items()}
+
+    if cache_key is not None:
+        cache.put(cache_key, facts={"facts": stylized_facts, "figures": figures},
+                  meta={"kind": "stylized_facts", "files": file_list})
 
     return stylized_facts
 
@@ -141,25 +150,11 @@ def get_returns_autocorrelation(all_returns, lags):
 
 def get_hurst_exponent(all_returns, lag_1, lag_2):
     """
-    Calculates a measure of long memory with the hurst exponent.
-    This is an adaption from:
-    https://robotwealth.com/demystifying-the-hurst-exponent-part-1/
+    Calculates a measure of long memory with the hurst exponent (variance-of-lags method),
+    for all replicates at once.
     """
-    hurst_exponents = []
-    for returns in all_returns:
-        returns = list(returns)[1:]
-        # print("Returns:", returns)
-        # returns = returns.dropna() # Remove any missing values
-        # print("Returns dropped:", returns)
-        lags = range(lag_1, lag_2)
-        std_differences = [np.sqrt(np.std(np.subtract(returns[lag:], returns[:-lag]))) for lag in lags]
-        # print("std_differences: ", std_differences)
-        m = np.polyfit(np.log(lags), np.log(std_differences), 1)
-        # print("polyfit: ", m)
-        hurst = m[0]*2.0
-        # print("hurst: ", hurst)
-        hurst_exponents.append(hurst)
-    return hurst_exponents
+    returns_matrix = np.vstack([np.asarray(returns, dtype=float)[1:] for returns in all_returns])
+    return list(hurst_variance(returns_matrix, lags=range(lag_1, lag_2)))
 
 def get_volume_volatility_correlation(volumes, returns):
     correlations = []
@@ -182,15 +177,88 @@ def get_kurtosis(all_returns):
     # else:
     #     return False, np.inf
 
-def visualise_autocorrelations(returns_autocorr, title, show=True):
+def get_qq_points(digest, n_points=1000):
+    """
+    Points of the normal QQ plot of the values summarised by a quantile sketch, as stats.probplot,
+    with the fitted line.
+    """
+    n_points = int(min(n_points, digest.count))
+    # Filliben's plotting positions, as stats.probplot
+    positions = (np.arange(1, n_points + 1) - 0.3175) / (n_points + 0.365)
+    positions[0], positions[-1] = 1 - 0.5 ** (1.0 / n_points), 0.5 ** (1.0 / n_points)
+    theoretical_quantiles = stats.norm.ppf(positions)
+    ordered_values = digest.quantile(positions)
+    slope, intercept = np.polyfit(theoretical_quantiles, ordered_values, 1)
+    return {"theoretical": theoretical_quantiles.tolist(), "ordered": np.asarray(ordered_values).tolist(),
+            "slope": float(slope), "intercept": float(intercept)}
+
+def plot_qq(points):
+    theoretical_quantiles = np.asarray(points["theoretical"])
+    py.plot(theoretical_quantiles, points["ordered"], 'bo')
+    py.plot(theoretical_quantiles, points["slope"] * theoretical_quantiles + points["intercept"], 'r-')
+    py.title("Probability Plot")
+    py.xlabel("Theoretical quantiles")
+    py.ylabel("Ordered Values")
+
+def get_autocorrelation_band(returns_autocorr):
+    """
+    Mean and standard deviation across replicates of the autocorrelation at every lag.
+    """
+    return {"mean": returns_autocorr.mean(axis=1).tolist(), "std": returns_autocorr.std(axis=1).tolist()}
+
+def draw_figures(figures, show=True):
+    """
+    Draws and saves the figures of the stylized facts from their numbers (computed or cached).
+    """
+    for title in ["Returns Autocorrelation", "Absolute Returns Autocorrelation"]:
+        visualise_autocorrelations(figures[title], title, show)
+
+    plt.figure(figsize=(10.0, 6.0))
+    # fig.tight_layout(pad=3.0)
+    # ax1.plot(range(len(correlations)), correlations, 'k-')
+    plt.boxplot(figures["correlations"])
+    # plt.xlabel("Iterations", fontsize=20)
+    plt.ylabel("Correlation between volume and volatility", fontsize=20)
+    plt.title("Correlation between volume and volatility", fontsize=25)
+    plt.yticks(fontsize=16)
+    plt.xticks(fontsize=16)
+    # plt.ylim(-1, 1)
+    plt.savefig(os.path.join(dir, "Correlation between volume and volatility.png"))
+    if show:
+        plt.show()
+
+    # Returns distribution histogram
+    plt.figure(figsize=(10.0, 6.0))
+    plt.stairs(figures["histogram"]["counts"], figures["histogram"]["edges"], fill=True)
+    plt.xlabel("Returns", fontsize=20)
+    plt.ylabel("Frequency", fontsize=20)
+    plt.title("Returns distribution histogram", fontsize=25)
+    plt.yticks(fontsize=16)
+    plt.xticks(fontsize=16)
+    # plt.ylim(-1, 1)
+    plt.savefig(os.path.join(dir, "Returns distribution histogram.png"))
+    # if show:
+    plt.show()
+
+
+    # Returns QQ plot
+    # sm.qqplot(all_returns[0], line ='45') 
+    # py.show()
+    plot_qq(figures["qq"])
+    time.sleep(1)
+    # if show:
+    py.show()
+    py.savefig(os.path.join(dir, "QQ plot.png"))
+    time.sleep(1)
+
+def visualise_autocorrelations(band, title, show=True):
 
+    lags = np.arange(len(band["mean"]))
+    mean, std = np.asarray(band["mean"]), np.asarray(band["std"])
     fig, ax1 = plt.subplots(1, 1, figsize=(10.0, 5.0))
     # fig.tight_layout(pad=3.0)
-    ax1.plot(returns_autocorr.index, returns_autocorr.mean(axis=1), 'k-')
-    ax1.fill_between(returns_autocorr.index, 
-                 returns_autocorr.mean(axis=1) + returns_autocorr.std(axis=1), 
-                 returns_autocorr.mean(axis=1) - returns_autocorr.std(axis=1), 
-                 alpha=0.3, facecolor='black')
+    ax1.plot(lags, mean, 'k-')
+    ax1.fill_between(lags, mean + std, mean - std, alpha=0.3, facecolor='black')
     plt.xlabel("Lags", fontsize=20)
     plt.ylabel(title, fontsize=20)
     plt.title(title + " vs. Lags", fontsize=25)
@@ -214,7 +282,7 @@ if __name__ == '__main__':
             os.makedirs(dir)
         
         # Get stylized facts
-        stylized_facts = get_stylized_facts(show=False)
+        stylized_facts = get_stylized_facts(show=False, cache=ResultCache())
 
         # Save stylized facts into json file
         if len(stylized_facts) > 0:
@@ -1,5 +1,6 @@
 from trader import Trader
 import numpy as np
+import kernels
 from utils import draw_from_uniform
 
 
@@ -11,19 +12,24 @@ class Technical(Trader):
         """
         super().__init__(unique_id, model_reference)
 
-        self.short_window = int(draw_from_uniform(model_reference.SHORT_WINDOW_MIN, model_reference.SHORT_WINDOW_MAX))
-        self.long_window = int(draw_from_uniform(model_reference.LONG_WINDOW_MIN, model_reference.LONG_WINDOW_MAX))
-        self.exit_window = int(draw_from_uniform(model_reference.EXIT_WINDOW_MIN, model_reference.EXIT_WINDOW_MAX))
+        self.short_window = int(draw_from_uniform(model_reference.SHORT_WINDOW_MIN, model_reference.SHORT_WINDOW_MAX,
+                                                   self.parameter_stream))
+        self.long_window = int(draw_from_uniform(model_reference.LONG_WINDOW_MIN, model_reference.LONG_WINDOW_MAX,
+                                                  self.parameter_stream))
+        self.exit_window = int(draw_from_uniform(model_reference.EXIT_WINDOW_MIN, model_reference.EXIT_WINDOW_MAX,
+                                                  self.parameter_stream))
 
         self.normalization_constant = model_reference.TECHNICAL_NORM_FACTOR
 
-        # Short term moving average history.
-        self.short_MA = []
-        # Long term moving average history.
-        self.long_MA = []
+        # Relative price band within which a flat trader sleeps under an EventActivation schedule, None to act every step
+        self.price_band = model_reference.TECHNICAL_PRICE_BAND
+
+        # Moving averages of the last and the current step, the series are kept by the market maker
+        self.short_MA = (0.0, 0.0)
+        self.long_MA = (0.0, 0.0)
 
         # Difference in slope between the two moving averages.
-        self.slope_difference = []
+        self.slope_difference = 0.0
 
         self.current_price = 0.0
 
@@ -34,47 +40,26 @@ class Technical(Trader):
         self.current_price = self.market_maker.get_current_price()
 
         # Get moving averages.
-        self.short_MA.append(self._compute_moving_average(t, self.short_window))
-        self.long_MA.append(self._compute_moving_average(t, self.long_window))
+        self.short_MA = self._get_moving_averages(t, self.short_window)
+        self.long_MA = self._get_moving_averages(t, self.long_window)
 
         # Get moving averages slope difference.
-        self.slope_difference.append(self._compute_slope_difference(t))
-
-        # Check if the position has been liquidated.
-        if self.position[t-1] == 0:
-            # Open a position (change its value to positive or negative).
-            # Short term MA crosses long term MA from below. (price is going to increase)
-            if self.short_MA[t-1] < self.long_MA[t-1] and self.short_MA[t] >= self.long_MA[t]:
-                # Open a long position.
-                self.position.append(self.normalization_constant * abs(self.slope_difference[t]))
-            # Short term MA crosses long term MA from above. (price is going to decrease)
-            elif self.short_MA[t-1] > self.long_MA[t-1] and self.short_MA[t] <= self.long_MA[t]:
-                # Open a short position.
-                self.position.append(-1 * self.normalization_constant * abs(self.slope_difference[t]))
-            else:
-                self.position.append(0)     # maintain the position at zero.
-
-        elif self.position[t-1] > 0:
-            # Liquidation condition. (current price is the lowest in the last "window" days)
-            if self.current_price <= min(self._get_price_window(t, self.exit_window)):
-                self.position.append(0)     # liquidate long position.
-            else:
-                # If the liquidation condition is not satisfied update with long position.
-                if self.is_within_risk_tolerance():
-                    self.position.append(self.normalization_constant * abs(self.slope_difference[t]))
-                else:
-                    self.position.append(self.position[-1])
-
-        elif self.position[t-1] < 0:
-            # Liquidation condition. (current price is the highest in the last "window" days)
-            if self.current_price >= max(self._get_price_window(t, self.exit_window)):
-                self.position.append(0)     # liquidate short position.
-            else:
-                # If the liquidation condition is not satisfied update with short position.
-                if self.is_within_risk_tolerance():
-                    self.position.append(-1 * self.normalization_constant * abs(self.slope_difference[t]))
-                else:
-                    self.position.append(self.position[-1])
+        self.slope_difference = self._compute_slope_difference()
+
+        # Exit window extremes are only needed when a position is open.
+        exit_low = exit_high = self.current_price
+        if self.position[t-1] != 0:
+            exit_prices = self._get_price_window(t, self.exit_window)
+            exit_low = min(exit_prices)
+            exit_high = max(exit_prices)
+
+        # Open, hold, update or liquidate the position on moving average crossovers.
+        self.position.append(kernels.technical_position(self.position[t-1], self.position[-1],
+                                                        self.short_MA[0], self.long_MA[0],
+                                                        self.short_MA[1], self.long_MA[1],
+                                                        self.slope_difference, self.current_price,
+                                                        exit_low, exit_high, self.normalization_constant,
+                                                        self.is_within_risk_tolerance()))
 
         # Order > 0 : buy, Order = 0 : hold, Order < 0 : sell
         self.order.append(self.position[t] - self.position[t-1])
@@ -83,24 +68,33 @@ class Technical(Trader):
 
         self.update_agent_finances()
 
-    def _compute_moving_average(self, t, window):
+    def next_wakeup(self, time):
+        if self.price_band is None or self.position[-1] != 0:
+            return time + 1
+        # A flat trader sleeps until the price moves out of the band around the current price
+        self.model.schedule.watch(self, self.current_price * (1.0 - self.price_band),
+                                  self.current_price * (1.0 + self.price_band))
+        return None
+
+    def _get_moving_averages(self, t, window):
         """
-        Returns the moving average of past prices in the given window.
+        Returns the moving averages of past prices in the given window at the last step and at step t.
         """
-        return sum(self._get_price_window(t, window)) / window
+        return (self.market_maker.get_moving_average(max(t - 1, 0), window),
+                self.market_maker.get_moving_average(t, window))
 
     def _get_price_window(self, t, window):
         """
-        Returns list of past prices for the given window.
+        Returns a read-only view of the past prices in the given window.
         """
         if t >= (window - 1):
             return self.market_maker.get_prices(low_limit=(t - window + 1), high_limit=None)
         else:
             return self.market_maker.get_prices(low_limit=0, high_limit=None)
 
-    def _compute_slope_difference(self, t):
+    def _compute_slope_difference(self):
         """
         Returns the slope difference between
-        the short and long term MAs in a given time.
+        the short and long term MAs at the current step.
         """
-        return np.arctan(self.short_MA[t] - self.short_MA[t-1]) - np.arctan(self.long_MA[t] - self.long_MA[t-1])
+        return np.arctan(self.short_MA[1] - self.short_MA[0]) - np.arctan(self.long_MA[1] - self.long_MA[0])
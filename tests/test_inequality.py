@@ -0,0 +1,23 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inequality import LORENZ_POINTS, gini
+
+
+def test_partitioned_gini_is_within_bound_of_exact():
+    random_state = np.random.RandomState(0)
+    for n in [150, 400, 1000, 5000]:
+        values = random_state.lognormal(mean=0.0, sigma=1.0, size=n)
+        exact = gini(values, n_quantiles=None)
+        # The default population of 400 takes the partitioned path
+        approximate = gini(values)
+        assert exact - 1.0 / LORENZ_POINTS <= approximate <= exact + 1e-12
+
+
+def test_gini_of_equal_values_is_zero():
+    assert abs(gini(np.ones(400))) < 1e-12
+    assert abs(gini(np.ones(400), n_quantiles=None)) < 1e-12
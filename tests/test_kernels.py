@@ -0,0 +1,130 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kernels
+import valuepath
+from model import HeterogeneityInArtificialMarket
+
+# Long enough for the technical traders to open and close positions on several crossovers
+N_STEPS = 200
+SEED = 7
+
+
+# The kernels' computations as written with NumPy before the kernels existed
+def reference_update_price(last_price, last_order, liquidity, noise):
+    current_price = last_price + last_order / liquidity + noise
+    if current_price < 0:
+        current_price = 0
+    return current_price
+
+
+def reference_update_value(last_value, increment, time_step, trend_size, trend_start, trend_end):
+    current_value = last_value + increment
+    if trend_start <= time_step < trend_end:
+        current_value += trend_size
+    return current_value
+
+
+def reference_value_path(initial_value, increments, first_time_step, trend_size, trend_start, trend_end):
+    values = []
+    last_value = initial_value
+    for i, increment in enumerate(increments):
+        last_value = last_value + increment
+        if trend_start <= first_time_step + i < trend_end:
+            last_value += trend_size
+        values.append(last_value)
+    return np.array(values)
+
+
+def reference_price_path(initial_price, orders, noises, liquidity):
+    prices = []
+    last_price = initial_price
+    for order, noise in zip(orders, noises):
+        last_price = reference_update_price(last_price, order, liquidity, noise)
+        prices.append(last_price)
+    return np.array(prices)
+
+
+def reference_moving_average(prices, window):
+    return sum(prices) / window
+
+
+def reference_technical_position(previous_position, last_position, last_short_ma, last_long_ma, short_ma, long_ma,
+                                 slope, current_price, exit_low, exit_high, normalization_constant,
+                                 within_risk_tolerance):
+    if previous_position == 0:
+        if last_short_ma < last_long_ma and short_ma >= long_ma:
+            return normalization_constant * abs(slope)
+        elif last_short_ma > last_long_ma and short_ma <= long_ma:
+            return -1 * normalization_constant * abs(slope)
+        return 0
+    elif previous_position > 0:
+        if current_price <= exit_low:
+            return 0
+        return normalization_constant * abs(slope) if within_risk_tolerance else last_position
+    elif previous_position < 0:
+        if current_price >= exit_high:
+            return 0
+        return -1 * normalization_constant * abs(slope) if within_risk_tolerance else last_position
+    return last_position
+
+
+def reference_normalize(weights):
+    return weights / sum(weights)
+
+
+def reference_choose_index(probabilities, uniform_sample):
+    # As numpy.random.choice
+    cdf = np.cumsum(probabilities)
+    cdf /= cdf[-1]
+    return int(cdf.searchsorted(uniform_sample, side="right"))
+
+
+def get_kernel_names():
+    # Every kernel needs a reference below, so that no kernel escapes the comparison
+    return [name for name, function in vars(kernels).items()
+            if callable(function) and getattr(function, "__module__", None) == "kernels" and name != "njit"]
+
+
+def run_record(model_params, n_steps):
+    # Value paths are shared by the runs of a seed in the process, each run draws its own here
+    valuepath._value_path_memo.clear()
+    model = HeterogeneityInArtificialMarket(seed=SEED, verbose=False, **model_params)
+    for _ in range(n_steps):
+        model.step()
+    return model.datacollector.get_model_vars_dataframe()
+
+
+@pytest.mark.parametrize("model_params", [
+    dict(),
+    dict(initial_technical=50, network_type="small world"),
+])
+def test_seeded_run_matches_numpy_reference(monkeypatch, model_params):
+    record = run_record(model_params, N_STEPS)
+
+    for name in get_kernel_names():
+        monkeypatch.setattr(kernels, name, globals()["reference_" + name])
+    reference = run_record(model_params, N_STEPS)
+
+    # Technical traders did trade on crossovers
+    assert (reference["position_ttrader_sum"] > 0).any()
+    assert record.equals(reference)
+
+
+def test_normalize_matches_numpy_softmax():
+    random_state = np.random.RandomState(SEED)
+    for _ in range(1000):
+        weights = 1.0 + random_state.randint(0, 100, size=random_state.randint(2, 9)).astype(float)
+        assert np.array_equal(kernels.normalize(np.exp(weights)), np.exp(weights) / sum(np.exp(weights)))
+
+
+def test_choose_index_matches_numpy_choice():
+    probabilities = kernels.normalize(np.exp(np.array([1.0, 3.0, 2.0, 1.0, 5.0])))
+    for seed in range(200):
+        expected = np.random.RandomState(seed).choice(len(probabilities), p=probabilities)
+        assert kernels.choose_index(probabilities, np.random.RandomState(seed).random_sample()) == expected
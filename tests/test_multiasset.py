@@ -0,0 +1,76 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import TRADER_TYPE_CODES
+from multiasset import MultiAssetArtificialMarket, MultiAssetMarketMaker
+
+TRADER_TYPES = [TRADER_TYPE_CODES[name] for name in ["Fundamentalist", "Noise", "Technical", "Noise", "Mimetic"]]
+
+
+def make_market(n_assets=3):
+    return MultiAssetMarketMaker(n_assets, trader_types=TRADER_TYPES, value_stream=np.random.default_rng(1),
+                                 price_stream=np.random.default_rng(2))
+
+
+def test_batched_orders_match_single_submissions():
+    orders = np.random.default_rng(0).normal(size=(8, 3))
+    trader_ids = [0, 1, 3, 1, 4, 2, 3, 0]
+
+    batched = make_market()
+    batched.submit_orders(orders, trader_ids)
+    single = make_market()
+    for order, trader_id in zip(orders, trader_ids):
+        single.submit_order(order, trader_id)
+
+    assert np.array_equal(batched.net_orders, single.net_orders)
+    assert np.array_equal(batched.positions, single.positions)
+    # Noise traders 1 and 3 share the net orders of their type
+    noise = [i for i, trader_id in enumerate(trader_ids) if trader_id in (1, 3)]
+    assert np.allclose(batched.net_orders[TRADER_TYPE_CODES["Noise"]], orders[noise].sum(axis=0))
+
+    batched.update_price()
+    assert np.allclose(batched.order_history[-1], orders.sum(axis=0))
+    assert not batched.net_orders.any()
+
+
+def test_asset_view_order_updates_position():
+    market = make_market()
+    market.asset(2).submit_order(1.5, trader_id=4)
+
+    assert market.positions[4].tolist() == [0.0, 0.0, 1.5]
+    assert market.net_orders[TRADER_TYPE_CODES["Mimetic"], 2] == 1.5
+
+
+def test_moving_averages_match_price_windows():
+    market = make_market()
+    for _ in range(2000):
+        market.update_price()
+
+    prices = market.price_history
+    windows = np.array([1, 5, 40])
+    for step in [0, 3, 39, 1999]:
+        expected = [prices[max(0, step - window + 1):step + 1].sum(axis=0) / window for window in windows]
+        assert np.allclose(market.get_moving_averages(step, windows), expected)
+
+
+def test_model_positions_are_the_batched_orders():
+    model = MultiAssetArtificialMarket(n_assets=4, seed=3, initial_fundamentalist=10, initial_technical=10,
+                                       initial_mimetic=10, initial_noise=10, value_correlation=0.5)
+    for _ in range(60):
+        model.step()
+
+    market = model.market_maker
+    assert market.positions.shape == (40, 4)
+    for trader_type, code in TRADER_TYPE_CODES.items():
+        traders = market.trader_types == code
+        # The orders of the last step are recorded by the next price update
+        submitted = market.type_order_history[:, code].sum(axis=0) + market.net_orders[code]
+        assert np.allclose(submitted, market.positions[traders].sum(axis=0))
+        # Every type did trade
+        assert np.abs(market.type_order_history[:, code]).sum() > 0
+    record = model.datacollector.get_model_vars_dataframe()
+    assert len(record) == 60 and {"price_0", "price_3", "value_3", "order_all_sum"} <= set(record.columns)
@@ -0,0 +1,137 @@
+import os
+import sys
+
+import pytest
+from mesa import Agent, Model
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model import HeterogeneityInArtificialMarket
+from scheduler import EventActivation
+
+
+class PriceMarket:
+    """Market maker with a price set by the test"""
+
+    def __init__(self, price=100.0):
+        self.price = price
+        self.n_repricings = 0
+
+    def get_current_price(self):
+        return self.price
+
+    def reprice_intraday(self):
+        self.n_repricings += 1
+
+
+class PeriodicAgent(Agent):
+    """Acts every period steps, or sleeps on a price watcher when band is given"""
+
+    def __init__(self, unique_id, model, period=1, band=None):
+        super().__init__(unique_id, model)
+        self.period = period
+        self.band = band
+        self.steps = []
+
+    def step(self):
+        self.steps.append(self.model.schedule.time)
+
+    def next_wakeup(self, time):
+        if self.band is not None:
+            price = self.model.market_maker.get_current_price()
+            self.model.schedule.watch(self, price - self.band, price + self.band)
+            return None
+        return time + self.period
+
+
+class SchedulerModel(Model):
+
+    def __init__(self, agents, intraday_batches=1):
+        super().__init__()
+        self.market_maker = PriceMarket()
+        self.schedule = EventActivation(self, intraday_batches=intraday_batches)
+        for unique_id, kwargs in enumerate(agents):
+            self.schedule.add(PeriodicAgent(unique_id, self, **kwargs))
+
+    def get_agent(self, unique_id):
+        return self.schedule._agents[unique_id]
+
+
+def test_agents_act_at_their_wakeups_only():
+    model = SchedulerModel([dict(period=1), dict(period=3), dict(period=4)])
+    for _ in range(10):
+        model.schedule.step()
+
+    assert model.get_agent(0).steps == list(range(10))
+    assert model.get_agent(1).steps == [0, 3, 6, 9]
+    assert model.get_agent(2).steps == [0, 4, 8]
+    assert model.schedule.n_events == 10 + 4 + 3
+
+
+def test_watcher_wakes_agent_when_price_leaves_band():
+    model = SchedulerModel([dict(band=1.0)])
+    agent = model.get_agent(0)
+    for price in [100.0, 100.5, 99.2, 101.5, 101.0, 102.0, 104.0]:
+        model.market_maker.price = price
+        model.schedule.step()
+
+    # Acts at the start, then whenever the price left the band around the price it last acted at
+    assert agent.steps == [0, 3, 6]
+
+
+def test_intraday_batches_reprice_between_batches():
+    model = SchedulerModel([dict(period=0.5)], intraday_batches=2)
+    for _ in range(3):
+        model.schedule.step()
+
+    # At most one action per step, whatever the wake-up times
+    assert model.get_agent(0).steps == [0, 1, 2]
+    assert model.market_maker.n_repricings == 3
+
+
+class EventMarket(HeterogeneityInArtificialMarket):
+    NOISE_ARRIVAL_RATE = 0.2
+    TECHNICAL_PRICE_BAND = 0.02
+    INTRADAY_BATCHES = 4
+
+
+def make_event_model(**kwargs):
+    return EventMarket(seed=3, verbose=False, scheduler="event", initial_fundamentalist=10, initial_technical=10,
+                       initial_mimetic=10, initial_noise=10, **kwargs)
+
+
+def test_sleeping_traders_are_not_touched():
+    model = make_event_model(collection={"metrics": ["order"], "groups": ["all"], "stats": ["sum"]},
+                             collection_interval=1000)
+    for _ in range(30):
+        model.step()
+
+    lagging = [trader for trader in model.all_traders if trader.position.length < model.schedule.steps + 1]
+    assert lagging
+    # Reading a history catches up on the skipped steps
+    for trader in lagging:
+        assert len(trader.position) == model.schedule.steps + 1
+        assert len(trader.net_wealth) == model.schedule.steps + 1
+
+
+def test_history_reads_match_recorded_values():
+    model = make_event_model()
+    recorded = []
+    for _ in range(20):
+        model.step()
+        recorded.append([(trader.portfolio[-1], trader.net_wealth[-1], trader.cash[-1])
+                         for trader in model.all_traders])
+
+    for step, values in enumerate(recorded):
+        for trader, (portfolio, wealth, cash) in zip(model.all_traders, values):
+            assert trader.portfolio[step + 1] == portfolio
+            assert trader.net_wealth[step + 1] == wealth
+            assert trader.cash[step + 1] == cash
+
+
+def test_arrival_rate_above_one_per_step_is_rejected():
+    class FastArrivals(EventMarket):
+        NOISE_ARRIVAL_RATE = 2.0
+
+    with pytest.raises(ValueError):
+        FastArrivals(seed=3, verbose=False, scheduler="event")
@@ -1,6 +1,7 @@
 from mesa import Agent
 from abc import abstractmethod
 from utils import draw_from_pareto, draw_from_normal
+from events import OrderHistory, PositionHistory, CashHistory, PortfolioHistory, WealthHistory
 
 
 class Trader(Agent):
@@ -9,18 +10,25 @@ class Trader(Agent):
         super().__init__(unique_id, model_reference)
         self.market_maker = model_reference.market_maker
 
+        # Parameter draws of each trader type come from their own stream
+        self.parameter_stream = model_reference.streams.get("parameters_" + type(self).__name__.lower())
+
         self.initial_cash = draw_from_pareto(a=model_reference.PARETO_ALPHA, xm=model_reference.PARETO_XM,
-                                             factor=model_reference.BASE_WEALTH)
+                                             factor=model_reference.BASE_WEALTH, random_state=self.parameter_stream)
 
         self.risk_tolerance = draw_from_normal(mu=model_reference.MU_RISK_TOLERANCE,
-                                               sigma=model_reference.SIGMA_RISK_TOLERANCE, lower=0.1, upper=0.9)
+                                               sigma=model_reference.SIGMA_RISK_TOLERANCE, lower=0.1, upper=0.9,
+                                               random_state=self.parameter_stream)
 
-        self.position = [0]
-        self.order = [0]
+        # Sparse histories: non-zero orders go to the model's trade log, the rest is derived on demand
+        self.trade_log = model_reference.trade_log
+        # Histories of a trader sleeping under an EventActivation schedule catch up when they are read
+        self.position = PositionHistory(initial_position=0, owner=self)
+        self.order = OrderHistory(self, self.trade_log, self.initial_cash)
 
-        self.portfolio = [0]
-        self.cash = [self.initial_cash]
-        self.net_wealth = [self.initial_cash]
+        self.portfolio = PortfolioHistory(self.position, self.trade_log, owner=self)
+        self.cash = CashHistory(self.order, owner=self)
+        self.net_wealth = WealthHistory(self.cash, self.portfolio, owner=self)
 
     def get_position(self, t):
         return self.position[t]
@@ -38,9 +46,37 @@ class Trader(Agent):
         return self.net_wealth[t]
 
     def step(self):
+        self.catch_up()
         self.trade(self.model.schedule.time)
         return
 
+    def next_wakeup(self, time):
+        """
+        Time at which the trader acts next under an EventActivation schedule, None to wait for a price watcher.
+        """
+        return time + 1
+
+    def catch_up(self):
+        """
+        Carries the histories forward through the completed steps in which the trader did not act
+        (EventActivation): its position is held, it places no order and its portfolio is valued at the closing
+        prices. Done in O(1) however many steps were skipped, when the trader wakes or its histories are read.
+        """
+        n_steps = self.model.schedule.steps + 1 - self.position.length
+        if n_steps <= 0:
+            return
+        self.position.extend(self.get_held_position(), n_steps)
+        self.order.extend_zeros(n_steps)
+        self.cash.advance(n_steps)
+        self.portfolio.extend_closed(n_steps)
+        self.net_wealth.advance(n_steps)
+
+    def get_held_position(self):
+        """
+        Position of the trader in the steps in which it does not act.
+        """
+        return self.position.last
+
     def is_within_risk_tolerance(self):
         if abs(self.portfolio[-1]) < (self.risk_tolerance * self.net_wealth[-1]):
             return True
@@ -53,14 +89,14 @@ class Trader(Agent):
         self._update_net_wealth()
 
     def _update_cash(self):
-        delta_position = self.order[-1]
-        self.cash.append(self.cash[-1] - delta_position * self.market_maker.get_current_price())
+        # Cash after the latest order is folded in by the order history when the order is logged
+        self.cash.advance()
 
     def _update_portfolio(self):
-        self.portfolio.append(self.position[-1] * self.market_maker.get_current_price())
+        self.portfolio.advance(self.market_maker.get_current_price())
 
     def _update_net_wealth(self):
-        self.net_wealth.append(self.cash[-1] + self.portfolio[-1])
+        self.net_wealth.advance()
 
     @abstractmethod
     def trade(self, t):
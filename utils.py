@@ -1,39 +1,45 @@
 from scipy.stats import truncnorm, uniform, pareto
 
 
-def draw_from_uniform(lower, upper):
+def draw_from_uniform(lower, upper, random_state=None):
     """
     Given a lower, and upper bounds, generates and returns a real number from a uniform distribution.
+    Draws from the given random_state (e.g. a named model stream), or the global numpy state.
     """
     try:
         if lower < upper:
-            return uniform.rvs(loc=lower, scale=upper-lower, size=1)[0]
+            return uniform.rvs(loc=lower, scale=upper-lower, size=1, random_state=random_state)[0]
         else:
             raise Exception("Incorrect bounds in draw_from_uniform")
     except Exception as e:
         print(e)
 
 
-def draw_from_normal(mu, sigma, lower=float('-inf'), upper=float('inf')):
+def draw_from_normal(mu, sigma, lower=float('-inf'), upper=float('inf'), random_state=None, size=None):
     """
     Given a mean, std, lower, and upper bounds, generates and returns a real number from a normal distribution.
+    Draws from the given random_state (e.g. a named model stream), or the global numpy state.
+    With a size, returns an array of that many numbers, the same numbers as that many single draws.
     """
     try:
         if lower < upper:
-            return truncnorm.rvs(a=(lower - mu) / sigma, b=(upper - mu) / sigma, loc=mu, scale=sigma, size=1)[0]
+            draws = truncnorm.rvs(a=(lower - mu) / sigma, b=(upper - mu) / sigma, loc=mu, scale=sigma,
+                                  size=1 if size is None else size, random_state=random_state)
+            return draws[0] if size is None else draws
         else:
             raise Exception("Incorrect bounds in draw_from_normal")
     except Exception as e:
         print(e)
 
 
-def draw_from_pareto(a=1.5, xm=1.0, factor=1.0):
+def draw_from_pareto(a=1.5, xm=1.0, factor=1.0, random_state=None):
     """
     Given an a, lower bound on distribution, and multiplicative factor, returns a real number from pareto distribution.
+    Draws from the given random_state (e.g. a named model stream), or the global numpy state.
     """
     try:
         if (a > 0.0) and (xm > 0.0) and (factor > 0.0):
-            return factor * pareto.rvs(b=a, scale=xm, size=1)[0]
+            return factor * pareto.rvs(b=a, scale=xm, size=1, random_state=random_state)[0]
         else:
             raise Exception("Incorrect parameters in draw_from_pareto")
     except Exception as e:
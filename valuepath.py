@@ -0,0 +1,91 @@
+import numpy as np
+import kernels
+from streams import RandomStreams
+from utils import draw_from_normal
+
+VALUE_PATH_CHUNK = 2048
+VALUE_PATH_MEMO_SIZE = 32
+
+
+class ValuePath:
+    """
+    Fundamental value process V_t = V_{t-1} + N(mu, sigma) (+ trend_size within the trend period),
+    drawn up front in vectorised chunks instead of one draw per step. The values are the same as those of
+    the step-by-step process with the same value stream.
+
+    The path depends on the agents in no way, so runs with the same seed and value process share it:
+    shocks ({step: jump}) add a jump to the value at a step, regimes ([(start, end, mu, sigma)]) replace
+    the drift and volatility of the increments in [start, end), keeping their standardised draws.
+    """
+
+    def __init__(self, initial_value, mu_value, sigma_value, trend_size=0.0, trend_start=0, trend_end=0,
+                 shocks=None, regimes=None, value_stream=None, chunk_size=VALUE_PATH_CHUNK):
+        self.mu_value = mu_value
+        self.sigma_value = sigma_value
+        self.trend_size = trend_size
+        self.trend_start = trend_start
+        self.trend_end = trend_end
+        self.shocks = {int(step): jump for step, jump in (shocks or {}).items()}
+        self.regimes = list(regimes or [])
+        self.value_stream = value_stream
+        self.chunk_size = chunk_size
+
+        self.values = np.array([initial_value], dtype=float)
+
+    def _extend(self):
+        first_time_step = len(self.values)
+        # Chunks grow with the path, so a long horizon takes a few draws only
+        n_steps = max(self.chunk_size, first_time_step)
+        increments = draw_from_normal(mu=self.mu_value, sigma=self.sigma_value, random_state=self.value_stream,
+                                      size=n_steps)
+
+        time_steps = np.arange(first_time_step, first_time_step + n_steps)
+        for start, end, mu, sigma in self.regimes:
+            in_regime = (time_steps >= start) & (time_steps < end)
+            increments[in_regime] = mu + (increments[in_regime] - self.mu_value) / self.sigma_value * sigma
+        for step, jump in self.shocks.items():
+            if first_time_step <= step < first_time_step + n_steps:
+                increments[step - first_time_step] += jump
+
+        values = kernels.value_path(self.values[-1], increments, first_time_step, self.trend_size,
+                                    self.trend_start, self.trend_end)
+        self.values = np.concatenate([self.values, values])
+
+    def get(self, time_step):
+        """
+        Returns the value at a step (0 is the initial value).
+        """
+        while time_step >= len(self.values):
+            self._extend()
+        return self.values.item(time_step)
+
+    def get_values(self, n_steps):
+        """
+        Returns a read-only view of the values of steps 0 to n_steps.
+        """
+        while n_steps >= len(self.values):
+            self._extend()
+        view = self.values[:n_steps + 1]
+        view.flags.writeable = False
+        return view
+
+
+_value_path_memo = {}
+
+
+def get_value_path(seed, initial_value, mu_value, sigma_value, trend_size=0.0, trend_start=0, trend_end=0,
+                   shocks=None, regimes=None):
+    """
+    Returns the value path of a seed, shared by every run in the process with the same seed and value process
+    (replicates under other trader parameters), drawn from the "value" stream of the seed.
+    Other processes draw the very same path.
+    """
+    key = (seed, initial_value, mu_value, sigma_value, trend_size, trend_start, trend_end,
+           tuple(sorted((int(step), jump) for step, jump in (shocks or {}).items())),
+           tuple(tuple(regime) for regime in (regimes or [])))
+    if key not in _value_path_memo:
+        if len(_value_path_memo) >= VALUE_PATH_MEMO_SIZE:
+            del _value_path_memo[next(iter(_value_path_memo))]
+        _value_path_memo[key] = ValuePath(initial_value, mu_value, sigma_value, trend_size, trend_start, trend_end,
+                                          shocks, regimes, value_stream=RandomStreams(seed).get("value"))
+    return _value_path_memo[key]
@@ -3,6 +3,8 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from cache import ResultCache, read_record
+from aggregation import ReplicateAggregator
 sns.set_style("whitegrid")
 
 experiment = 'Experiment2.10'
@@ -10,13 +12,15 @@ dir = os.path.join('.', 'Data', experiment)
 if not os.path.exists(dir):
     os.makedirs(dir)
 
+# Every plot re-reads the same records, they are parsed once and kept in the result cache
+cache = ResultCache()
+
 def get_file_index(file_path):
     chunks = file_path.split(".")
     idx = int(chunks[1].split("_")[-1])
     return idx
 
-def get_normalisation_factor(max_all_position_ftrader, all_position_trader, trader):
-    mean_all_position_trader = np.mean(all_position_trader, axis=0)
+def get_normalisation_factor(max_all_position_ftrader, mean_all_position_trader, trader):
     # print("mean_all_position_" + trader + ":\n", mean_all_position_trader)
 
     max_all_position_trader = max(np.abs(mean_all_position_trader))
@@ -31,71 +35,77 @@ def get_normalisation_factor(max_all_position_ftrader, all_position_trader, trad
     return ratio
 
 
-def do_calibration(file_list, df_list_positions):
-    df_positions = pd.concat(df_list_positions, axis=0, ignore_index=True)
-    n_rows, _ = df_list_positions[0].shape
-
+def do_calibration(aggregator):
     # Fundamentalists positions
-    all_position_ftrader = df_positions.position_ftrader_mean.to_numpy().reshape(len(file_list), n_rows)
-    mean_all_position_ftrader = np.mean(all_position_ftrader, axis=0)
+    mean_all_position_ftrader = aggregator.get_mean("position_ftrader_mean")
     # print("mean_all_position_ftrader:\n", mean_all_position_ftrader)
     max_all_position_ftrader = max(mean_all_position_ftrader)
     print("max_all_position_ftrader:\n", max_all_position_ftrader)
 
     # Technicals positions
-    all_position_ttrader = df_positions.position_ttrader_mean.to_numpy().reshape(len(file_list), n_rows)
-    get_normalisation_factor(max_all_position_ftrader, all_position_ttrader, "technical")
+    get_normalisation_factor(max_all_position_ftrader, aggregator.get_mean("position_ttrader_mean"), "technical")
 
     # Mimetics positions
-    all_position_mtrader = df_positions.position_mtrader_mean.to_numpy().reshape(len(file_list), n_rows)
-    get_normalisation_factor(max_all_position_ftrader, all_position_mtrader, "mimetic")
+    get_normalisation_factor(max_all_position_ftrader, aggregator.get_mean("position_mtrader_mean"), "mimetic")
 
     # Noise positions
-    all_position_ntrader = df_positions.position_ntrader_mean.to_numpy().reshape(len(file_list), n_rows)
-    get_normalisation_factor(max_all_position_ftrader, all_position_ntrader, "noise")
+    get_normalisation_factor(max_all_position_ftrader, aggregator.get_mean("position_ntrader_mean"), "noise")
+
 
+CALIBRATION_COLUMNS = ["position_ftrader_mean", "position_ttrader_mean", "position_mtrader_mean", "position_ntrader_mean"]
 
-def plot_time_vs_selected_features(file_list, select_columns, title, xrange, ylabel, normalize=False, calibration=False):
-    df_list = []
-    df_list_positions = []
+
+def aggregate_records(file_list, columns, normalized_columns=(), sketch_factory=None, sketch_columns=()):
+    """
+    Reads every record once and folds it into running per-step statistics across replicates,
+    so memory does not grow with the number of replicates.
+    Normalized columns (divided by their initial value per replicate) are kept as "normalized_" + column.
+    """
+    normalized_columns = list(normalized_columns)
+    aggregator = ReplicateAggregator(columns=["step"] + list(columns) + ["normalized_" + col for col in normalized_columns],
+                                     sketch_factory=sketch_factory, sketch_columns=sketch_columns)
     for file in file_list:
-        _df = pd.read_csv(file, header=0)
-        if normalize:
-            for col in select_columns:
-                initial_value = _df.loc[:,col][0]
-                if initial_value != 0:
-                    _df[col] = _df[col].div(initial_value)
-                else:
-                    print('initial value is zero')
-
-        for col in select_columns:
-            _df_select = _df.loc[:,['step', col]]
-            if col.find("ftrader")>=0:
-                _df_select['type'] = "fundamentalist"
-            elif col.find("ttrader")>=0:
-                _df_select['type'] = "technical"
-            elif col.find("mtrader")>=0:
-                _df_select['type'] = "mimetic"
-            elif col.find("ntrader")>=0:
-                _df_select['type'] = "noise"
-            elif col.find("all")>=0:
-                _df_select['type'] = "all"
+        _df = read_record(file, cache, memoize=False)
+        normalized = {}
+        for col in normalized_columns:
+            initial_value = _df.loc[:,col][0]
+            if initial_value != 0:
+                normalized["normalized_" + col] = _df[col].div(initial_value)
             else:
-                _df_select['type'] = col
-            _df_select = _df_select.rename(columns={col: "data"})
-            df_list.append(_df_select)
+                print('initial value is zero')
+                normalized["normalized_" + col] = _df[col]
+        _df = pd.concat([_df, pd.DataFrame(normalized)], axis=1)
+        aggregator.add(_df[aggregator.columns])
+    return aggregator
+
 
-        if calibration:
-            _df_position = _df[["position_ftrader_mean", "position_ttrader_mean", "position_mtrader_mean", "position_ntrader_mean"]]
-            df_list_positions.append(_df_position)
+def get_trader_type(col):
+    if col.find("ftrader")>=0:
+        return "fundamentalist"
+    elif col.find("ttrader")>=0:
+        return "technical"
+    elif col.find("mtrader")>=0:
+        return "mimetic"
+    elif col.find("ntrader")>=0:
+        return "noise"
+    elif col.find("all")>=0:
+        return "all"
+    return col
 
-    df = pd.concat(df_list, axis=0, ignore_index=True)
 
+def plot_time_vs_selected_features(aggregator, select_columns, title, xrange, ylabel, normalize=False, calibration=False):
     if calibration:
-        do_calibration(file_list, df_list_positions)
+        do_calibration(aggregator)
 
+    steps = aggregator.get_mean("step")
     plt.figure(figsize=(15.0, 9.0))
-    sns.lineplot(data=df, x="step", y="data", ci="sd", hue="type")
+    for col in select_columns:
+        column = "normalized_" + col if normalize else col
+        # Mean +- standard deviation across replicates, as seaborn's ci="sd"
+        mean = aggregator.get_mean(column)
+        std = aggregator.get_std(column, ddof=1)
+        line, = plt.plot(steps, mean, label=get_trader_type(col))
+        plt.fill_between(steps, mean - std, mean + std, color=line.get_color(), alpha=0.2)
     plt.title(title, fontsize=25)
     plt.xlabel("step", fontsize=20)
     plt.ylabel(ylabel, fontsize=20)
@@ -106,20 +116,6 @@ def plot_time_vs_selected_features(file_list, select_columns, title, xrange, yla
     plt.savefig(os.path.join(dir, title+".png"))
     plt.show()
 
-file_list = []
-for file in os.listdir(dir):
-    if file.endswith(".csv"):
-        file_list.append(os.path.join(dir, file))
-
-# Time vs. average price and fundamental value
-plot_time_vs_selected_features(
-    file_list=file_list,
-    select_columns=['price', 'value'],
-    title="Average price and fundamental value of traders as a function of time",
-    ylabel="price/value",
-    xrange=(1,1530)
-)
-
 def generate_selected_columns(prefix, suffix):
     default_targets = ['ftrader', 'ttrader', 'mtrader', 'ntrader', 'all']
     generate_columns = []
@@ -150,9 +146,33 @@ experiment_list = [# 'title', 'prefix', 'suffix'
     ['Standard deviation of order', 'order', 'std', False],
 ]
 
+file_list = []
+for file in os.listdir(dir):
+    if file.endswith(".csv"):
+        file_list.append(os.path.join(dir, file))
+
+# One pass over the records for all plots
+columns = ['price', 'value'] + CALIBRATION_COLUMNS
+normalized_columns = []
+for title, prefix, suffix, normalize in experiment_list:
+    if normalize:
+        normalized_columns += generate_selected_columns(prefix, suffix)
+    else:
+        columns += generate_selected_columns(prefix, suffix)
+aggregator = aggregate_records(file_list, columns, normalized_columns)
+
+# Time vs. average price and fundamental value
+plot_time_vs_selected_features(
+    aggregator=aggregator,
+    select_columns=['price', 'value'],
+    title="Average price and fundamental value of traders as a function of time",
+    ylabel="price/value",
+    xrange=(1,1530)
+)
+
 for title, prefix, suffix, normalize in experiment_list:
     plot_time_vs_selected_features(
-        file_list=file_list,
+        aggregator=aggregator,
         select_columns=generate_selected_columns(prefix, suffix),
         title=title+" of traders as a function of time",
         ylabel=title,